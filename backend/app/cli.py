@@ -0,0 +1,228 @@
+"""
+Comandos de mantenimiento del sistema de biblioteca.
+
+Uso (desde la carpeta backend):
+    python -m app.cli <comando> [opciones]
+"""
+import argparse
+import json
+
+from .database import SessionLocal, actualizar_esquema
+from . import models
+from .utils import analitica, archivo, consultas_lentas, cupos, estadisticas, idempotencia, inventario, reproduccion, respaldo, tokens_refresco
+
+
+def reconstruir_estadisticas(db, args):
+    procesados = estadisticas.reconstruir(db, tamano_lote=args.lote)
+    print(f"Estadísticas recalculadas a partir de {procesados} préstamos")
+
+
+def archivar(db, args):
+    movidos = archivo.archivar(db, dias=args.dias, tamano_lote=args.lote)
+    print(f"Archivados {movidos['prestamos']} préstamos y {movidos['solicitudes']} solicitudes")
+
+
+def purgar_idempotencia(db, args):
+    borradas = idempotencia.purgar(db, tamano_lote=args.lote)
+    print(f"Borradas {borradas} claves de idempotencia vencidas")
+
+
+def purgar_tokens(db, args):
+    borrados = tokens_refresco.purgar(db, tamano_lote=args.lote)
+    print(f"Borrados {borrados} tokens de refresco vencidos")
+
+
+def respaldar(db, args):
+    ultimo = [-1]
+
+    def mostrar_progreso(copiadas, totales):
+        porcentaje = int(100 * copiadas / totales) if totales else 100
+        if porcentaje != ultimo[0]:
+            ultimo[0] = porcentaje
+            print(f"\r{copiadas}/{totales} páginas ({porcentaje}%)", end="", flush=True)
+
+    resultado = respaldo.respaldar(
+        args.destino or respaldo.ruta_por_defecto(),
+        paginas=args.paginas,
+        pausa=args.pausa,
+        progreso=mostrar_progreso,
+        verificar_copia=not args.sin_verificar,
+    )
+    print()
+    print(f"Respaldo escrito en {resultado['destino']} ({resultado['bytes']} bytes, {resultado['segundos']} s)")
+    if resultado["integridad"] is not None:
+        print(f"Verificación de integridad: {', '.join(resultado['integridad'])}")
+
+
+def resumir_consultas_lentas(db, args):
+    for grupo in consultas_lentas.resumir(args.archivo, args.limite):
+        print(f"{grupo['total_ms']:>12.1f} ms  {grupo['veces']:>6}x  "
+              f"prom {grupo['promedio_ms']:.1f} ms  máx {grupo['max_ms']:.1f} ms")
+        print(f"    {grupo['huella']}")
+        if grupo["rutas"]:
+            print(f"    rutas: {', '.join(grupo['rutas'])}")
+        if grupo["plan"]:
+            print(f"    plan: {json.dumps(grupo['plan'], ensure_ascii=False)}")
+
+
+def reproducir(db, args):
+    registros = reproduccion.cargar(args.archivo)
+    print(f"Reproduciendo {len(registros)} peticiones contra {args.url} a {args.velocidad}x...")
+    filas = reproduccion.informe(
+        reproduccion.reproducir(registros, args.url, velocidad=args.velocidad, hilos=args.hilos)
+    )
+
+    def ms(valor):
+        return f"{valor:.1f}" if valor is not None else "-"
+
+    print(f"{'ruta':<50} {'n':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'p50 grab':>9} {'razón':>6} {'estados≠':>9}")
+    for fila in filas:
+        print(f"{fila['ruta'][:50]:<50} {fila['peticiones']:>6} {ms(fila['p50_ms']):>8} {ms(fila['p90_ms']):>8} "
+              f"{ms(fila['p99_ms']):>8} {ms(fila['p50_grabado_ms']):>9} "
+              f"{fila['razon_p50'] if fila['razon_p50'] is not None else '-':>6} {fila['estados_distintos']:>9}")
+
+
+def reconciliar_prestamos(db, args):
+    resultado = cupos.reconciliar(db, tamano_lote=args.lote, corregir=args.corregir)
+    print(f"Usuarios revisados: {resultado['revisados']}, contadores distintos: {resultado['diferencias']}")
+    for diferencia in resultado["muestra"]:
+        print(f"    usuario {diferencia['usuario_id']}: contador {diferencia['contador']}, "
+              f"préstamos activos {diferencia['real']}")
+    if resultado["corregidos"]:
+        print(f"Corregidos {resultado['corregidos']} contadores")
+
+
+def reconciliar_materiales(db, args):
+    resultado = inventario.reconciliar(
+        db, tamano_lote=args.lote, corregir=args.corregir, incremental=args.incremental
+    )
+    if resultado["desde"] is not None:
+        print(f"Materiales modificados desde {resultado['desde']:%Y-%m-%d %H:%M:%S}")
+    print(f"Materiales revisados: {resultado['revisados']}, contadores distintos: {resultado['diferencias']}")
+    for diferencia in resultado["muestra"]:
+        print(f"    material {diferencia['material_id']}: cantidad_prestamo {diferencia['cantidad_prestamo']}, "
+              f"préstamos activos {diferencia['real']}")
+    if resultado["corregidos"]:
+        print(f"Corregidos {resultado['corregidos']} contadores")
+
+
+def verificar_analitica(db, args):
+    resultado = analitica.verificar(db, aleatorios=args.aleatorios, semilla=args.semilla)
+    print(f"Materiales revisados: {resultado['revisados']}, filas aleatorias: {resultado['aleatorios']}, "
+          f"diferencias: {len(resultado['diferencias'])}")
+    for diferencia in resultado["diferencias"][:20]:
+        print(f"    {diferencia}")
+    if resultado["diferencias"]:
+        raise SystemExit(1)
+
+
+def crear_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Comandos de mantenimiento")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    p = subparsers.add_parser(
+        "reconstruir-estadisticas",
+        help="Recalcula desde cero las tablas de resumen de préstamos",
+    )
+    p.add_argument("--lote", type=int, default=1000, help="Préstamos leídos por lote")
+    p.set_defaults(func=reconstruir_estadisticas)
+
+    p = subparsers.add_parser(
+        "archivar",
+        help="Mueve préstamos devueltos y solicitudes cerradas antiguas a las tablas de archivo",
+    )
+    p.add_argument("--dias", type=int, default=archivo.DIAS_ANTES_DE_ARCHIVAR,
+                   help="Antigüedad mínima en días")
+    p.add_argument("--lote", type=int, default=archivo.TAMANO_LOTE_ARCHIVO, help="Filas por transacción")
+    p.set_defaults(func=archivar)
+
+    p = subparsers.add_parser(
+        "reconciliar-prestamos",
+        help="Verifica los préstamos activos de cada usuario contra la tabla de préstamos",
+    )
+    p.add_argument("--lote", type=int, default=cupos.TAMANO_LOTE_RECONCILIACION, help="Usuarios por lote")
+    p.add_argument("--corregir", action="store_true", help="Recalcula los contadores que no coinciden")
+    p.set_defaults(func=reconciliar_prestamos)
+
+    p = subparsers.add_parser(
+        "reconciliar-materiales",
+        help="Verifica cantidad_prestamo de cada material contra sus préstamos activos",
+    )
+    p.add_argument("--lote", type=int, default=inventario.TAMANO_LOTE_RECONCILIACION,
+                   help="Materiales por lote (y por transacción)")
+    p.add_argument("--corregir", action="store_true", help="Recalcula los contadores que no coinciden")
+    p.add_argument("--incremental", action="store_true",
+                   help="Solo revisa los materiales modificados desde la última corrección")
+    p.set_defaults(func=reconciliar_materiales)
+
+    p = subparsers.add_parser(
+        "purgar-idempotencia",
+        help="Borra las claves de idempotencia vencidas",
+    )
+    p.add_argument("--lote", type=int, default=idempotencia.TAMANO_LOTE_PURGA, help="Claves por transacción")
+    p.set_defaults(func=purgar_idempotencia)
+
+    p = subparsers.add_parser(
+        "purgar-tokens",
+        help="Borra los tokens de refresco vencidos",
+    )
+    p.add_argument("--lote", type=int, default=tokens_refresco.TAMANO_LOTE_PURGA, help="Tokens por transacción")
+    p.set_defaults(func=purgar_tokens)
+
+    p = subparsers.add_parser(
+        "verificar-analitica",
+        help="Compara el factor de estancia vectorizado con calcular_factor_estancia() de cada modelo",
+    )
+    p.add_argument("--aleatorios", type=int, default=100000,
+                   help="Filas generadas al azar que se comparan además de los materiales")
+    p.add_argument("--semilla", type=int, help="Semilla para repetir una comparación")
+    p.set_defaults(func=verificar_analitica)
+
+    p = subparsers.add_parser(
+        "respaldar",
+        help="Copia consistente de la base de datos con la API de respaldo en línea de SQLite",
+    )
+    p.add_argument("--destino", help="Archivo de destino (por defecto respaldos/biblioteca-<fecha>.db)")
+    p.add_argument("--paginas", type=int, default=respaldo.PAGINAS_POR_PASO, help="Páginas copiadas por paso")
+    p.add_argument("--pausa", type=float, default=respaldo.PAUSA_ENTRE_PASOS,
+                   help="Segundos de espera entre un paso y el siguiente, sin bloqueos tomados")
+    p.add_argument("--sin-verificar", action="store_true", help="Omite PRAGMA integrity_check sobre la copia")
+    p.set_defaults(func=respaldar)
+
+    p = subparsers.add_parser(
+        "consultas-lentas",
+        help="Ordena las sentencias del registro de consultas lentas por tiempo total",
+    )
+    p.add_argument("--archivo", default=consultas_lentas.ARCHIVO_CONSULTAS_LENTAS)
+    p.add_argument("--limite", type=int, default=20, help="Cantidad de huellas a mostrar")
+    p.set_defaults(func=resumir_consultas_lentas, sin_base_datos=True)
+
+    p = subparsers.add_parser(
+        "reproducir",
+        help="Reproduce una grabación de peticiones contra una instancia y compara latencias",
+    )
+    p.add_argument("archivo", help="Archivo JSONL grabado con GRABAR_PETICIONES")
+    p.add_argument("--url", default="http://localhost:8000", help="URL base de la instancia destino")
+    p.add_argument("--velocidad", type=float, default=1.0,
+                   help="Multiplicador de velocidad (2 = el doble de rápido, 0 = sin esperas)")
+    p.add_argument("--hilos", type=int, default=16, help="Peticiones concurrentes como máximo")
+    p.set_defaults(func=reproducir, sin_base_datos=True)
+
+    return parser
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    if getattr(args, "sin_base_datos", False):
+        args.func(None, args)
+        return
+    actualizar_esquema()
+    db = SessionLocal()
+    try:
+        args.func(db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
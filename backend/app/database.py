@@ -1,19 +1,190 @@
-from sqlalchemy import create_engine
+import logging
+import os
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from .utils.conexiones import registrar_retencion_conexiones
+from .utils.consultas_lentas import registrar_consultas_lentas
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./biblioteca.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("BIBLIOTECA_DB_URL", "sqlite:///./biblioteca.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
+registrar_consultas_lentas(engine)
+registrar_retencion_conexiones(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Réplica de solo lectura para los GET (ver utils/replica.py): la de
+# BIBLIOTECA_DB_LECTURA_URL o, con REPLICA_LOCAL=1, una copia local del archivo
+# SQLite que se renueva en segundo plano con la API de respaldo.
+REPLICA_LOCAL = os.getenv("REPLICA_LOCAL", "0") == "1"
+RUTA_REPLICA_LOCAL = os.getenv(
+    "REPLICA_LOCAL_RUTA",
+    os.path.splitext(engine.url.database or "biblioteca.db")[0] + "-lectura.db"
+)
+
+def _crear_motor_lectura():
+    url = os.getenv("BIBLIOTECA_DB_LECTURA_URL")
+    if url:
+        conexion = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        return create_engine(url, connect_args=conexion)
+    if REPLICA_LOCAL:
+        # mode=ro: ninguna escritura puede llegar a la copia. Sin pool, cada sesión
+        # abre el archivo vigente, también después de que se reemplace por uno nuevo.
+        return create_engine(
+            f"sqlite:///file:{os.path.abspath(RUTA_REPLICA_LOCAL)}?mode=ro&uri=true",
+            connect_args={"check_same_thread": False},
+            poolclass=NullPool,
+        )
+    return None
+
+engine_lectura = _crear_motor_lectura()
+SessionLectura = None
+if engine_lectura is not None:
+    registrar_consultas_lentas(engine_lectura)
+    registrar_retencion_conexiones(engine_lectura)
+    SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura)
+
 Base = declarative_base()
 
+logger = logging.getLogger("biblioteca.esquema")
+
+class SesionPerezosa:
+    """
+    Se comporta como una Session, pero solo la crea al primer uso.
+    Las peticiones que terminan antes de tocar la base de datos (validación,
+    respuestas en caché) no crean sesión ni piden conexión al pool.
+    """
+
+    def __init__(self, fabrica=None):
+        self._fabrica = fabrica or SessionLocal
+        self._sesion = None
+
+    def __getattr__(self, nombre):
+        if self._sesion is None:
+            self._sesion = self._fabrica()
+        return getattr(self._sesion, nombre)
+
+    def close(self):
+        if self._sesion is not None:
+            self._sesion.close()
+            self._sesion = None
+
 def get_db():
-    db = SessionLocal()
+    # FastAPI reutiliza el valor de get_db dentro de una misma petición, así que
+    # el handler y dependencias como get_current_user comparten esta sesión.
+    db = SesionPerezosa()
     try:
         yield db
     finally:
         db.close()
+
+def _agregar_columnas(conexion) -> list:
+    """
+    Agrega a las tablas existentes las columnas nuevas de los modelos.
+    Solo admite columnas que SQLite puede agregar con ALTER TABLE: deben
+    aceptar NULL o tener un server_default.
+    """
+    inspector = inspect(conexion)
+    agregadas = []
+    for tabla in Base.metadata.sorted_tables:
+        existentes = {columna["name"] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in existentes:
+                continue
+            definicion = f'"{columna.name}" {columna.type.compile(dialect=conexion.dialect)}'
+            if columna.server_default is not None:
+                definicion += f" DEFAULT {columna.server_default.arg}"
+            if not columna.nullable:
+                definicion += " NOT NULL"
+            conexion.execute(text(f'ALTER TABLE "{tabla.name}" ADD COLUMN {definicion}'))
+            agregadas.append(f"{tabla.name}.{columna.name}")
+    return agregadas
+
+def _activar_autoincremento(conexion) -> list:
+    """
+    Reconstruye con AUTOINCREMENT las tablas cuyo modelo lo pide
+    (sqlite_autoincrement) pero que se crearon sin él: SQLite solo lo admite
+    en el CREATE TABLE. Devuelve los nombres de las tablas reconstruidas.
+    """
+    reconstruidas = []
+    for tabla in Base.metadata.sorted_tables:
+        if not tabla.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        sql = conexion.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nombre"),
+            {"nombre": tabla.name}
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            continue
+        anterior = f"{tabla.name}_sin_autoincremento"
+        for indice in inspect(conexion).get_indexes(tabla.name):
+            conexion.execute(text(f'DROP INDEX "{indice["name"]}"'))
+        # Con legacy_alter_table las claves foráneas de otras tablas siguen
+        # apuntando al nombre original, que es el de la tabla nueva
+        conexion.execute(text("PRAGMA legacy_alter_table = ON"))
+        conexion.execute(text(f'ALTER TABLE "{tabla.name}" RENAME TO "{anterior}"'))
+        conexion.execute(text("PRAGMA legacy_alter_table = OFF"))
+        tabla.create(bind=conexion)
+        columnas = ", ".join(f'"{columna.name}"' for columna in tabla.columns)
+        conexion.execute(text(f'INSERT INTO "{tabla.name}" ({columnas}) SELECT {columnas} FROM "{anterior}"'))
+        conexion.execute(text(f'DROP TABLE "{anterior}"'))
+        reconstruidas.append(tabla.name)
+    return reconstruidas
+
+def _ajustar_secuencias(conexion):
+    """
+    Lleva el contador de AUTOINCREMENT de cada tabla hasta el mayor id de su
+    tabla de archivo ("<tabla>_archivo"). Una base creada sin AUTOINCREMENT
+    pudo reutilizar ids ya archivados, y al reconstruirla el contador parte
+    del mayor id vivo.
+    """
+    for tabla in Base.metadata.sorted_tables:
+        archivo = Base.metadata.tables.get(f"{tabla.name}_archivo")
+        if archivo is None or not tabla.dialect_options["sqlite"]["autoincrement"]:
+            continue
+        maximo = conexion.execute(text(f'SELECT MAX(id) FROM "{archivo.name}"')).scalar()
+        if maximo is None:
+            continue
+        actual = conexion.execute(
+            text("SELECT seq FROM sqlite_sequence WHERE name = :nombre"), {"nombre": tabla.name}
+        ).scalar()
+        if actual is None:
+            conexion.execute(
+                text("INSERT INTO sqlite_sequence (name, seq) VALUES (:nombre, :seq)"),
+                {"nombre": tabla.name, "seq": maximo}
+            )
+        elif actual < maximo:
+            conexion.execute(
+                text("UPDATE sqlite_sequence SET seq = :seq WHERE name = :nombre"),
+                {"nombre": tabla.name, "seq": maximo}
+            )
+
+def actualizar_esquema() -> list:
+    """
+    Crea las tablas que falten, y las columnas e índices nuevos de tablas ya
+    existentes (create_all solo los crea al crear la tabla). En SQLite también
+    pasa a AUTOINCREMENT las tablas que lo piden.
+    Devuelve las columnas agregadas como "tabla.columna".
+    Requiere que los modelos ya estén importados.
+    """
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conexion:
+        agregadas = _agregar_columnas(conexion)
+        if conexion.dialect.name == "sqlite":
+            for nombre in _activar_autoincremento(conexion):
+                logger.warning("Tabla %s reconstruida con AUTOINCREMENT", nombre)
+            _ajustar_secuencias(conexion)
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                try:
+                    indice.create(bind=conexion, checkfirst=True)
+                except IntegrityError as error:
+                    # Índice único sobre datos que ya tienen duplicados: se deja sin crear
+                    # hasta que se resuelvan, en lugar de impedir que arranque el servidor
+                    logger.warning("No se pudo crear el índice %s: %s", indice.name, error.orig)
+    return agregadas
@@ -5,6 +5,7 @@ from .models import Usuario, Libro, Revista, ActaCongreso, Prestamo
 from .models import GeneroLibro, FrecuenciaPublicacion
 from .utils.security import hash_password
 from .models import RolUsuario
+from .utils import estadisticas
 
 # Datos de ejemplo
 nombres = ["Juan", "María", "Carlos", "Ana", "Luis", "Laura", "Pedro", "Sofía", "Miguel", "Elena"]
@@ -139,8 +140,9 @@ def crear_prestamos(db: Session, cantidad: int = 100):
         usuario = random.choice(usuarios)
         material = random.choice(materiales)
         
-        # Verificar si hay ejemplares disponibles
-        if material.cantidad_prestamo < material.cantidad_total:
+        # Verificar si hay ejemplares disponibles y si el usuario tiene cupo
+        if (material.cantidad_prestamo < material.cantidad_total
+                and usuario.prestamos_activos < usuario.limite_prestamos):
             fecha_prestamo = datetime.now() - timedelta(days=random.randint(0, 30))
             prestamo = Prestamo(
                 usuario_id=usuario.id,
@@ -149,6 +151,7 @@ def crear_prestamos(db: Session, cantidad: int = 100):
                 estado="activo"
             )
             material.cantidad_prestamo += 1
+            usuario.prestamos_activos += 1
             db.add(prestamo)
     db.commit()
 
@@ -163,4 +166,6 @@ def inicializar_datos(db: Session):
     crear_actas(db)
     print("Creando préstamos...")
     crear_prestamos(db)
+    print("Calculando estadísticas...")
+    estadisticas.reconstruir(db)
     print("¡Datos inicializados correctamente!") 
\ No newline at end of file
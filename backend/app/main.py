@@ -1,10 +1,16 @@
 from fastapi import FastAPI
-from .database import engine, get_db
+from .database import SessionLocal, actualizar_esquema, engine, get_db
 from . import models
 from .initial_data import inicializar_datos
 from fastapi.middleware.cors import CORSMiddleware
+from .utils.contexto import ContextoPeticionMiddleware
+from .utils import admision, auditoria, busqueda_usuarios, cupos, grabacion, replica
+from .utils.catalogo import catalogo_columnar
+from .utils.eventos import difusor_disponibilidad
+from .utils.sugerencias import indice_sugerencias
 
-models.Base.metadata.create_all(bind=engine)
+columnas_agregadas = actualizar_esquema()
+busqueda_usuarios.preparar(engine)
 
 app = FastAPI(title="Sistema de Biblioteca")
 
@@ -14,22 +20,67 @@ try:
     # Verificar si ya hay datos
     if db.query(models.Usuario).count() == 0:
         inicializar_datos(db)
+    elif "usuarios.prestamos_activos" in columnas_agregadas:
+        # Base de datos anterior al contador: se calcula a partir de los préstamos
+        cupos.reconciliar(db, corregir=True)
+    indice_sugerencias.construir(db)
+    if catalogo_columnar.activo:
+        catalogo_columnar.construir(db)
+        difusor_disponibilidad.agregar_oyente(catalogo_columnar.actualizar_disponibilidad)
 finally:
     db.close()
 
+# Cambios de estado de préstamos y solicitudes, escritos en segundo plano
+auditoria.registrar(SessionLocal)
+
+@app.on_event("shutdown")
+def vaciar_auditoria():
+    auditoria.escritor_auditoria.vaciar()
+
+# Réplica de lectura opcional para los GET, con lectura de lo propio
+# (BIBLIOTECA_DB_LECTURA_URL o REPLICA_LOCAL=1). Estado en GET /api/admin/replica.
+replica.configurar(app)
+
+@app.on_event("shutdown")
+def detener_replica():
+    replica.enrutador_lecturas.detener()
+
 # Incluir los routers - importar después de inicializar datos
-from .routers import usuarios_router, materiales_router, prestamos_router, solicitudes_prestamo_router, auth_router
+from .routers import usuarios_router, materiales_router, prestamos_router, solicitudes_prestamo_router, auth_router, estadisticas_router, admin_router, auditoria_router
 
 app.include_router(usuarios_router, prefix="/api/usuarios", tags=["usuarios"])
 app.include_router(materiales_router, prefix="/api/materiales", tags=["materiales"])
 app.include_router(prestamos_router, prefix="/api/prestamos", tags=["prestamos"])
 app.include_router(solicitudes_prestamo_router, prefix="/api/solicitudes", tags=["solicitudes"])
 app.include_router(auth_router, prefix="/api/auth", tags=["autenticación"])
+app.include_router(estadisticas_router, prefix="/api/estadisticas", tags=["estadisticas"])
+app.include_router(admin_router, prefix="/api/admin", tags=["administración"])
+app.include_router(auditoria_router, prefix="/api/auditoria", tags=["auditoría"])
 
 @app.get("/")
 def read_root():
     return {"message": "Bienvenido al Sistema de Biblioteca"}
 
+app.add_middleware(ContextoPeticionMiddleware)
+
+# Control de admisión: las rutas costosas no pueden ocupar todo el threadpool
+# y el login limita los intentos por cliente. Estado en GET /api/admin/admision.
+admision.configurar(
+    app,
+    concurrencia={
+        "/api/materiales/en-prestamo": admision.LimiteConcurrencia(maximo=2, cola=8, espera=5.0),
+        "/api/materiales/disponibles": admision.LimiteConcurrencia(maximo=2, cola=8, espera=5.0),
+        "/api/materiales/analitica": admision.LimiteConcurrencia(maximo=2, cola=8, espera=5.0),
+        "/api/prestamos/historial": admision.LimiteConcurrencia(maximo=4, cola=8, espera=5.0),
+    },
+    por_cliente={
+        "/api/auth/login": admision.LimitadorPorCliente(capacidad=10, por_minuto=20),
+    },
+)
+
+# Grabación opcional de peticiones para pruebas de carga (GRABAR_PETICIONES=archivo.jsonl)
+grabacion.configurar(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
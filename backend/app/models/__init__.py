@@ -2,7 +2,14 @@ from ..database import Base
 from .usuario import Usuario, RolUsuario  # Añadimos RolUsuario aquí
 from .material import Material, Libro, Revista, ActaCongreso, GeneroLibro, FrecuenciaPublicacion
 from .prestamo import Prestamo
-from .solicitud_prestamo import SolicitudPrestamo
+from .solicitud_prestamo import SolicitudPrestamo, CONDICION_SOLICITUD_ABIERTA
+from .estadistica import EstadisticaPrestamo
+from .lista_espera import EntradaListaEspera, ColaEspera
+from .archivo import PrestamoArchivado, SolicitudPrestamoArchivada
+from .marca_agua import MarcaAgua
+from .idempotencia import ClaveIdempotencia
+from .token_refresco import TokenRefresco
+from .auditoria import RegistroAuditoria
 
 __all__ = [
     "Usuario",
@@ -14,5 +21,15 @@ __all__ = [
     "GeneroLibro",
     "FrecuenciaPublicacion",
     "Prestamo",
-    "SolicitudPrestamo"
+    "SolicitudPrestamo",
+    "CONDICION_SOLICITUD_ABIERTA",
+    "EstadisticaPrestamo",
+    "EntradaListaEspera",
+    "ColaEspera",
+    "PrestamoArchivado",
+    "SolicitudPrestamoArchivada",
+    "MarcaAgua",
+    "ClaveIdempotencia",
+    "TokenRefresco",
+    "RegistroAuditoria"
 ]
\ No newline at end of file
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from ..database import Base
+
+class PrestamoArchivado(Base):
+    """Préstamo devuelto que salió de la tabla `prestamos`. Conserva su id original."""
+    __tablename__ = "prestamos_archivo"
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, index=True)
+    material_id = Column(Integer, index=True)
+    fecha_prestamo = Column(DateTime)
+    fecha_devolucion = Column(DateTime, nullable=True)
+    estado = Column(String)
+    fecha_archivo = Column(DateTime, default=datetime.now)
+
+class SolicitudPrestamoArchivada(Base):
+    """Solicitud aprobada o rechazada que salió de `solicitudes_prestamo`. Conserva su id original."""
+    __tablename__ = "solicitudes_prestamo_archivo"
+
+    id = Column(Integer, primary_key=True)
+    nombre_usuario = Column(String)
+    carne_identidad = Column(String, index=True)
+    direccion_usuario = Column(String)
+    material_id = Column(Integer, index=True)
+    fecha_solicitud = Column(DateTime)
+    estado = Column(String)
+    observaciones = Column(String, nullable=True)
+    fecha_archivo = Column(DateTime, default=datetime.now)
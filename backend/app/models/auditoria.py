@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from ..database import Base
+
+class RegistroAuditoria(Base):
+    """
+    Cambio de estado de un préstamo o una solicitud. Solo se insertan filas:
+    las escribe en lotes el hilo de utils/auditoria.py.
+    """
+    __tablename__ = "auditoria"
+
+    id = Column(Integer, primary_key=True)
+    fecha = Column(DateTime, nullable=False)
+    actor = Column(String, nullable=True)  # email del token, o None si no hubo usuario autenticado
+    ruta = Column(String, nullable=True)  # 'PUT /api/prestamos/{prestamo_id}', o None fuera de una petición
+    entidad = Column(String, nullable=False)  # 'prestamo' o 'solicitud'
+    entidad_id = Column(Integer, nullable=False)
+    accion = Column(String, nullable=False)  # 'crear', 'cambiar_estado' o 'eliminar'
+    estado_anterior = Column(String, nullable=True)
+    estado_nuevo = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_auditoria_entidad", "entidad", "entidad_id", "id"),
+        Index("ix_auditoria_actor", "actor", "id"),
+    )
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, Index
+from ..database import Base
+
+class EstadisticaPrestamo(Base):
+    """
+    Contadores agregados de préstamos, mantenidos en la misma transacción
+    que el préstamo, la devolución o la aprobación que los modifica.
+
+    dimension: 'mes' (clave 'AAAA-MM'), 'tipo', 'genero' o 'material' (clave = id).
+    """
+    __tablename__ = "estadisticas_prestamo"
+
+    dimension = Column(String, primary_key=True)
+    clave = Column(String, primary_key=True)
+    prestamos = Column(Integer, default=0, nullable=False)
+    devoluciones = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        Index("ix_estadisticas_prestamo_dimension_prestamos", "dimension", "prestamos"),
+    )
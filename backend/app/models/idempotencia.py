@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+from ..database import Base
+
+class ClaveIdempotencia(Base):
+    """
+    Respuesta guardada para una cabecera Idempotency-Key. Se escribe en la misma
+    transacción que el préstamo o la solicitud que creó la petición original.
+    """
+    __tablename__ = "claves_idempotencia"
+
+    clave = Column(String, primary_key=True)
+    ruta = Column(String, primary_key=True)
+    usuario = Column(String, primary_key=True)  # email del token, o "" si la petición es anónima
+    huella_cuerpo = Column(String, nullable=False)
+    estado_http = Column(Integer, nullable=False)
+    respuesta = Column(Text, nullable=False)
+    creado_en = Column(DateTime, default=datetime.now, nullable=False, index=True)
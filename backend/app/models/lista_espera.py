@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..database import Base
+
+class EntradaListaEspera(Base):
+    """Solicitud en espera de un ejemplar, en orden FIFO por material."""
+    __tablename__ = "lista_espera"
+
+    id = Column(Integer, primary_key=True, index=True)
+    material_id = Column(Integer, ForeignKey("materiales.id"), nullable=False)
+    posicion = Column(Integer, nullable=False)
+    solicitud_id = Column(Integer, ForeignKey("solicitudes_prestamo.id"), unique=True, nullable=False)
+    fecha_ingreso = Column(DateTime, default=datetime.now)
+
+    solicitud = relationship("SolicitudPrestamo")
+
+    __table_args__ = (
+        Index("ix_lista_espera_material_posicion", "material_id", "posicion", unique=True),
+    )
+
+class ColaEspera(Base):
+    """Cabecera de la lista de espera de un material: próxima posición y longitud."""
+    __tablename__ = "colas_espera"
+
+    material_id = Column(Integer, ForeignKey("materiales.id"), primary_key=True)
+    siguiente_posicion = Column(Integer, default=1, nullable=False)
+    longitud = Column(Integer, default=0, nullable=False)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime
+from ..database import Base
+
+class MarcaAgua(Base):
+    """
+    Hasta dónde llegó la última ejecución de un proceso incremental
+    (por ejemplo, la reconciliación de cantidad_prestamo).
+    """
+    __tablename__ = "marcas_agua"
+
+    proceso = Column(String, primary_key=True)
+    valor = Column(DateTime, nullable=False)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Enum, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
+from datetime import datetime
 from ..database import Base
 
 class GeneroLibro(str, PyEnum):
@@ -26,6 +27,8 @@ class Material(Base):
     editorial = Column(String)
     cantidad_total = Column(Integer)
     cantidad_prestamo = Column(Integer, default=0)
+    # Última modificación; la reconciliación incremental solo revisa los materiales tocados
+    modificado_en = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)
 
     __mapper_args__ = {
         'polymorphic_identity': 'material',
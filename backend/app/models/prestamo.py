@@ -7,11 +7,14 @@ class Prestamo(Base):
     __tablename__ = "prestamos"
 
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"))
-    material_id = Column(Integer, ForeignKey("materiales.id"))
-    fecha_prestamo = Column(DateTime, default=datetime.now)
-    fecha_devolucion = Column(DateTime, nullable=True)
-    estado = Column(String, default="activo")  # activo, devuelto
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), index=True)
+    material_id = Column(Integer, ForeignKey("materiales.id"), index=True)
+    fecha_prestamo = Column(DateTime, default=datetime.now, index=True)
+    fecha_devolucion = Column(DateTime, nullable=True, index=True)
+    estado = Column(String, default="activo", index=True)  # activo, devuelto
 
     usuario = relationship("Usuario", back_populates="prestamos")
     material = relationship("Material")
+
+    # AUTOINCREMENT: los ids de préstamos que pasaron al archivo no se vuelven a usar
+    __table_args__ = {"sqlite_autoincrement": True}
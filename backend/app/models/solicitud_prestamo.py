@@ -1,8 +1,12 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..database import Base
 
+# Solicitudes abiertas: un usuario solo puede tener una por material. Se escribe
+# literal porque SQLite solo usa el índice parcial si la consulta repite su WHERE.
+CONDICION_SOLICITUD_ABIERTA = "estado IN ('pendiente', 'en_espera')"
+
 class SolicitudPrestamo(Base):
     __tablename__ = "solicitudes_prestamo"
 
@@ -12,7 +16,19 @@ class SolicitudPrestamo(Base):
     direccion_usuario = Column(String)
     material_id = Column(Integer, ForeignKey("materiales.id"))
     fecha_solicitud = Column(DateTime, default=datetime.now)
-    estado = Column(String, default="pendiente")  # pendiente, aprobada, rechazada
+    estado = Column(String, default="pendiente", index=True)  # pendiente, en_espera, aprobada, rechazada
     observaciones = Column(String, nullable=True)
 
-    material = relationship("Material") 
\ No newline at end of file
+    material = relationship("Material")
+
+    __table_args__ = (
+        Index(
+            "ux_solicitudes_prestamo_abiertas",
+            "carne_identidad",
+            "material_id",
+            unique=True,
+            sqlite_where=text(CONDICION_SOLICITUD_ABIERTA),
+        ),
+        # AUTOINCREMENT: los ids de solicitudes que pasaron al archivo no se vuelven a usar
+        {"sqlite_autoincrement": True},
+    )
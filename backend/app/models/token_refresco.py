@@ -0,0 +1,17 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from datetime import datetime
+from ..database import Base
+
+class TokenRefresco(Base):
+    """
+    Token de refresco emitido en el login. Cada uso lo revoca y emite otro
+    (`reemplazado_por`); presentar uno ya revocado revoca todos los del usuario.
+    """
+    __tablename__ = "tokens_refresco"
+
+    jti = Column(String, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    expira_en = Column(DateTime, nullable=False, index=True)
+    revocado = Column(Boolean, nullable=False, default=False, server_default="0")
+    reemplazado_por = Column(String, nullable=True)
+    creado_en = Column(DateTime, default=datetime.now, nullable=False)
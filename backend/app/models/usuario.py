@@ -3,6 +3,9 @@ from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
 from ..database import Base
 
+# Préstamos activos simultáneos permitidos si no se configura otro límite para el usuario
+LIMITE_PRESTAMOS_POR_DEFECTO = 5
+
 class RolUsuario(str, PyEnum):
     ADMIN = "admin"
     USUARIO = "usuario"
@@ -17,5 +20,13 @@ class Usuario(Base):
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
     rol = Column(Enum(RolUsuario), default=RolUsuario.USUARIO)
+    # Contador desnormalizado de préstamos activos; se mantiene junto a cantidad_prestamo
+    prestamos_activos = Column(Integer, nullable=False, default=0, server_default="0")
+    limite_prestamos = Column(
+        Integer,
+        nullable=False,
+        default=LIMITE_PRESTAMOS_POR_DEFECTO,
+        server_default=str(LIMITE_PRESTAMOS_POR_DEFECTO)
+    )
 
     prestamos = relationship("Prestamo", back_populates="usuario")
\ No newline at end of file
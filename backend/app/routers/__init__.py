@@ -3,11 +3,17 @@ from .materiales import router as materiales_router
 from .prestamos import router as prestamos_router
 from .solicitudes_prestamo import router as solicitudes_prestamo_router
 from .auth import router as auth_router
+from .estadisticas import router as estadisticas_router
+from .admin import router as admin_router
+from .auditoria import router as auditoria_router
 
 __all__ = [
     "usuarios_router",
     "materiales_router",
     "prestamos_router",
     "solicitudes_prestamo_router",
-    "auth_router"
+    "auth_router",
+    "estadisticas_router",
+    "admin_router",
+    "auditoria_router"
 ]
\ No newline at end of file
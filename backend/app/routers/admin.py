@@ -0,0 +1,59 @@
+import os
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+
+from ..schemas import respaldo as respaldo_schema
+from ..utils import admision, replica, respaldo
+from ..utils.conexiones import estadisticas_retencion
+from ..utils.security import get_current_admin
+
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+@router.post("/respaldos", response_model=respaldo_schema.Respaldo, status_code=status.HTTP_202_ACCEPTED)
+def crear_respaldo(datos: respaldo_schema.RespaldoCreate, background_tasks: BackgroundTasks):
+    """
+    Inicia una copia consistente de la base de datos en segundo plano.
+    El avance se consulta con GET /api/admin/respaldos/{id}.
+    """
+    destino = None
+    if datos.nombre:
+        if os.path.basename(datos.nombre) != datos.nombre or not datos.nombre.endswith(".db"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El nombre debe ser un archivo .db sin rutas"
+            )
+        destino = os.path.join(respaldo.CARPETA_RESPALDOS, datos.nombre)
+    if datos.paginas_por_paso <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="paginas_por_paso debe ser mayor que cero"
+        )
+
+    trabajo = respaldo.crear_trabajo(destino)
+    background_tasks.add_task(respaldo.ejecutar_trabajo, trabajo, datos.paginas_por_paso)
+    return trabajo.como_dict()
+
+@router.get("/respaldos/{trabajo_id}", response_model=respaldo_schema.Respaldo)
+def obtener_respaldo(trabajo_id: str):
+    trabajo = respaldo.obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Respaldo no encontrado")
+    return trabajo.como_dict()
+
+@router.get("/conexiones")
+def obtener_retencion_conexiones():
+    """
+    Tiempo que cada ruta retiene una conexión a la base de datos
+    (desde que la pide al pool hasta que la devuelve), de mayor a menor total.
+    """
+    return estadisticas_retencion.resumen()
+
+@router.get("/admision")
+def obtener_admision():
+    """Estado de los límites de concurrencia por ruta y de intentos por cliente."""
+    return admision.resumen()
+
+@router.get("/replica")
+def obtener_replica():
+    """Estado de la réplica de lectura: atraso, copias y lecturas servidas por cada base de datos."""
+    return replica.enrutador_lecturas.estado()
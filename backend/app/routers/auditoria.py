@@ -0,0 +1,41 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..schemas import auditoria as auditoria_schema
+from ..utils.replica import get_read_db
+from ..utils.security import get_current_admin
+
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+@router.get("/", response_model=auditoria_schema.PaginaAuditoria)
+def obtener_auditoria(
+    entidad: Optional[auditoria_schema.EntidadAuditada] = None,
+    entidad_id: Optional[int] = None,
+    actor: Optional[str] = None,
+    antes_de: Optional[int] = None,
+    limite: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Cambios de estado de préstamos y solicitudes, del más reciente al más antiguo.
+    La página siguiente se pide con `antes_de=<siguiente>` (paginación por id,
+    sin OFFSET). Los registros se escriben en segundo plano, así que un cambio
+    puede tardar unos instantes en aparecer.
+    """
+    tabla = models.RegistroAuditoria
+    consulta = db.query(tabla)
+    if entidad is not None:
+        consulta = consulta.filter(tabla.entidad == entidad.value)
+    if entidad_id is not None:
+        consulta = consulta.filter(tabla.entidad_id == entidad_id)
+    if actor is not None:
+        consulta = consulta.filter(tabla.actor == actor)
+    if antes_de is not None:
+        consulta = consulta.filter(tabla.id < antes_de)
+    registros = consulta.order_by(tabla.id.desc()).limit(limite + 1).all()
+
+    siguiente = registros[limite - 1].id if len(registros) > limite else None
+    return {"registros": registros[:limite], "siguiente": siguiente}
@@ -9,11 +9,12 @@ from datetime import datetime
 from ..database import get_db
 from .. import models
 from ..schemas import usuario
-from ..utils.security import authenticate_user, create_access_token, hash_password, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_user
+from ..utils import tokens_refresco
+from ..utils.security import authenticate_user, hash_password, get_current_user
 
 router = APIRouter()
 
-@router.post("/login", response_model=dict)
+@router.post("/login", response_model=usuario.Tokens)
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -22,11 +23,22 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Email o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email, "rol": user.rol}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    tokens = tokens_refresco.emitir(db, user)
+    db.commit()
+    return tokens
+
+@router.post("/refresh", response_model=usuario.Tokens)
+def refresh_access_token(datos: usuario.SolicitudRefresco, db: Session = Depends(get_db)):
+    """
+    Cambia un token de refresco por un token de acceso nuevo y otro de refresco
+    (el usado queda revocado). No consulta al usuario ni verifica la contraseña.
+    """
+    return tokens_refresco.rotar(db, datos.refresh_token)
+
+@router.post("/logout")
+def logout(datos: usuario.SolicitudRefresco, db: Session = Depends(get_db)):
+    tokens_refresco.revocar(db, datos.refresh_token)
+    return {"message": "Sesión cerrada"}
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 def register_user(user_data: usuario.UsuarioCreate, db: Session = Depends(get_db)):
@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from ..schemas import estadistica
+from ..utils import estadisticas
+from ..utils.replica import get_read_db
+
+router = APIRouter()
+
+@router.get("/", response_model=estadistica.Estadisticas)
+def obtener_estadisticas(db: Session = Depends(get_read_db)):
+    """
+    Devuelve en una sola respuesta los préstamos por mes, por tipo de material,
+    por género y los materiales más prestados, leídos de las tablas de resumen.
+    """
+    return estadisticas.obtener_resumen(db)
@@ -1,18 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, with_polymorphic
+from typing import List, Optional, Union
+from collections import defaultdict
 from sqlalchemy import asc, func
 from ..database import get_db
 from .. import models
 from ..schemas import material
+from ..utils import analitica, lista_espera
+from ..utils.catalogo import catalogo_columnar
+from ..utils.eventos import difusor_disponibilidad
+from ..utils.parametros import MAX_IDS_LOTE, parsear_campos, parsear_ids
+from ..utils.replica import get_read_db
+from ..utils.sugerencias import indice_sugerencias
 
 router = APIRouter()
 
+# Campos que se pueden pedir con `fields=` en los listados
+CAMPOS_MATERIAL = [
+    "id", "tipo", "identificador", "titulo", "autor", "anio_publicacion", "anio_llegada",
+    "editorial", "cantidad_total", "cantidad_prestamo", "factor_estancia",
+]
+
 def calcular_y_agregar_factor_estancia(db_material: models.Material) -> material.Material:
     material_dict = db_material.__dict__
     material_dict['factor_estancia'] = db_material.calcular_factor_estancia()
     return material.Material(**material_dict)
 
+def listar_campos(db: Session, modelo, campos: List[str], skip: int, limit: int) -> List[dict]:
+    """
+    Página de materiales con solo los campos pedidos. Si no se pide factor_estancia
+    se proyectan únicamente esas columnas, sin cargar entidades ni calcular el factor.
+    """
+    if "factor_estancia" not in campos:
+        filas = db.query(*[getattr(modelo, campo) for campo in campos]).offset(skip).limit(limit).all()
+        return [dict(zip(campos, fila)) for fila in filas]
+
+    resultado = []
+    for db_material in db.query(modelo).offset(skip).limit(limit).all():
+        fila = {campo: getattr(db_material, campo) for campo in campos if campo != "factor_estancia"}
+        fila["factor_estancia"] = db_material.calcular_factor_estancia()
+        resultado.append(fila)
+    return resultado
+
 @router.post("/libros/", response_model=material.Material)
 def crear_libro(libro_data: material.LibroCreate, db: Session = Depends(get_db)):
     # Verificar si el identificador ya existe
@@ -22,10 +52,13 @@ def crear_libro(libro_data: material.LibroCreate, db: Session = Depends(get_db))
             detail="Ya existe un material con este identificador"
         )
     
-    db_libro = models.Libro(**libro_data.dict())
+    db_libro = models.Libro(**libro_data.dict(exclude={"cantidad_prestamo"}))
     db.add(db_libro)
     db.commit()
     db.refresh(db_libro)
+    indice_sugerencias.agregar(db_libro.id, db_libro.titulo, db_libro.autor)
+    if catalogo_columnar.activo:
+        catalogo_columnar.agregar(db_libro)
     return calcular_y_agregar_factor_estancia(db_libro)
 
 @router.post("/revistas/", response_model=material.Material)
@@ -37,10 +70,13 @@ def crear_revista(revista_data: material.RevistaCreate, db: Session = Depends(ge
             detail="Ya existe un material con este identificador"
         )
     
-    db_revista = models.Revista(**revista_data.dict())
+    db_revista = models.Revista(**revista_data.dict(exclude={"cantidad_prestamo"}))
     db.add(db_revista)
     db.commit()
     db.refresh(db_revista)
+    indice_sugerencias.agregar(db_revista.id, db_revista.titulo, db_revista.autor)
+    if catalogo_columnar.activo:
+        catalogo_columnar.agregar(db_revista)
     return calcular_y_agregar_factor_estancia(db_revista)
 
 @router.post("/actas/", response_model=material.Material)
@@ -52,15 +88,31 @@ def crear_acta(acta_data: material.ActaCongresoCreate, db: Session = Depends(get
             detail="Ya existe un material con este identificador"
         )
     
-    db_acta = models.ActaCongreso(**acta_data.dict())
+    db_acta = models.ActaCongreso(**acta_data.dict(exclude={"cantidad_prestamo"}))
     db.add(db_acta)
     db.commit()
     db.refresh(db_acta)
+    indice_sugerencias.agregar(db_acta.id, db_acta.titulo, db_acta.autor)
+    if catalogo_columnar.activo:
+        catalogo_columnar.agregar(db_acta)
     return calcular_y_agregar_factor_estancia(db_acta)
 
 @router.get("/", response_model=dict)
-def obtener_materiales(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_materiales(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Lista los materiales. Con `fields=titulo,autor` solo se devuelven esos campos (e `id`).
+    """
+    campos = parsear_campos(fields, CAMPOS_MATERIAL)
+    if catalogo_columnar.activo:
+        return {"materials": catalogo_columnar.pagina(skip, limit, campos=campos), "total": catalogo_columnar.contar()}
     total = db.query(models.Material).count()  # Total de materiales
+    if campos:
+        return {"materials": listar_campos(db, models.Material, campos, skip, limit), "total": total}
     materiales = db.query(models.Material).offset(skip).limit(limit).all()
     return {
         "materials": [calcular_y_agregar_factor_estancia(m) for m in materiales],
@@ -68,10 +120,26 @@ def obtener_materiales(skip: int = 0, limit: int = 100, db: Session = Depends(ge
     }
 
 @router.get("/ordenados/", response_model=List[material.Material])
-def obtener_materiales_ordenados(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_materiales_ordenados(
+    skip: int = 0,
+    limit: int = 100,
+    criterio: material.CriterioOrden = material.CriterioOrden.AUTOR,
+    db: Session = Depends(get_read_db)
+):
     """
-    Obtiene un listado de materiales ordenados por autor y título.
+    Obtiene un listado de materiales ordenados por autor y título o, con
+    `criterio=factor`, por factor de estancia de mayor a menor. El orden por
+    factor solo está disponible con el catálogo columnar (CATALOGO_COLUMNAR=1).
     """
+    if catalogo_columnar.activo:
+        return catalogo_columnar.ordenados(skip, limit, criterio.value)
+    if criterio == material.CriterioOrden.FACTOR:
+        # El factor se calcula en Python: sin el catálogo en memoria habría que
+        # cargar y ordenar todos los materiales en cada petición
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El orden por factor de estancia requiere el catálogo columnar (CATALOGO_COLUMNAR=1)"
+        )
     materiales = (
         db.query(models.Material)
         .order_by(asc(models.Material.autor), asc(models.Material.titulo))
@@ -82,11 +150,14 @@ def obtener_materiales_ordenados(skip: int = 0, limit: int = 100, db: Session =
     return [calcular_y_agregar_factor_estancia(m) for m in materiales]
 
 @router.get("/disponibles", response_model=List[material.MaterialDisponible])
-def obtener_materiales_disponibles(db: Session = Depends(get_db)):
+def obtener_materiales_disponibles(db: Session = Depends(get_read_db)):
     """
     Obtiene la cantidad de materiales disponibles por tipo en la biblioteca.
     Incluye el título de cada material.
     """
+    if catalogo_columnar.activo:
+        return catalogo_columnar.disponibles()
+
     # Obtener la cantidad total y en préstamo de cada tipo de material
     materiales_disponibles = []
 
@@ -159,7 +230,7 @@ def obtener_materiales_disponibles(db: Session = Depends(get_db)):
     return materiales_disponibles
 
 @router.get("/en-prestamo", response_model=List[material.MaterialEnPrestamo])
-def obtener_materiales_en_prestamo(db: Session = Depends(get_db)):
+def obtener_materiales_en_prestamo(db: Session = Depends(get_read_db)):
     """
     Obtiene un listado de todos los materiales que están actualmente en préstamo,
     ordenados por su factor de estancia de mayor a menor.
@@ -256,9 +327,175 @@ def obtener_materiales_en_prestamo(db: Session = Depends(get_db)):
     
     return materiales_en_prestamo
 
+def _valor_faceta(valor) -> Optional[str]:
+    if valor is None:
+        return None
+    return str(valor.value if hasattr(valor, "value") else valor)
+
+@router.get("/filtrar", response_model=material.CatalogoFiltrado)
+def filtrar_materiales(
+    tipo: Optional[str] = None,
+    genero: Optional[material.GeneroLibro] = None,
+    frecuencia_publicacion: Optional[material.FrecuenciaPublicacion] = None,
+    editorial: Optional[str] = None,
+    anio_publicacion_desde: Optional[int] = None,
+    anio_publicacion_hasta: Optional[int] = None,
+    anio_llegada_desde: Optional[int] = None,
+    anio_llegada_hasta: Optional[int] = None,
+    disponible: Optional[bool] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Filtra el catálogo combinando los filtros dados (los rangos de años incluyen
+    ambos extremos) y devuelve, además de la página pedida, los conteos por tipo,
+    género, frecuencia, editorial y década de publicación del resultado completo.
+    Los conteos y el total salen de una sola consulta agrupada por la combinación
+    de esas dimensiones, que luego se suma por dimensión.
+    """
+    poly = with_polymorphic(models.Material, [models.Libro, models.Revista, models.ActaCongreso])
+
+    condiciones = []
+    if tipo is not None:
+        condiciones.append(poly.tipo == tipo)
+    if genero is not None:
+        condiciones.append(poly.Libro.genero == models.GeneroLibro(genero.value))
+    if frecuencia_publicacion is not None:
+        condiciones.append(
+            poly.Revista.frecuencia_publicacion == models.FrecuenciaPublicacion(frecuencia_publicacion.value)
+        )
+    if editorial is not None:
+        condiciones.append(poly.editorial == editorial)
+    if anio_publicacion_desde is not None:
+        condiciones.append(poly.anio_publicacion >= anio_publicacion_desde)
+    if anio_publicacion_hasta is not None:
+        condiciones.append(poly.anio_publicacion <= anio_publicacion_hasta)
+    if anio_llegada_desde is not None:
+        condiciones.append(poly.anio_llegada >= anio_llegada_desde)
+    if anio_llegada_hasta is not None:
+        condiciones.append(poly.anio_llegada <= anio_llegada_hasta)
+    if disponible is not None:
+        hay_ejemplares = poly.cantidad_prestamo < poly.cantidad_total
+        condiciones.append(hay_ejemplares if disponible else ~hay_ejemplares)
+
+    decada = poly.anio_publicacion - poly.anio_publicacion % 10
+    dimensiones = {
+        "tipo": poly.tipo,
+        "genero": poly.Libro.genero,
+        "frecuencia_publicacion": poly.Revista.frecuencia_publicacion,
+        "editorial": poly.editorial,
+        "decada": decada,
+    }
+    grupos = (
+        db.query(*dimensiones.values(), func.count(poly.id))
+        .filter(*condiciones)
+        .group_by(*dimensiones.values())
+        .all()
+    )
+
+    conteos = {nombre: defaultdict(int) for nombre in dimensiones}
+    total = 0
+    for fila in grupos:
+        cantidad = fila[-1]
+        total += cantidad
+        for nombre, valor in zip(dimensiones, fila[:-1]):
+            valor = _valor_faceta(valor)
+            if valor is not None:
+                conteos[nombre][valor] += cantidad
+    facetas = {
+        nombre: [
+            {"valor": valor, "cantidad": cantidad}
+            for valor, cantidad in sorted(valores.items(), key=lambda par: (-par[1], par[0]))
+        ]
+        for nombre, valores in conteos.items()
+    }
+
+    materiales = (
+        db.query(poly)
+        .filter(*condiciones)
+        .order_by(poly.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    ) if total else []
+    return {
+        "materials": [calcular_y_agregar_factor_estancia(m) for m in materiales],
+        "total": total,
+        "facetas": facetas,
+    }
+
+@router.get("/analitica", response_model=material.AnaliticaFactor)
+def analitica_factor_estancia(
+    cubetas: int = Query(analitica.CUBETAS_HISTOGRAMA, ge=1, le=200),
+    limite_atipicos: int = Query(analitica.LIMITE_ATIPICOS, ge=0, le=500),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Distribución del factor de estancia de todo el catálogo: percentiles,
+    histogramas por tipo, género y frecuencia, y materiales atípicos. Las
+    columnas se leen en una sola consulta y el factor se calcula vectorizado.
+    """
+    return analitica.analizar(db, cubetas, limite_atipicos)
+
+@router.get("/lote", response_model=material.MaterialesLote)
+def obtener_materiales_lote(ids: str = Query(...), db: Session = Depends(get_read_db)):
+    """
+    Resuelve varios materiales por id (`ids=3,1,7`, hasta MAX_IDS_LOTE) con una
+    sola consulta polimórfica. Se devuelven en el orden pedido; los ids que no
+    existen se informan en `faltantes`.
+    """
+    ids_pedidos = parsear_ids(ids, maximo=MAX_IDS_LOTE)
+    poly = with_polymorphic(models.Material, [models.Libro, models.Revista, models.ActaCongreso])
+    encontrados = {
+        m.id: m for m in db.query(poly).filter(poly.id.in_(ids_pedidos)).all()
+    } if ids_pedidos else {}
+    return {
+        "materials": [calcular_y_agregar_factor_estancia(encontrados[i]) for i in ids_pedidos if i in encontrados],
+        "faltantes": [i for i in ids_pedidos if i not in encontrados],
+    }
+
+@router.get("/sugerir", response_model=List[material.Sugerencia])
+def sugerir_materiales(
+    prefijo: str = Query(..., min_length=1, max_length=100),
+    limite: int = Query(10, ge=1, le=50)
+):
+    """
+    Títulos y autores con alguna palabra que empieza con `prefijo` (sin distinguir
+    mayúsculas ni tildes), desde el índice en memoria: no consulta la base de datos.
+    """
+    return indice_sugerencias.sugerir(prefijo, limite)
+
+@router.get("/sugerir/memoria", response_model=material.MemoriaSugerencias)
+def memoria_sugerencias():
+    """Tamaño y memoria aproximada del índice de sugerencias."""
+    return indice_sugerencias.memoria()
+
+@router.get("/catalogo/memoria", response_model=material.MemoriaCatalogo)
+def memoria_catalogo():
+    """
+    Memoria del catálogo columnar (CATALOGO_COLUMNAR=1) y su extrapolación a
+    un millón de materiales.
+    """
+    return catalogo_columnar.memoria()
+
+@router.get("/eventos")
+async def eventos_disponibilidad(ids: Optional[str] = None):
+    """
+    Flujo SSE con los cambios de disponibilidad de los materiales.
+    Cada evento `disponibilidad` contiene `{material_id, cantidad_disponible}`.
+    Con `ids=1,2,3` solo se reciben los cambios de esos materiales.
+    """
+    suscripcion = difusor_disponibilidad.suscribir(parsear_ids(ids))
+    return StreamingResponse(
+        difusor_disponibilidad.flujo(suscripcion),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 
 @router.get("/{material_id}", response_model=material.Material)
-def obtener_material(material_id: int, db: Session = Depends(get_db)):
+def obtener_material(material_id: int, db: Session = Depends(get_read_db)):
     # Intenta buscar en cada tipo de material específico
     material_result = None
 
@@ -306,12 +543,24 @@ def actualizar_material(
                 detail="Ya existe un material con este identificador"
             )
     
-    # Actualizar los campos
-    for key, value in material_data.dict().items():
+    disponibles_antes = db_material.cantidad_total - db_material.cantidad_prestamo
+
+    # Actualizar los campos. cantidad_prestamo solo la cambian los préstamos
+    for key, value in material_data.dict(exclude={"cantidad_prestamo"}).items():
         setattr(db_material, key, value)
+
+    # Los ejemplares nuevos pasan primero a la lista de espera, uno por solicitud
+    while lista_espera.promover_siguiente(db, db_material):
+        pass
+    disponibles = db_material.cantidad_total - db_material.cantidad_prestamo
     
     db.commit()
     db.refresh(db_material)
+    if disponibles != disponibles_antes:
+        difusor_disponibilidad.publicar(db_material.id, disponibles)
+    indice_sugerencias.agregar(db_material.id, db_material.titulo, db_material.autor)
+    if catalogo_columnar.activo:
+        catalogo_columnar.agregar(db_material)
     return calcular_y_agregar_factor_estancia(db_material)
 
 @router.delete("/{material_id}")
@@ -329,15 +578,32 @@ def eliminar_material(material_id: int, db: Session = Depends(get_db)):
     
     db.delete(db_material)
     db.commit()
+    indice_sugerencias.quitar(material_id)
+    if catalogo_columnar.activo:
+        catalogo_columnar.quitar(material_id)
     return {"message": "Material eliminado correctamente"}
 
 
 @router.get("/libros/", response_model=dict)
-def obtener_libros(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_libros(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
     """
     Obtiene un listado de todos los libros disponibles en la biblioteca.
+    Con `fields=` solo se devuelven los campos pedidos (e `id`).
     """
+    campos = parsear_campos(fields, CAMPOS_MATERIAL + ["genero"])
+    if catalogo_columnar.activo:
+        return {
+            "materials": catalogo_columnar.pagina(skip, limit, tipo="libro", campos=campos),
+            "total": catalogo_columnar.contar("libro")
+        }
     total = db.query(models.Libro).count()
+    if campos:
+        return {"materials": listar_campos(db, models.Libro, campos, skip, limit), "total": total}
     libros = db.query(models.Libro).offset(skip).limit(limit).all()
 
     result = []
@@ -353,11 +619,25 @@ def obtener_libros(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
 
 
 @router.get("/revistas/", response_model=dict)
-def obtener_revistas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_revistas(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
     """
     Obtiene un listado de todas las revistas disponibles en la biblioteca.
+    Con `fields=` solo se devuelven los campos pedidos (e `id`).
     """
+    campos = parsear_campos(fields, CAMPOS_MATERIAL + ["frecuencia_publicacion"])
+    if catalogo_columnar.activo:
+        return {
+            "materials": catalogo_columnar.pagina(skip, limit, tipo="revista", campos=campos),
+            "total": catalogo_columnar.contar("revista")
+        }
     total = db.query(models.Revista).count()
+    if campos:
+        return {"materials": listar_campos(db, models.Revista, campos, skip, limit), "total": total}
     revistas = db.query(models.Revista).offset(skip).limit(limit).all()
 
     result = []
@@ -373,11 +653,25 @@ def obtener_revistas(skip: int = 0, limit: int = 100, db: Session = Depends(get_
 
 
 @router.get("/actas/", response_model=dict)
-def obtener_actas(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_actas(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
     """
     Obtiene un listado de todas las actas de congreso disponibles en la biblioteca.
+    Con `fields=` solo se devuelven los campos pedidos (e `id`).
     """
+    campos = parsear_campos(fields, CAMPOS_MATERIAL + ["nombre_congreso"])
+    if catalogo_columnar.activo:
+        return {
+            "materials": catalogo_columnar.pagina(skip, limit, tipo="acta", campos=campos),
+            "total": catalogo_columnar.contar("acta")
+        }
     total = db.query(models.ActaCongreso).count()
+    if campos:
+        return {"materials": listar_campos(db, models.ActaCongreso, campos, skip, limit), "total": total}
     actas = db.query(models.ActaCongreso).offset(skip).limit(limit).all()
 
     result = []
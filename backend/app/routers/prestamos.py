@@ -1,54 +1,192 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Query, Session
+from typing import List, Optional
 from datetime import datetime
 from ..database import get_db
 from .. import models
 from ..schemas import prestamo
+from ..utils import archivo, commit_agrupado, cupos, estadisticas, lista_espera
+from ..utils.eventos import difusor_disponibilidad
+from ..utils.idempotencia import Idempotencia, idempotencia
+from ..utils.parametros import parsear_campos
+from ..utils.replica import get_read_db
 
 router = APIRouter()
 
+# Campos que se pueden pedir con `fields=` en el listado
+CAMPOS_PRESTAMO = ["id", "usuario_id", "material_id", "fecha_prestamo", "fecha_devolucion", "estado"]
+
 @router.post("/", response_model=prestamo.Prestamo)
-def crear_prestamo(prestamo_data: prestamo.PrestamoCreate, db: Session = Depends(get_db)):
-    # Verificar si el usuario existe
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == prestamo_data.usuario_id).first()
-    if not usuario:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Usuario no encontrado"
-        )
-    
-    # Verificar si el material existe
-    material = db.query(models.Material).filter(models.Material.id == prestamo_data.material_id).first()
-    if not material:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Material no encontrado"
-        )
-    
-    # Verificar si hay ejemplares disponibles
-    if material.cantidad_prestamo >= material.cantidad_total:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No hay ejemplares disponibles para préstamo"
-        )
-    
-    # Crear el préstamo
-    db_prestamo = models.Prestamo(**prestamo_data.dict())
-    material.cantidad_prestamo += 1
-    
-    db.add(db_prestamo)
-    db.commit()
-    db.refresh(db_prestamo)
+def crear_prestamo(
+    prestamo_data: prestamo.PrestamoCreate,
+    db: Session = Depends(get_db),
+    idem: Idempotencia = Depends(idempotencia)
+):
+    """
+    Crea un préstamo. Con la cabecera Idempotency-Key, los reintentos reciben
+    la respuesta original sin crear otro préstamo ni ocupar otro ejemplar.
+    """
+    previa = idem.respuesta_previa(db)
+    if previa:
+        return previa
+
+    def crear(sesion: Session):
+        # Verificar si el usuario existe
+        usuario = sesion.query(models.Usuario).filter(models.Usuario.id == prestamo_data.usuario_id).first()
+        if not usuario:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuario no encontrado"
+            )
+
+        # Verificar si el material existe
+        material = sesion.query(models.Material).filter(models.Material.id == prestamo_data.material_id).first()
+        if not material:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Material no encontrado"
+            )
+
+        # Verificar si hay ejemplares disponibles
+        if material.cantidad_prestamo >= material.cantidad_total:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No hay ejemplares disponibles para préstamo"
+            )
+
+        # Reservar un cupo del usuario (falla si alcanzó su límite de préstamos)
+        if not cupos.reservar(sesion, usuario.id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El usuario alcanzó su límite de préstamos activos"
+            )
+
+        # Crear el préstamo
+        db_prestamo = models.Prestamo(**prestamo_data.dict(), fecha_prestamo=datetime.now())
+        material.cantidad_prestamo += 1
+        estadisticas.registrar_prestamo(sesion, material, db_prestamo.fecha_prestamo)
+        cambio = (material.id, material.cantidad_total - material.cantidad_prestamo)
+
+        sesion.add(db_prestamo)
+        sesion.flush()
+        idem.guardar(sesion, prestamo.Prestamo, db_prestamo)
+        return db_prestamo, cambio
+
+    try:
+        db_prestamo, cambio = commit_agrupado.ejecutar(db, crear)
+    except IntegrityError as error:
+        # Una petición simultánea con la misma Idempotency-Key confirmó antes
+        return idem.tras_conflicto(db, error)
+    difusor_disponibilidad.publicar(*cambio)
     return db_prestamo
 
+def _columna_fecha(campo_fecha: prestamo.CampoFecha):
+    if campo_fecha == prestamo.CampoFecha.DEVOLUCION:
+        return models.Prestamo.fecha_devolucion
+    return models.Prestamo.fecha_prestamo
+
+def _filtrar(
+    consulta: Query,
+    campo_fecha: prestamo.CampoFecha,
+    desde: Optional[datetime],
+    hasta: Optional[datetime],
+    estado: Optional[str],
+    usuario_id: Optional[int],
+    material_id: Optional[int]
+) -> Query:
+    columna = _columna_fecha(campo_fecha)
+    if desde is not None:
+        consulta = consulta.filter(columna >= desde)
+    if hasta is not None:
+        consulta = consulta.filter(columna < hasta)
+    if estado is not None:
+        consulta = consulta.filter(models.Prestamo.estado == estado)
+    if usuario_id is not None:
+        consulta = consulta.filter(models.Prestamo.usuario_id == usuario_id)
+    if material_id is not None:
+        consulta = consulta.filter(models.Prestamo.material_id == material_id)
+    return consulta
+
 @router.get("/", response_model=List[prestamo.Prestamo])
-def obtener_prestamos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    prestamos = db.query(models.Prestamo).offset(skip).limit(limit).all()
+def obtener_prestamos(
+    skip: int = 0,
+    limit: int = 100,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    campo_fecha: prestamo.CampoFecha = prestamo.CampoFecha.PRESTAMO,
+    estado: Optional[str] = None,
+    usuario_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    fields: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Lista los préstamos. `desde` (incluido) y `hasta` (excluido) filtran por la
+    fecha de préstamo o, con `campo_fecha=devolucion`, por la de devolución.
+    Con `fields=material_id,estado` solo se leen y devuelven esos campos (e `id`).
+    """
+    campos = parsear_campos(fields, CAMPOS_PRESTAMO)
+    entidad = [getattr(models.Prestamo, campo) for campo in campos] if campos else [models.Prestamo]
+    consulta = _filtrar(
+        db.query(*entidad), campo_fecha, desde, hasta, estado, usuario_id, material_id
+    )
+    if desde is not None or hasta is not None:
+        consulta = consulta.order_by(_columna_fecha(campo_fecha), models.Prestamo.id)
+    prestamos = consulta.offset(skip).limit(limit).all()
+    if campos:
+        # Respuesta parcial: no se valida contra el esquema completo de préstamo
+        return JSONResponse(jsonable_encoder([dict(zip(campos, fila)) for fila in prestamos]))
     return prestamos
 
+@router.get("/histograma", response_model=List[prestamo.CubetaHistograma])
+def obtener_histograma_prestamos(
+    intervalo: prestamo.Intervalo = prestamo.Intervalo.DIA,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    campo_fecha: prestamo.CampoFecha = prestamo.CampoFecha.PRESTAMO,
+    estado: Optional[str] = None,
+    usuario_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Cantidad de préstamos (o devoluciones, con `campo_fecha=devolucion`) por día
+    o por semana, agrupados en SQL. Las semanas empiezan el lunes.
+    Solo se devuelven las cubetas con al menos un préstamo.
+    """
+    columna = _columna_fecha(campo_fecha)
+    if intervalo == prestamo.Intervalo.SEMANA:
+        # 'weekday 0' avanza al domingo (o se queda si ya lo es); 6 días antes es el lunes
+        cubeta = func.date(columna, "weekday 0", "-6 days")
+    else:
+        cubeta = func.date(columna)
+    consulta = _filtrar(
+        db.query(cubeta.label("inicio"), func.count(models.Prestamo.id).label("cantidad")),
+        campo_fecha, desde, hasta, estado, usuario_id, material_id
+    )
+    filas = consulta.filter(columna.isnot(None)).group_by(cubeta).order_by(cubeta).all()
+    return [{"inicio": fila.inicio, "cantidad": fila.cantidad} for fila in filas]
+
+@router.get("/historial", response_model=List[prestamo.PrestamoHistorial])
+def obtener_historial_prestamos(
+    usuario_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Obtiene el historial de préstamos, incluidos los ya archivados,
+    del más reciente al más antiguo. Se puede filtrar por usuario y por material.
+    """
+    return archivo.historial_prestamos(db, usuario_id, material_id, skip, limit)
+
 @router.get("/{prestamo_id}", response_model=prestamo.Prestamo)
-def obtener_prestamo(prestamo_id: int, db: Session = Depends(get_db)):
+def obtener_prestamo(prestamo_id: int, db: Session = Depends(get_read_db)):
     db_prestamo = db.query(models.Prestamo).filter(models.Prestamo.id == prestamo_id).first()
     if db_prestamo is None:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
@@ -64,12 +202,19 @@ def actualizar_prestamo(
     if db_prestamo is None:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
+    cambio = None
+
     # Si se está marcando como devuelto
     if prestamo_update.estado == "devuelto" and db_prestamo.estado != "devuelto":
         material = db.query(models.Material).filter(models.Material.id == db_prestamo.material_id).first()
+        prestamo_update.fecha_devolucion = datetime.now()
+        estadisticas.registrar_devolucion(db, material, prestamo_update.fecha_devolucion)
+        cupos.liberar(db, db_prestamo.usuario_id)
         if material:
             material.cantidad_prestamo -= 1
-        prestamo_update.fecha_devolucion = datetime.now()
+            # El ejemplar devuelto pasa directamente al primero de la lista de espera
+            lista_espera.promover_siguiente(db, material)
+            cambio = (material.id, material.cantidad_total - material.cantidad_prestamo)
     
     # Actualizar los campos
     for key, value in prestamo_update.dict(exclude_unset=True).items():
@@ -77,6 +222,8 @@ def actualizar_prestamo(
     
     db.commit()
     db.refresh(db_prestamo)
+    if cambio:
+        difusor_disponibilidad.publicar(*cambio)
     return db_prestamo
 
 @router.delete("/{prestamo_id}")
@@ -85,20 +232,32 @@ def eliminar_prestamo(prestamo_id: int, db: Session = Depends(get_db)):
     if db_prestamo is None:
         raise HTTPException(status_code=404, detail="Préstamo no encontrado")
     
+    material = db.query(models.Material).filter(models.Material.id == db_prestamo.material_id).first()
+
+    cambio = None
+
     # Si el préstamo está activo, actualizar la cantidad de materiales prestados
+    # y los préstamos activos del usuario
     if db_prestamo.estado == "activo":
-        material = db.query(models.Material).filter(models.Material.id == db_prestamo.material_id).first()
+        cupos.liberar(db, db_prestamo.usuario_id)
         if material:
             material.cantidad_prestamo -= 1
+            # El ejemplar liberado pasa directamente al primero de la lista de espera
+            lista_espera.promover_siguiente(db, material)
+            cambio = (material.id, material.cantidad_total - material.cantidad_prestamo)
+
+    estadisticas.anular_prestamo(db, material, db_prestamo)
     
     db.delete(db_prestamo)
     db.commit()
+    if cambio:
+        difusor_disponibilidad.publicar(*cambio)
     return {"message": "Préstamo eliminado correctamente"}
 
 @router.get("/cliente/{carne_identidad}", response_model=List[prestamo.MaterialPrestado])
 def obtener_materiales_prestados_por_cliente(
     carne_identidad: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtiene una lista de materiales prestados a un cliente específico por su carné de identidad.
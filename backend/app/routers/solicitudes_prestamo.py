@@ -1,50 +1,90 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import datetime
 from ..database import get_db
 from .. import models
 from ..schemas import solicitud_prestamo
+from ..utils import archivo, commit_agrupado, cupos, estadisticas, lista_espera
+from ..utils.eventos import difusor_disponibilidad
+from ..utils.idempotencia import Idempotencia, idempotencia
+from ..utils.replica import get_read_db
 
 router = APIRouter()
 
+def _solicitud_abierta(db: Session, carne_identidad: str, material_id: int) -> Optional[models.SolicitudPrestamo]:
+    # Búsqueda sobre el índice único parcial de solicitudes abiertas
+    return db.query(models.SolicitudPrestamo).filter(
+        models.SolicitudPrestamo.carne_identidad == carne_identidad,
+        models.SolicitudPrestamo.material_id == material_id,
+        text(models.CONDICION_SOLICITUD_ABIERTA)
+    ).first()
+
 @router.post("/", response_model=solicitud_prestamo.SolicitudPrestamo)
 def crear_solicitud(
     solicitud: solicitud_prestamo.SolicitudPrestamoCreate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idem: Idempotencia = Depends(idempotencia)
 ):
-    # Verificar si el material existe
-    material = db.query(models.Material).filter(models.Material.id == solicitud.material_id).first()
-    if not material:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Material no encontrado"
-        )
-    
-    # Verificar si hay ejemplares disponibles
-    if material.cantidad_prestamo >= material.cantidad_total:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="No hay ejemplares disponibles para préstamo"
+    """
+    Crea una solicitud de préstamo. Si el usuario ya tiene una solicitud abierta
+    (pendiente o en espera) para el mismo material, devuelve esa en lugar de crear otra.
+    Con la cabecera Idempotency-Key, los reintentos reciben la respuesta original.
+    """
+    previa = idem.respuesta_previa(db)
+    if previa:
+        return previa
+
+    existente = _solicitud_abierta(db, solicitud.carne_identidad, solicitud.material_id)
+    if existente:
+        return existente
+
+    def crear(sesion: Session):
+        # Verificar si el material existe
+        material = sesion.query(models.Material).filter(models.Material.id == solicitud.material_id).first()
+        if not material:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Material no encontrado"
+            )
+
+        # Crear la solicitud
+        db_solicitud = models.SolicitudPrestamo(
+            nombre_usuario=solicitud.nombre_usuario,
+            carne_identidad=solicitud.carne_identidad,
+            direccion_usuario=solicitud.direccion_usuario,
+            material_id=solicitud.material_id,
+            observaciones=solicitud.observaciones
         )
-    
-    # Crear la solicitud
-    db_solicitud = models.SolicitudPrestamo(
-        nombre_usuario=solicitud.nombre_usuario,
-        carne_identidad=solicitud.carne_identidad,
-        direccion_usuario=solicitud.direccion_usuario,
-        material_id=solicitud.material_id,
-        observaciones=solicitud.observaciones
-    )
-    db.add(db_solicitud)
-    db.commit()
-    db.refresh(db_solicitud)
-    return db_solicitud
+        sesion.add(db_solicitud)
+        sesion.flush()
+
+        # Si no hay ejemplares disponibles, la solicitud pasa a la lista de espera
+        if material.cantidad_prestamo >= material.cantidad_total:
+            lista_espera.encolar(sesion, db_solicitud)
+            sesion.flush()
+
+        idem.guardar(sesion, solicitud_prestamo.SolicitudPrestamo, db_solicitud)
+        return db_solicitud
+
+    try:
+        return commit_agrupado.ejecutar(db, crear)
+    except IntegrityError as error:
+        # Otra petición creó la misma solicitud entre la búsqueda y el INSERT,
+        # o confirmó antes con la misma Idempotency-Key
+        db.rollback()
+        existente = _solicitud_abierta(db, solicitud.carne_identidad, solicitud.material_id)
+        if existente:
+            return existente
+        return idem.tras_conflicto(db, error)
 
 @router.get("/", response_model=List[solicitud_prestamo.SolicitudPrestamo])
 def obtener_solicitudes(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     solicitudes = db.query(models.SolicitudPrestamo).offset(skip).limit(limit).all()
     return solicitudes
@@ -53,7 +93,7 @@ def obtener_solicitudes(
 def obtener_solicitudes_revistas(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Obtiene un listado de todas las solicitudes de revistas con el nombre del cliente,
@@ -84,10 +124,43 @@ def obtener_solicitudes_revistas(
         for s, titulo in solicitudes
     ]
 
+@router.get("/historial/{carne_identidad}", response_model=List[solicitud_prestamo.SolicitudHistorial])
+def obtener_historial_solicitudes(
+    carne_identidad: str,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_read_db)
+):
+    """
+    Obtiene todas las solicitudes de un usuario, incluidas las ya archivadas,
+    de la más reciente a la más antigua.
+    """
+    return archivo.historial_solicitudes(db, carne_identidad, skip, limit)
+
+@router.get("/espera/{material_id}", response_model=solicitud_prestamo.ColaEspera)
+def obtener_cola_espera(material_id: int, db: Session = Depends(get_read_db)):
+    """
+    Devuelve cuántas solicitudes esperan un ejemplar del material.
+    """
+    return {"material_id": material_id, "longitud": lista_espera.longitud(db, material_id)}
+
+@router.get("/{solicitud_id}/posicion", response_model=solicitud_prestamo.PosicionEspera)
+def obtener_posicion_espera(solicitud_id: int, db: Session = Depends(get_read_db)):
+    """
+    Devuelve la posición de una solicitud en la lista de espera de su material.
+    """
+    posicion = lista_espera.posicion(db, solicitud_id)
+    if posicion is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="La solicitud no está en lista de espera"
+        )
+    return posicion
+
 @router.get("/{solicitud_id}", response_model=solicitud_prestamo.SolicitudPrestamo)
 def obtener_solicitud(
     solicitud_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     solicitud = db.query(models.SolicitudPrestamo).filter(models.SolicitudPrestamo.id == solicitud_id).first()
     if not solicitud:
@@ -111,6 +184,8 @@ def actualizar_solicitud(
             detail="Solicitud no encontrada"
         )
 
+    cambio = None
+
     # Si se aprueba la solicitud, crear un préstamo
     if solicitud_update.estado == "aprobada" and db_solicitud.estado != "aprobada":
         # Buscar al usuario por carne_identidad
@@ -134,22 +209,44 @@ def actualizar_solicitud(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No hay ejemplares disponibles para préstamo"
             )
+        if not cupos.reservar(db, usuario.id):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El usuario alcanzó su límite de préstamos activos"
+            )
 
         # Crear el préstamo
         db_prestamo = models.Prestamo(
             usuario_id=usuario.id,
             material_id=db_solicitud.material_id,
+            fecha_prestamo=datetime.now(),
             estado="activo"
         )
         material.cantidad_prestamo += 1
+        estadisticas.registrar_prestamo(db, material, db_prestamo.fecha_prestamo)
+        cambio = (material.id, material.cantidad_total - material.cantidad_prestamo)
         db.add(db_prestamo)
 
+    # Si deja de estar en espera, sale de la lista
+    if (db_solicitud.estado == lista_espera.ESTADO_EN_ESPERA
+            and solicitud_update.estado not in (None, lista_espera.ESTADO_EN_ESPERA)):
+        lista_espera.retirar(db, db_solicitud.id)
+
     # Actualizar los campos de la solicitud
     for key, value in solicitud_update.dict(exclude_unset=True).items():
         setattr(db_solicitud, key, value)
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="El usuario ya tiene una solicitud abierta para este material"
+        )
     db.refresh(db_solicitud)
+    if cambio:
+        difusor_disponibilidad.publicar(*cambio)
     return db_solicitud
 
 @router.delete("/{solicitud_id}")
@@ -164,12 +261,15 @@ def eliminar_solicitud(
             detail="Solicitud no encontrada"
         )
     
+    if db_solicitud.estado == lista_espera.ESTADO_EN_ESPERA:
+        lista_espera.retirar(db, db_solicitud.id)
+
     db.delete(db_solicitud)
     db.commit()
     return {"message": "Solicitud eliminada correctamente"}
 
 @router.get("/cliente/{carne_identidad}", response_model=List[solicitud_prestamo.SolicitudPrestamo])
-def obtener_solicitudes_por_usuario(carne_identidad: str, db: Session = Depends(get_db)):
+def obtener_solicitudes_por_usuario(carne_identidad: str, db: Session = Depends(get_read_db)):
     """
     Obtiene todas las solicitudes de préstamo realizadas por un usuario específico
     identificado por su carné de identidad.
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from .. import models
 from ..schemas import usuario
+from ..utils import busqueda_usuarios, tokens_refresco
+from ..utils.parametros import MAX_IDS_LOTE, parsear_ids
+from ..utils.replica import get_read_db
+from ..utils.security import get_current_admin
 
 router = APIRouter()
 
@@ -16,12 +20,39 @@ def crear_usuario(usuario_data: usuario.UsuarioCreate, db: Session = Depends(get
     return db_usuario
 
 @router.get("/", response_model=List[usuario.Usuario])
-def obtener_usuarios(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def obtener_usuarios(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
     usuarios = db.query(models.Usuario).offset(skip).limit(limit).all()
     return usuarios
 
+@router.get("/buscar", response_model=List[usuario.UsuarioBusqueda])
+def buscar_usuarios(
+    q: str = Query(..., min_length=3, max_length=100),
+    limite: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Busca usuarios por nombre, carné o email aunque el texto esté incompleto
+    o mal escrito. Los resultados se ordenan por similitud (0 a 1).
+    """
+    return busqueda_usuarios.buscar(db, q, limite)
+
+@router.get("/lote", response_model=usuario.UsuariosLote)
+def obtener_usuarios_lote(ids: str = Query(...), db: Session = Depends(get_read_db)):
+    """
+    Resuelve varios usuarios por id (`ids=3,1,7`, hasta MAX_IDS_LOTE) con una sola
+    consulta. Se devuelven en el orden pedido; los ids que no existen van en `faltantes`.
+    """
+    ids_pedidos = parsear_ids(ids, maximo=MAX_IDS_LOTE)
+    encontrados = {
+        u.id: u for u in db.query(models.Usuario).filter(models.Usuario.id.in_(ids_pedidos)).all()
+    } if ids_pedidos else {}
+    return {
+        "usuarios": [encontrados[i] for i in ids_pedidos if i in encontrados],
+        "faltantes": [i for i in ids_pedidos if i not in encontrados],
+    }
+
 @router.get("/{usuario_id}", response_model=usuario.Usuario)
-def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
+def obtener_usuario(usuario_id: int, db: Session = Depends(get_read_db)):
     db_usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if db_usuario is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -33,19 +64,49 @@ def actualizar_usuario(usuario_id: int, usuario_data: usuario.UsuarioCreate, db:
     if db_usuario is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
+    identidad = (db_usuario.email, db_usuario.rol)
     for key, value in usuario_data.dict().items():
         setattr(db_usuario, key, value)
+
+    # Los tokens de refresco llevan el email y el rol en sus claims: con otros
+    # datos seguirían emitiendo tokens de acceso para la identidad anterior
+    if (db_usuario.email, db_usuario.rol) != identidad:
+        tokens_refresco.revocar_usuario(db, usuario_id)
     
     db.commit()
     db.refresh(db_usuario)
     return db_usuario
 
+@router.put(
+    "/{usuario_id}/limite-prestamos",
+    response_model=usuario.Usuario,
+    dependencies=[Depends(get_current_admin)]
+)
+def actualizar_limite_prestamos(
+    usuario_id: int,
+    datos: usuario.LimitePrestamosUpdate,
+    db: Session = Depends(get_db)
+):
+    """
+    Cambia la cantidad de préstamos activos simultáneos permitidos al usuario.
+    Bajar el límite no afecta a los préstamos ya activos.
+    """
+    db_usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+    if db_usuario is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    db_usuario.limite_prestamos = datos.limite_prestamos
+    db.commit()
+    db.refresh(db_usuario)
+    return db_usuario
+
 @router.delete("/{usuario_id}")
 def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db)):
     db_usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if db_usuario is None:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
+    tokens_refresco.revocar_usuario(db, usuario_id)
     db.delete(db_usuario)
     db.commit()
     return {"message": "Usuario eliminado correctamente"}
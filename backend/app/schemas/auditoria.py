@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+class EntidadAuditada(str, Enum):
+    PRESTAMO = "prestamo"
+    SOLICITUD = "solicitud"
+
+class RegistroAuditoria(BaseModel):
+    id: int
+    fecha: datetime
+    actor: Optional[str] = None
+    ruta: Optional[str] = None
+    entidad: str
+    entidad_id: int
+    accion: str
+    estado_anterior: Optional[str] = None
+    estado_nuevo: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+class PaginaAuditoria(BaseModel):
+    registros: List[RegistroAuditoria]
+    siguiente: Optional[int] = None  # valor para `antes_de` en la página siguiente
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import List
+
+class EstadisticaMensual(BaseModel):
+    mes: str
+    prestamos: int
+    devoluciones: int
+
+class EstadisticaCategoria(BaseModel):
+    clave: str
+    prestamos: int
+    devoluciones: int
+    activos: int
+
+class MaterialMasPrestado(BaseModel):
+    material_id: int
+    tipo: str
+    titulo: str
+    autor: str
+    prestamos: int
+
+class Estadisticas(BaseModel):
+    por_mes: List[EstadisticaMensual]
+    por_tipo: List[EstadisticaCategoria]
+    por_genero: List[EstadisticaCategoria]
+    mas_prestados: List[MaterialMasPrestado]
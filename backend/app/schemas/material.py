@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from enum import Enum
 from datetime import datetime
 
@@ -59,3 +59,77 @@ class MaterialEnPrestamo(BaseModel):
 
     class Config:
         from_attributes = True
+
+class MaterialesLote(BaseModel):
+    materials: List[Material]
+    faltantes: List[int]
+
+class Faceta(BaseModel):
+    valor: str
+    cantidad: int
+
+class CatalogoFiltrado(BaseModel):
+    materials: List[Material]
+    total: int
+    facetas: Dict[str, List[Faceta]]
+
+class Sugerencia(BaseModel):
+    material_id: int
+    campo: str  # 'titulo' o 'autor'
+    texto: str
+
+class MemoriaSugerencias(BaseModel):
+    entradas: int
+    max_entradas: int
+    materiales: int
+    materiales_omitidos: int
+    bytes_aprox: int
+
+class CriterioOrden(str, Enum):
+    AUTOR = "autor"
+    FACTOR = "factor"
+
+class MemoriaCatalogo(BaseModel):
+    activo: bool
+    materiales: int
+    textos_internados: int
+    posiciones_sin_uso: int
+    bytes_columnas: int
+    bytes_permutaciones: int
+    bytes_textos: int
+    bytes_indice_ids: int
+    bytes_total: int
+    bytes_por_millon: int
+
+class ResumenFactor(BaseModel):
+    cantidad: int
+    minimo: Optional[float] = None
+    maximo: Optional[float] = None
+    media: Optional[float] = None
+    desviacion: Optional[float] = None
+    percentiles: Dict[str, Optional[float]]
+
+class GrupoFactor(ResumenFactor):
+    valor: Optional[str] = None  # None: libros sin género o revistas sin frecuencia
+    histograma: List[int]
+
+class MaterialAtipico(BaseModel):
+    id: int
+    tipo: str
+    factor_estancia: float
+
+class AtipicosFactor(BaseModel):
+    limite_inferior: Optional[float] = None
+    limite_superior: Optional[float] = None
+    cantidad: int
+    materiales: List[MaterialAtipico]
+
+class AnaliticaFactor(BaseModel):
+    total: int
+    validos: int
+    invalidos: int  # Materiales cuyo calcular_factor_estancia() falla (p. ej. libros con llegada 0)
+    resumen: ResumenFactor
+    bordes: List[float]
+    histograma: List[int]
+    grupos: Dict[str, List[GrupoFactor]]
+    atipicos: AtipicosFactor
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
+from enum import Enum
 from typing import Optional, List
 
 class PrestamoBase(BaseModel):
@@ -22,6 +23,21 @@ class Prestamo(PrestamoBase):
     class Config:
         orm_mode = True
 
+class PrestamoHistorial(Prestamo):
+    archivado: bool = False
+
+class CampoFecha(str, Enum):
+    PRESTAMO = "prestamo"
+    DEVOLUCION = "devolucion"
+
+class Intervalo(str, Enum):
+    DIA = "dia"
+    SEMANA = "semana"
+
+class CubetaHistograma(BaseModel):
+    inicio: date  # día, o lunes de la semana
+    cantidad: int
+
 class MaterialPrestado(BaseModel):
     titulo: str
     autor: str
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+class RespaldoCreate(BaseModel):
+    nombre: Optional[str] = None  # nombre del archivo dentro de la carpeta de respaldos
+    paginas_por_paso: int = 256
+
+class Respaldo(BaseModel):
+    id: str
+    destino: str
+    estado: str  # en_curso, completado, fallido
+    paginas_copiadas: int
+    paginas_totales: int
+    porcentaje: float
+    integridad: Optional[List[str]] = None
+    error: Optional[str] = None
+    iniciado: datetime
+    finalizado: Optional[datetime] = None
@@ -24,6 +24,9 @@ class SolicitudPrestamo(SolicitudPrestamoBase):
     class Config:
         orm_mode = True
 
+class SolicitudHistorial(SolicitudPrestamo):
+    archivado: bool = False
+
 class SolicitudRevistaDetalle(BaseModel):
     id: int
     nombre_usuario: str
@@ -34,4 +37,14 @@ class SolicitudRevistaDetalle(BaseModel):
     observaciones: Optional[str] = None
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class ColaEspera(BaseModel):
+    material_id: int
+    longitud: int
+
+class PosicionEspera(BaseModel):
+    solicitud_id: int
+    material_id: int
+    posicion: int
+    longitud: int
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List
 from ..models.usuario import RolUsuario
 
 class UsuarioBase(BaseModel):
@@ -13,6 +14,26 @@ class UsuarioCreate(UsuarioBase):
 class Usuario(UsuarioBase):
     id: int
     rol: RolUsuario
+    prestamos_activos: int = 0
+    limite_prestamos: int
 
     class Config:
-        from_attributes = True  # Solo usamos esta propiedad, eliminamos orm_mode
\ No newline at end of file
+        from_attributes = True  # Solo usamos esta propiedad, eliminamos orm_mode
+
+class LimitePrestamosUpdate(BaseModel):
+    limite_prestamos: int = Field(..., ge=0)
+
+class UsuarioBusqueda(Usuario):
+    similitud: float
+
+class UsuariosLote(BaseModel):
+    usuarios: List[Usuario]
+    faltantes: List[int]
+
+class Tokens(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str
+
+class SolicitudRefresco(BaseModel):
+    refresh_token: str
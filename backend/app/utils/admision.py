@@ -0,0 +1,177 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from starlette.responses import JSONResponse
+
+# Clientes distintos que recuerda cada limitador; se olvidan los menos recientes
+MAX_CLIENTES_RECORDADOS = 10000
+
+
+class LimiteConcurrencia:
+    """
+    Como mucho `maximo` peticiones a la vez en la ruta y `cola` esperando turno.
+    Una petición que encuentra la cola llena, o que espera más de `espera`
+    segundos, se rechaza enseguida en lugar de ocupar un hilo del threadpool.
+    Se usa solo desde el bucle de eventos del servidor, así que no lleva locks.
+    """
+
+    def __init__(self, maximo: int, cola: int = 0, espera: float = 1.0):
+        self.maximo = maximo
+        self.cola = cola
+        self.espera = espera
+        self.en_curso = 0
+        self.en_espera = 0
+        self.admitidas = 0
+        self.rechazadas = 0
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._bucle = None
+
+    async def entrar(self) -> bool:
+        bucle = asyncio.get_running_loop()
+        if self._bucle is not bucle:
+            # Un semáforo queda ligado al bucle donde se usó por primera vez
+            self._semaforo = asyncio.Semaphore(self.maximo)
+            self._bucle = bucle
+            self.en_curso = self.en_espera = 0
+        if self._semaforo.locked() and self.en_espera >= self.cola:
+            self.rechazadas += 1
+            return False
+        self.en_espera += 1
+        try:
+            await asyncio.wait_for(self._semaforo.acquire(), self.espera)
+        except asyncio.TimeoutError:
+            self.rechazadas += 1
+            return False
+        finally:
+            self.en_espera -= 1
+        self.en_curso += 1
+        self.admitidas += 1
+        return True
+
+    def salir(self):
+        self.en_curso -= 1
+        self._semaforo.release()
+
+    def como_dict(self) -> dict:
+        return {
+            "maximo": self.maximo,
+            "cola": self.cola,
+            "espera_s": self.espera,
+            "en_curso": self.en_curso,
+            "en_espera": self.en_espera,
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+class LimitadorPorCliente:
+    """Cubo de fichas por cliente: ráfagas de `capacidad` y `por_minuto` fichas repuestas por minuto."""
+
+    def __init__(self, capacidad: int, por_minuto: float, max_clientes: int = MAX_CLIENTES_RECORDADOS):
+        self.capacidad = max(1, capacidad)
+        self.por_segundo = por_minuto / 60
+        self.max_clientes = max_clientes
+        self.admitidas = 0
+        self.rechazadas = 0
+        self._cubos: "OrderedDict[str, list]" = OrderedDict()
+
+    def permitir(self, cliente: str) -> float:
+        """Devuelve 0 si se admite, o los segundos hasta que el cliente tenga otra ficha."""
+        ahora = time.monotonic()
+        cubo = self._cubos.pop(cliente, None) or [float(self.capacidad), ahora]
+        cubo[0] = min(self.capacidad, cubo[0] + (ahora - cubo[1]) * self.por_segundo)
+        cubo[1] = ahora
+        self._cubos[cliente] = cubo
+        if len(self._cubos) > self.max_clientes:
+            self._cubos.popitem(last=False)
+        if cubo[0] < 1:
+            self.rechazadas += 1
+            return (1 - cubo[0]) / self.por_segundo
+        cubo[0] -= 1
+        self.admitidas += 1
+        return 0.0
+
+    def como_dict(self) -> dict:
+        return {
+            "capacidad": self.capacidad,
+            "por_minuto": round(self.por_segundo * 60, 3),
+            "clientes": len(self._cubos),
+            "admitidas": self.admitidas,
+            "rechazadas": self.rechazadas,
+        }
+
+
+_concurrencia: Dict[str, LimiteConcurrencia] = {}
+_por_cliente: Dict[str, LimitadorPorCliente] = {}
+
+
+def _normalizar(camino: str) -> str:
+    return camino.rstrip("/") or "/"
+
+
+async def _rechazar(scope, receive, send, estado: int, detalle: str, segundos: float):
+    respuesta = JSONResponse(
+        {"detail": detalle},
+        status_code=estado,
+        headers={"Retry-After": str(max(1, math.ceil(segundos)))},
+    )
+    await respuesta(scope, receive, send)
+
+
+class AdmisionMiddleware:
+    """
+    Middleware ASGI que aplica, antes de llegar al endpoint, los límites por
+    cliente (429) y de concurrencia por ruta (503), ambos con Retry-After.
+    """
+
+    def __init__(self, app, concurrencia: Dict[str, LimiteConcurrencia], por_cliente: Dict[str, LimitadorPorCliente]):
+        self.app = app
+        self.concurrencia = concurrencia
+        self.por_cliente = por_cliente
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        camino = _normalizar(scope["path"])
+
+        limitador = self.por_cliente.get(camino)
+        if limitador is not None:
+            cliente = (scope.get("client") or ("",))[0]
+            espera = limitador.permitir(cliente)
+            if espera:
+                await _rechazar(scope, receive, send, 429, "Demasiados intentos, espere antes de reintentar", espera)
+                return
+
+        limite = self.concurrencia.get(camino)
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+        if not await limite.entrar():
+            await _rechazar(scope, receive, send, 503, "Servidor ocupado, reintente en unos segundos", limite.espera)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limite.salir()
+
+
+def configurar(
+    app,
+    concurrencia: Optional[Dict[str, LimiteConcurrencia]] = None,
+    por_cliente: Optional[Dict[str, LimitadorPorCliente]] = None
+):
+    """Registra los límites (por camino exacto, sin barra final) e instala el middleware."""
+    _concurrencia.update({_normalizar(c): l for c, l in (concurrencia or {}).items()})
+    _por_cliente.update({_normalizar(c): l for c, l in (por_cliente or {}).items()})
+    app.add_middleware(AdmisionMiddleware, concurrencia=_concurrencia, por_cliente=_por_cliente)
+
+
+def resumen() -> dict:
+    return {
+        "concurrencia": {camino: limite.como_dict() for camino, limite in _concurrencia.items()},
+        "por_cliente": {camino: limitador.como_dict() for camino, limitador in _por_cliente.items()},
+    }
@@ -0,0 +1,252 @@
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session, with_polymorphic
+
+from .. import models
+from .catalogo import MODELOS, TIPOS
+
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+CUBETAS_HISTOGRAMA = 20
+LIMITE_ATIPICOS = 50
+# Atípicos: fuera de [Q1 - k·IQR, Q3 + k·IQR] (criterio de Tukey)
+FACTOR_IQR = 1.5
+
+GENEROS = list(models.GeneroLibro)
+FRECUENCIAS = list(models.FrecuenciaPublicacion)
+
+
+def _multiplicadores(tipo: str, campo: str, valores: list) -> np.ndarray:
+    """
+    Multiplicador de cada valor de la variante (posición 0: sin valor), obtenido
+    del propio método del modelo con base 1 (año de publicación 0, llegada 1):
+    así no se repiten aquí los números de models/material.py.
+    """
+    metodo = MODELOS[tipo].calcular_factor_estancia
+    return np.array([
+        metodo(SimpleNamespace(anio_publicacion=0, anio_llegada=1, **{campo: valor}))
+        for valor in [None] + valores
+    ], dtype=np.float64)
+
+
+def _codigos(valores: list, opciones: list) -> np.ndarray:
+    posicion = {opcion: i + 1 for i, opcion in enumerate(opciones)}
+    return np.fromiter((posicion.get(v, 0) for v in valores), dtype=np.int8, count=len(valores))
+
+
+def cargar(db: Session) -> Dict[str, np.ndarray]:
+    """Columnas necesarias para el factor, leídas de una vez (sin objetos ORM)."""
+    materiales = models.Material.__table__
+    libros = models.Libro.__table__
+    revistas = models.Revista.__table__
+    filas = db.execute(
+        select(
+            materiales.c.id,
+            materiales.c.tipo,
+            materiales.c.anio_publicacion,
+            materiales.c.anio_llegada,
+            libros.c.genero,
+            revistas.c.frecuencia_publicacion,
+        )
+        .select_from(materiales)
+        .outerjoin(libros, libros.c.id == materiales.c.id)
+        .outerjoin(revistas, revistas.c.id == materiales.c.id)
+        .order_by(materiales.c.id)
+    ).all()
+    ids, tipos, publicacion, llegada, generos, frecuencias = zip(*filas) if filas else ([],) * 6
+    n = len(filas)
+    return {
+        "id": np.fromiter(ids, dtype=np.int64, count=n),
+        "tipo": _codigos(tipos, TIPOS[1:]),
+        # None se lee como NaN para marcar los años sin valor
+        "anio_publicacion": np.array(publicacion, dtype=np.float64),
+        "anio_llegada": np.array(llegada, dtype=np.float64),
+        "genero": _codigos(generos, GENEROS),
+        "frecuencia_publicacion": _codigos(frecuencias, FRECUENCIAS),
+    }
+
+
+def calcular_factores(columnas: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Factor de estancia de todos los materiales en una pasada, con el mismo
+    resultado que calcular_factor_estancia() de cada clase. NaN donde el método
+    escalar lanza una excepción:
+    - Libro: sin protección, falla con año de llegada 0 o con años sin valor.
+    - Revista: con año de llegada 0 devuelve 0.0, pero falla con años sin valor.
+    - Material y Acta: 0.0 si la llegada es <= 0 o falta algún año.
+    """
+    tipo = columnas["tipo"]
+    publicacion = columnas["anio_publicacion"]
+    llegada = columnas["anio_llegada"]
+    n = len(tipo)
+
+    sin_anios = np.isnan(publicacion) | np.isnan(llegada)
+    base = np.divide(
+        publicacion + 1, llegada,
+        out=np.full(n, np.nan), where=(llegada != 0) & ~sin_anios,
+    )
+    factores = np.full(n, np.nan)
+
+    generico = (tipo == TIPOS.index("material")) | (tipo == TIPOS.index("acta"))
+    factores[generico] = np.where(
+        sin_anios[generico] | (llegada[generico] <= 0), 0.0, base[generico]
+    )
+
+    libro = tipo == TIPOS.index("libro")
+    multiplicador = _multiplicadores("libro", "genero", GENEROS)[columnas["genero"][libro]]
+    factores[libro] = base[libro] * multiplicador
+
+    revista = tipo == TIPOS.index("revista")
+    multiplicador = _multiplicadores("revista", "frecuencia_publicacion", FRECUENCIAS)[
+        columnas["frecuencia_publicacion"][revista]
+    ]
+    factores[revista] = np.where(
+        ~sin_anios[revista] & (llegada[revista] == 0), 0.0, base[revista] * multiplicador
+    )
+    return factores
+
+
+def _resumen(valores: np.ndarray) -> dict:
+    if not len(valores):
+        return {"cantidad": 0, "minimo": None, "maximo": None, "media": None, "desviacion": None,
+                "percentiles": {f"p{p}": None for p in PERCENTILES}}
+    return {
+        "cantidad": int(len(valores)),
+        "minimo": float(valores.min()),
+        "maximo": float(valores.max()),
+        "media": float(valores.mean()),
+        "desviacion": float(valores.std()),
+        "percentiles": {
+            f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(valores, PERCENTILES))
+        },
+    }
+
+
+def _grupo(valor: str, valores: np.ndarray, bordes: np.ndarray) -> dict:
+    return {
+        "valor": valor,
+        **_resumen(valores),
+        "histograma": np.histogram(valores, bins=bordes)[0].tolist() if len(bordes) else [],
+    }
+
+
+def analizar(db: Session, cubetas: int = CUBETAS_HISTOGRAMA, limite_atipicos: int = LIMITE_ATIPICOS) -> dict:
+    """
+    Distribución del factor de estancia de todo el catálogo: resumen con
+    percentiles, histograma (los mismos bordes para todos los grupos) por tipo,
+    género y frecuencia, y los materiales atípicos más alejados.
+    """
+    columnas = cargar(db)
+    factores = calcular_factores(columnas)
+    validos = ~np.isnan(factores)
+    valores = factores[validos]
+
+    bordes = np.histogram_bin_edges(valores, bins=cubetas) if len(valores) else np.array([])
+    tipo = columnas["tipo"]
+    grupos = {
+        "tipo": [
+            _grupo(nombre, factores[validos & (tipo == codigo)], bordes)
+            for codigo, nombre in enumerate(TIPOS)
+        ],
+        "genero": [
+            _grupo(nombre, factores[validos & (tipo == TIPOS.index("libro")) & (columnas["genero"] == codigo)], bordes)
+            for codigo, nombre in enumerate([None] + [g.value for g in GENEROS])
+        ],
+        "frecuencia_publicacion": [
+            _grupo(nombre, factores[validos & (tipo == TIPOS.index("revista")) & (columnas["frecuencia_publicacion"] == codigo)], bordes)
+            for codigo, nombre in enumerate([None] + [f.value for f in FRECUENCIAS])
+        ],
+    }
+
+    atipicos = {"limite_inferior": None, "limite_superior": None, "cantidad": 0, "materiales": []}
+    if len(valores):
+        q1, q3 = np.percentile(valores, [25, 75])
+        inferior, superior = q1 - FACTOR_IQR * (q3 - q1), q3 + FACTOR_IQR * (q3 - q1)
+        fuera = validos & ((factores < inferior) | (factores > superior))
+        indices = np.flatnonzero(fuera)
+        distancia = np.maximum(inferior - factores[indices], factores[indices] - superior)
+        # Los más alejados primero; a igual distancia, por id
+        indices = indices[np.lexsort((columnas["id"][indices], -distancia))][:limite_atipicos]
+        atipicos = {
+            "limite_inferior": float(inferior),
+            "limite_superior": float(superior),
+            "cantidad": int(fuera.sum()),
+            "materiales": [
+                {"id": int(columnas["id"][i]), "tipo": TIPOS[tipo[i]], "factor_estancia": float(factores[i])}
+                for i in indices
+            ],
+        }
+
+    return {
+        "total": int(len(factores)),
+        "validos": int(validos.sum()),
+        "invalidos": int(len(factores) - validos.sum()),
+        "resumen": _resumen(valores),
+        "bordes": bordes.tolist(),
+        "histograma": np.histogram(valores, bins=bordes)[0].tolist() if len(bordes) else [],
+        "grupos": grupos,
+        "atipicos": atipicos,
+    }
+
+
+def _factor_escalar(metodo, objeto) -> float:
+    try:
+        return float(metodo(objeto))
+    except Exception:
+        return float("nan")
+
+
+def _iguales(a: float, b: float) -> bool:
+    return (np.isnan(a) and np.isnan(b)) or a == b
+
+
+def verificar(db: Session, aleatorios: int = 0, semilla: Optional[int] = None) -> dict:
+    """
+    Compara calcular_factores() con calcular_factor_estancia() material por
+    material (igualdad exacta, NaN donde el método escalar falla), sobre la base
+    de datos y sobre `aleatorios` filas generadas con años extremos, nulos y ceros.
+    """
+    diferencias: List[dict] = []
+
+    columnas = cargar(db)
+    factores = calcular_factores(columnas)
+    posicion = {int(i): k for k, i in enumerate(columnas["id"])}
+    poly = with_polymorphic(models.Material, [models.Libro, models.Revista, models.ActaCongreso])
+    for material in db.query(poly).order_by(poly.id).yield_per(1000):
+        esperado = _factor_escalar(type(material).calcular_factor_estancia, material)
+        obtenido = factores[posicion[material.id]]
+        if not _iguales(esperado, obtenido):
+            diferencias.append({"origen": "base", "id": material.id, "esperado": esperado, "obtenido": float(obtenido)})
+    revisados = len(posicion)
+
+    generador = np.random.default_rng(semilla)
+    anios = np.array([0, 1, -1, 2024, 1999, 10**9, -10**9], dtype=np.float64)
+    filas = []
+    for _ in range(aleatorios):
+        elegir = generador.random(2) < 0.5
+        filas.append(SimpleNamespace(
+            tipo=TIPOS[generador.integers(len(TIPOS))],
+            anio_publicacion=None if generador.random() < 0.05 else int(
+                generador.choice(anios) if elegir[0] else generador.integers(-3000, 3000)),
+            anio_llegada=None if generador.random() < 0.05 else int(
+                generador.choice(anios) if elegir[1] else generador.integers(-3000, 3000)),
+            genero=[None, *GENEROS][generador.integers(len(GENEROS) + 1)],
+            frecuencia_publicacion=[None, *FRECUENCIAS][generador.integers(len(FRECUENCIAS) + 1)],
+        ))
+    if filas:
+        generadas = {
+            "id": np.arange(len(filas), dtype=np.int64),
+            "tipo": _codigos([f.tipo for f in filas], TIPOS[1:]),
+            "anio_publicacion": np.array([f.anio_publicacion for f in filas], dtype=np.float64),
+            "anio_llegada": np.array([f.anio_llegada for f in filas], dtype=np.float64),
+            "genero": _codigos([f.genero for f in filas], GENEROS),
+            "frecuencia_publicacion": _codigos([f.frecuencia_publicacion for f in filas], FRECUENCIAS),
+        }
+        for fila, obtenido in zip(filas, calcular_factores(generadas)):
+            esperado = _factor_escalar(MODELOS[fila.tipo].calcular_factor_estancia, fila)
+            if not _iguales(esperado, obtenido):
+                diferencias.append({"origen": "aleatorio", **vars(fila), "esperado": esperado, "obtenido": float(obtenido)})
+
+    return {"revisados": revisados, "aleatorios": aleatorios, "diferencias": diferencias}
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Antigüedad mínima (en días) de un préstamo devuelto o una solicitud cerrada para archivarlo
+DIAS_ANTES_DE_ARCHIVAR = 180
+# Filas movidas por transacción
+TAMANO_LOTE_ARCHIVO = 500
+
+
+def _mover(db: Session, origen, destino, condicion, tamano_lote: int) -> int:
+    """
+    Copia al archivo y borra de la tabla viva las filas que cumplen la condición,
+    un lote por transacción para no bloquear a los escritores mucho tiempo.
+    """
+    columnas = [columna.name for columna in origen.columns]
+    movidas = 0
+    while True:
+        ids = db.execute(
+            select(origen.c.id).where(condicion).order_by(origen.c.id).limit(tamano_lote)
+        ).scalars().all()
+        if not ids:
+            break
+        db.execute(
+            insert(destino).from_select(
+                columnas + ["fecha_archivo"],
+                select(*[origen.c[nombre] for nombre in columnas], literal(datetime.now()))
+                .where(origen.c.id.in_(ids))
+            )
+        )
+        db.execute(delete(origen).where(origen.c.id.in_(ids)))
+        db.commit()
+        movidas += len(ids)
+    return movidas
+
+
+def archivar(
+    db: Session,
+    dias: int = DIAS_ANTES_DE_ARCHIVAR,
+    tamano_lote: int = TAMANO_LOTE_ARCHIVO
+) -> dict:
+    """
+    Mueve a las tablas de archivo los préstamos devueltos y las solicitudes
+    aprobadas o rechazadas con más de `dias` de antigüedad.
+    """
+    limite = datetime.now() - timedelta(days=dias)
+
+    prestamos = models.Prestamo.__table__
+    solicitudes = models.SolicitudPrestamo.__table__
+
+    return {
+        "prestamos": _mover(
+            db, prestamos, models.PrestamoArchivado.__table__,
+            (prestamos.c.estado == "devuelto") & (prestamos.c.fecha_devolucion < limite),
+            tamano_lote
+        ),
+        "solicitudes": _mover(
+            db, solicitudes, models.SolicitudPrestamoArchivada.__table__,
+            solicitudes.c.estado.in_(["aprobada", "rechazada"]) & (solicitudes.c.fecha_solicitud < limite),
+            tamano_lote
+        ),
+    }
+
+
+def historial_prestamos(
+    db: Session,
+    usuario_id: Optional[int] = None,
+    material_id: Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100
+):
+    """Préstamos vivos y archivados, del más reciente al más antiguo."""
+    consultas = []
+    for tabla, archivado in ((models.Prestamo.__table__, False), (models.PrestamoArchivado.__table__, True)):
+        consulta = select(
+            tabla.c.id, tabla.c.usuario_id, tabla.c.material_id, tabla.c.fecha_prestamo,
+            tabla.c.fecha_devolucion, tabla.c.estado, literal(archivado).label("archivado")
+        )
+        if usuario_id is not None:
+            consulta = consulta.where(tabla.c.usuario_id == usuario_id)
+        if material_id is not None:
+            consulta = consulta.where(tabla.c.material_id == material_id)
+        consultas.append(consulta)
+
+    union = union_all(*consultas).subquery()
+    return db.execute(
+        select(union)
+        .order_by(union.c.fecha_prestamo.desc(), union.c.id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
+
+
+def historial_solicitudes(db: Session, carne_identidad: str, skip: int = 0, limit: int = 100):
+    """Solicitudes vivas y archivadas de un usuario, de la más reciente a la más antigua."""
+    consultas = []
+    for tabla, archivado in (
+        (models.SolicitudPrestamo.__table__, False),
+        (models.SolicitudPrestamoArchivada.__table__, True)
+    ):
+        consultas.append(
+            select(
+                tabla.c.id, tabla.c.nombre_usuario, tabla.c.carne_identidad, tabla.c.direccion_usuario,
+                tabla.c.material_id, tabla.c.fecha_solicitud, tabla.c.estado, tabla.c.observaciones,
+                literal(archivado).label("archivado")
+            ).where(tabla.c.carne_identidad == carne_identidad)
+        )
+
+    union = union_all(*consultas).subquery()
+    return db.execute(
+        select(union)
+        .order_by(union.c.fecha_solicitud.desc(), union.c.id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).mappings().all()
@@ -0,0 +1,245 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from jose import JWTError, jwt
+from sqlalchemy import event, inspect, insert
+
+from .. import models
+from ..database import engine
+from .contexto import peticion_actual, ruta_actual
+from .security import ALGORITHM, SECRET_KEY
+
+# Registros que pueden esperar en memoria; con la cola llena se escribe en el momento
+CAPACIDAD_COLA_AUDITORIA = int(os.getenv("CAPACIDAD_COLA_AUDITORIA", "10000"))
+# Con AUDITORIA_SINCRONA=1 cada commit escribe sus registros antes de volver (pruebas)
+AUDITORIA_SINCRONA = os.getenv("AUDITORIA_SINCRONA", "0") == "1"
+TAMANO_LOTE_AUDITORIA = 200
+# Tiempo máximo que un registro espera a que se complete su lote (segundos)
+INTERVALO_AUDITORIA = 0.5
+REINTENTOS_ESCRITURA = 3
+
+logger = logging.getLogger("biblioteca.auditoria")
+
+ENTIDADES = {
+    models.Prestamo: "prestamo",
+    models.SolicitudPrestamo: "solicitud",
+}
+
+
+def _actor() -> Optional[str]:
+    """Email del token bearer de la petición en curso, si lo hay y es válido."""
+    scope = peticion_actual.get()
+    if scope is None:
+        return None
+    for nombre, valor in scope.get("headers") or []:
+        if nombre == b"authorization":
+            autorizacion = valor.decode("latin-1")
+            if not autorizacion.lower().startswith("bearer "):
+                return None
+            try:
+                return jwt.decode(autorizacion[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            except JWTError:
+                return None
+    return None
+
+
+def _texto(estado) -> Optional[str]:
+    if estado is None:
+        return None
+    return str(estado.value if hasattr(estado, "value") else estado)
+
+
+class EscritorAuditoria:
+    """
+    Cola acotada en memoria y un hilo que la vacía con INSERTs por lotes.
+    Los handlers solo encolan; si la cola está llena, el registro se escribe
+    en el hilo que lo generó, así nunca se pierde por falta de espacio.
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_COLA_AUDITORIA, sincrono: bool = AUDITORIA_SINCRONA):
+        self.sincrono = sincrono
+        self.escritos = 0
+        self.escritos_en_linea = 0
+        self._cola: queue.Queue = queue.Queue(maxsize=capacidad)
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="escritor-auditoria", daemon=True)
+                self._hilo.start()
+
+    def encolar(self, registros: List[dict]):
+        if not registros:
+            return
+        if self.sincrono:
+            self._escribir(registros)
+            return
+        self._iniciar()
+        desbordados = []
+        for registro in registros:
+            try:
+                self._cola.put_nowait(registro)
+            except queue.Full:
+                desbordados.append(registro)
+        if desbordados:
+            self._escribir(desbordados)
+            self.escritos_en_linea += len(desbordados)
+
+    def vaciar(self, timeout: float = 10.0) -> bool:
+        """Espera a que se escriba todo lo encolado hasta ahora. False si se agotó el tiempo."""
+        if self._hilo is None or not self._hilo.is_alive():
+            return self._cola.empty()
+        marca = threading.Event()
+        try:
+            self._cola.put(marca, timeout=timeout)
+        except queue.Full:
+            return False
+        return marca.wait(timeout)
+
+    def _bucle(self):
+        while True:
+            elemento = self._cola.get()
+            lote, marcas = [], []
+            limite = time.monotonic() + INTERVALO_AUDITORIA
+            while True:
+                if isinstance(elemento, threading.Event):
+                    marcas.append(elemento)
+                    break  # quien vacía espera: se escribe ya lo que haya
+                lote.append(elemento)
+                if len(lote) >= TAMANO_LOTE_AUDITORIA:
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    elemento = self._cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+            if lote:
+                self._escribir(lote)
+            for marca in marcas:
+                marca.set()
+
+    def _escribir(self, registros: List[dict]):
+        for intento in range(1, REINTENTOS_ESCRITURA + 1):
+            try:
+                with engine.begin() as conexion:
+                    conexion.execute(insert(models.RegistroAuditoria.__table__), registros)
+                self.escritos += len(registros)
+                return
+            except Exception:
+                if intento == REINTENTOS_ESCRITURA:
+                    # Último recurso: que los registros queden al menos en el log
+                    logger.exception("No se pudieron escribir %d registros de auditoría: %s",
+                                     len(registros), json.dumps(registros, default=str, ensure_ascii=False))
+                    return
+                time.sleep(0.2 * intento)
+
+    def estado(self) -> dict:
+        return {
+            "en_cola": self._cola.qsize(),
+            "capacidad": self._cola.maxsize,
+            "escritos": self.escritos,
+            "escritos_en_linea": self.escritos_en_linea,
+            "sincrono": self.sincrono,
+        }
+
+
+escritor_auditoria = EscritorAuditoria()
+
+
+def _capturar(session, _contexto):
+    """after_flush: anota en la sesión los cambios de estado de lo que se acaba de escribir."""
+    pendientes = session.info.setdefault("auditoria", [])
+    ahora = datetime.now()
+    base = None
+
+    def agregar(objeto, accion, anterior, nuevo):
+        nonlocal base
+        if base is None:
+            base = {"fecha": ahora, "actor": _actor(), "ruta": ruta_actual()}
+        pendientes.append(dict(
+            base,
+            entidad=ENTIDADES[type(objeto)],
+            entidad_id=objeto.id,
+            accion=accion,
+            estado_anterior=_texto(anterior),
+            estado_nuevo=_texto(nuevo),
+        ))
+
+    for objeto in session.new:
+        if type(objeto) in ENTIDADES:
+            agregar(objeto, "crear", None, objeto.estado)
+    for objeto in session.dirty:
+        if type(objeto) in ENTIDADES:
+            historia = inspect(objeto).attrs.estado.history
+            anterior = historia.deleted[0] if historia.deleted else None
+            if historia.added and historia.added[0] != anterior:
+                agregar(objeto, "cambiar_estado", anterior, historia.added[0])
+    for objeto in session.deleted:
+        if type(objeto) in ENTIDADES:
+            agregar(objeto, "eliminar", objeto.estado, None)
+
+
+def _confirmar(session):
+    # after_commit también llega al liberar cada SAVEPOINT (commit agrupado),
+    # con la transacción de afuera todavía abierta: solo cuenta el COMMIT real
+    if session.in_nested_transaction():
+        return
+    session.info["auditoria_confirmada"] = session.info.pop("auditoria", [])
+
+
+def _entregar(session, transaccion):
+    """
+    after_transaction_end de la transacción de afuera: la sesión ya devolvió su
+    conexión, así que escribir aquí (AUDITORIA_SINCRONA o cola llena) no espera
+    el lock de SQLite que tenía el propio commit ni otra conexión del pool.
+    """
+    if transaccion.parent is not None:
+        return
+    escritor_auditoria.encolar(session.info.pop("auditoria_confirmada", []))
+
+
+def _descartar(session, _transaccion=None):
+    # Al deshacer un SAVEPOINT se descartan solo sus registros (descartar_desde)
+    if session.in_nested_transaction():
+        return
+    session.info.pop("auditoria", None)
+
+
+def marcar(session) -> int:
+    """Cantidad de registros anotados en la sesión, para descartar los que sigan si falla un SAVEPOINT."""
+    return len(session.info.get("auditoria", []))
+
+
+def descartar_desde(session, marca: int):
+    del session.info.get("auditoria", [])[marca:]
+
+
+def _cargar_anterior(_objeto, valor, _anterior, _iniciador):
+    return valor
+
+
+def registrar(fabrica_sesiones):
+    """
+    Audita las sesiones creadas por `fabrica_sesiones`: los cambios se anotan en
+    cada flush y se encolan solo si la transacción se confirma.
+    """
+    event.listen(fabrica_sesiones, "after_flush", _capturar)
+    event.listen(fabrica_sesiones, "after_commit", _confirmar)
+    event.listen(fabrica_sesiones, "after_rollback", _descartar)
+    event.listen(fabrica_sesiones, "after_transaction_end", _entregar)
+    # Sin esto, asignar el estado a un objeto expirado (p. ej. tras un commit)
+    # no carga el valor anterior y el cambio no tendría estado de origen
+    for modelo in ENTIDADES:
+        event.listen(modelo.estado, "set", _cargar_anterior, active_history=True, retval=True)
+    atexit.register(escritor_auditoria.vaciar)
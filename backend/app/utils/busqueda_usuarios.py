@@ -0,0 +1,197 @@
+"""
+Búsqueda aproximada de usuarios por nombre, carné o email con trigramas.
+
+Se apoya en una tabla FTS5 sin contenido con el tokenizador trigram (SQLite 3.34
+o posterior), mantenida por triggers sobre `usuarios`. El texto se indexa sin
+tildes, con el mismo reemplazo en SQL y en Python. Si la versión de SQLite no
+soporta el tokenizador, se recurre a LIKE sobre la tabla de usuarios.
+"""
+import logging
+import re
+from typing import List, Set
+
+from sqlalchemy import or_, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Candidatos por fase de búsqueda, que luego se ordenan por similitud
+MAX_CANDIDATOS = 200
+LIMITE_RESULTADOS = 20
+
+logger = logging.getLogger("biblioteca.busqueda_usuarios")
+
+_SIN_TILDES = {
+    "á": "a", "é": "e", "í": "i", "ó": "o", "ú": "u", "ü": "u", "ñ": "n",
+    "Á": "a", "É": "e", "Í": "i", "Ó": "o", "Ú": "u", "Ü": "u", "Ñ": "n",
+}
+_TABLA_SIN_TILDES = str.maketrans(_SIN_TILDES)
+_CAMPOS = ("nombre", "carne_identidad", "email")
+
+_disponible = False
+
+
+def normalizar(texto: str) -> str:
+    return (texto or "").translate(_TABLA_SIN_TILDES).lower()
+
+
+def _normalizar_sql(expresion: str) -> str:
+    # Mismo reemplazo que normalizar(); las mayúsculas ASCII las pliega el tokenizador
+    for original, reemplazo in _SIN_TILDES.items():
+        expresion = f"replace({expresion}, '{original}', '{reemplazo}')"
+    return expresion
+
+
+def _valores(prefijo: str) -> str:
+    return ", ".join(_normalizar_sql(f"{prefijo}.{campo}") for campo in _CAMPOS)
+
+
+def _sentencias_indice() -> List[str]:
+    columnas = ", ".join(_CAMPOS)
+    return [
+        f"CREATE VIRTUAL TABLE usuarios_busqueda USING fts5({columnas}, content='', tokenize='trigram')",
+        f"""
+        CREATE TRIGGER IF NOT EXISTS usuarios_busqueda_ai AFTER INSERT ON usuarios BEGIN
+            INSERT INTO usuarios_busqueda(rowid, {columnas}) VALUES (new.id, {_valores("new")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS usuarios_busqueda_ad AFTER DELETE ON usuarios BEGIN
+            INSERT INTO usuarios_busqueda(usuarios_busqueda, rowid, {columnas})
+            VALUES ('delete', old.id, {_valores("old")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS usuarios_busqueda_au AFTER UPDATE OF {columnas} ON usuarios BEGIN
+            INSERT INTO usuarios_busqueda(usuarios_busqueda, rowid, {columnas})
+            VALUES ('delete', old.id, {_valores("old")});
+            INSERT INTO usuarios_busqueda(rowid, {columnas}) VALUES (new.id, {_valores("new")});
+        END
+        """,
+        f"""
+        INSERT INTO usuarios_busqueda(rowid, {columnas})
+        SELECT usuarios.id, {_valores("usuarios")} FROM usuarios
+        """,
+    ]
+
+
+def preparar(engine) -> bool:
+    """
+    Crea el índice de trigramas y sus triggers si no existen, y lo llena desde
+    `usuarios`. Devuelve False si SQLite no soporta FTS5 con trigramas.
+    """
+    global _disponible
+    try:
+        with engine.begin() as conexion:
+            existe = conexion.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usuarios_busqueda'"
+            )).first()
+            if not existe:
+                for sentencia in _sentencias_indice():
+                    conexion.execute(text(sentencia))
+        _disponible = True
+    except OperationalError as error:
+        logger.warning("Búsqueda de usuarios sin FTS5 trigram, se usará LIKE: %s", error.orig)
+        _disponible = False
+    return _disponible
+
+
+def trigramas(texto: str) -> Set[str]:
+    texto = normalizar(texto)
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def similitud(consulta: Set[str], texto: str) -> float:
+    """Índice de Jaccard entre los trigramas de la consulta y los del texto."""
+    propios = trigramas(texto)
+    if not consulta or not propios:
+        return 0.0
+    return len(consulta & propios) / len(consulta | propios)
+
+
+def _frase(texto: str) -> str:
+    return '"' + texto.replace('"', '""') + '"'
+
+
+def _piezas(palabra: str) -> str:
+    """
+    Subcadenas de las que al menos una sobrevive a un error de tipeo: las dos
+    mitades de la palabra si cada una tiene tres letras o más, si no sus trigramas.
+    """
+    if len(palabra) >= 6:
+        mitad = len(palabra) // 2
+        piezas = [palabra[:mitad], palabra[mitad:]]
+    else:
+        piezas = [palabra[i:i + 3] for i in range(len(palabra) - 2)]
+    return "(" + " OR ".join(_frase(p) for p in piezas) + ")"
+
+
+def _coincidencias(db: Session, expresion: str) -> List[int]:
+    # Se ordena antes del LIMIT: sin orden, una consulta amplia devolvería los
+    # ids más bajos y el mejor parecido podría quedar fuera de los candidatos
+    filas = db.execute(text(
+        "SELECT rowid FROM usuarios_busqueda WHERE usuarios_busqueda MATCH :expresion "
+        "ORDER BY bm25(usuarios_busqueda) LIMIT :limite"
+    ), {"expresion": expresion, "limite": MAX_CANDIDATOS}).all()
+    return [fila.rowid for fila in filas]
+
+
+def _candidatos_fts(db: Session, q: str) -> List[int]:
+    """
+    De la búsqueda más estricta (y barata) a la más permisiva, hasta que alguna
+    encuentre usuarios:
+    1. todas las palabras como subcadenas exactas;
+    2. todas las palabras, tolerando un error en cada una;
+    3. cualquiera de las palabras, tolerando un error.
+    En cada fase bm25 adelanta a los que coinciden en más piezas y, entre
+    coincidencias iguales, a los textos más cortos (los más parecidos).
+    """
+    palabras = [p for p in re.split(r"\s+", normalizar(q)) if len(p) >= 3]
+    if not palabras:
+        return []
+    fases = [
+        " AND ".join(_frase(p) for p in palabras),
+        " AND ".join(_piezas(p) for p in palabras),
+    ]
+    if len(palabras) > 1:
+        fases.append(" OR ".join(_piezas(p) for p in palabras))
+
+    for expresion in fases:
+        ids = _coincidencias(db, expresion)
+        if ids:
+            return ids
+    return []
+
+
+def _candidatos_like(db: Session, q: str) -> List[int]:
+    condiciones = []
+    for trigrama in sorted(trigramas(q)):
+        patron = f"%{trigrama}%"
+        condiciones += [getattr(models.Usuario, campo).ilike(patron) for campo in _CAMPOS]
+    filas = db.query(models.Usuario.id).filter(or_(*condiciones)).limit(MAX_CANDIDATOS).all()
+    return [fila.id for fila in filas]
+
+
+def buscar(db: Session, q: str, limite: int = LIMITE_RESULTADOS) -> List[models.Usuario]:
+    """
+    Usuarios cuyo nombre, carné o email se parece a `q`, del más al menos
+    parecido, con su puntaje en el atributo `similitud` (el mejor de los tres campos).
+    """
+    consulta = trigramas(q)
+    if not consulta:
+        return []
+    ids = _candidatos_fts(db, q) if _disponible else _candidatos_like(db, q)
+    if not ids:
+        return []
+
+    resultados = []
+    for usuario in db.query(models.Usuario).filter(models.Usuario.id.in_(ids)).all():
+        puntaje = max(similitud(consulta, getattr(usuario, campo)) for campo in _CAMPOS)
+        resultados.append((puntaje, usuario))
+    resultados.sort(key=lambda r: (-r[0], r[1].id))
+    usuarios = []
+    for puntaje, usuario in resultados[:limite]:
+        usuario.similitud = round(puntaje, 3)
+        usuarios.append(usuario)
+    return usuarios
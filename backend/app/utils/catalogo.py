@@ -0,0 +1,370 @@
+import bisect
+import math
+import os
+import sys
+import threading
+from array import array
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Con CATALOGO_COLUMNAR=1 los listados del catálogo se sirven desde memoria
+CATALOGO_COLUMNAR = os.getenv("CATALOGO_COLUMNAR", "0") == "1"
+
+TIPOS = ["material", "libro", "revista", "acta"]
+MODELOS = {
+    "material": models.Material,
+    "libro": models.Libro,
+    "revista": models.Revista,
+    "acta": models.ActaCongreso,
+}
+# Nombre de cada tipo en /disponibles
+NOMBRES_DISPONIBLES = {"libro": "Libro", "revista": "Revista", "acta": "Acta de Congreso"}
+# Género o frecuencia de publicación, según el tipo; el código 0 es "sin valor"
+VARIANTES = [None] + list(models.GeneroLibro) + list(models.FrecuenciaPublicacion)
+CAMPO_VARIANTE = {"libro": "genero", "revista": "frecuencia_publicacion"}
+# Columnas que guardan el índice del texto en la tabla de textos internados
+CAMPOS_TEXTO = ("identificador", "titulo", "autor", "editorial")
+
+# Campos de material.Material, en el mismo orden que las respuestas de la base de datos
+CAMPOS_MATERIAL = [
+    "identificador", "titulo", "autor", "anio_publicacion", "anio_llegada", "editorial",
+    "cantidad_total", "cantidad_prestamo", "id", "tipo", "factor_estancia",
+]
+
+
+def _factor(tipo: str, fila) -> float:
+    """
+    Factor de estancia con el método del modelo de cada tipo, aplicado sobre los
+    valores leídos (sin crear objetos ORM). NaN si el método falla (un libro con
+    año de llegada 0 no tiene factor).
+    """
+    valores = SimpleNamespace(
+        anio_publicacion=fila.anio_publicacion,
+        anio_llegada=fila.anio_llegada,
+        genero=getattr(fila, "genero", None),
+        frecuencia_publicacion=getattr(fila, "frecuencia_publicacion", None),
+    )
+    try:
+        return float(MODELOS.get(tipo, models.Material).calcular_factor_estancia(valores))
+    except (ValueError, TypeError, ZeroDivisionError):
+        return math.nan
+
+
+class CatalogoColumnar:
+    """
+    Copia del catálogo en columnas compactas (módulo array): cada material ocupa
+    una posición en todas las columnas y los textos se guardan una sola vez en
+    una tabla de textos internados. Los órdenes de los listados (por id, por
+    tipo, por autor y título, por factor) son permutaciones de posiciones ya
+    ordenadas, así una página es un corte de un arreglo. Se construye al
+    arrancar y se actualiza desde los endpoints que escriben materiales y, para
+    la cantidad prestada, con cada cambio de disponibilidad publicado. Un
+    material modificado conserva su posición; las de los eliminados y los
+    textos que ya nadie usa se reutilizan, así la memoria no crece con las
+    actualizaciones.
+    """
+
+    def __init__(self, activo: bool = CATALOGO_COLUMNAR):
+        self.activo = activo
+        self._lock = threading.Lock()
+        self._vaciar()
+
+    def _vaciar(self):
+        self._id = array("q")
+        self._tipo = array("b")
+        self._variante = array("b")
+        self._identificador = array("i")
+        self._titulo = array("i")
+        self._autor = array("i")
+        self._editorial = array("i")
+        self._congreso = array("i")
+        self._anio_publicacion = array("i")
+        self._anio_llegada = array("i")
+        self._cantidad_total = array("i")
+        self._cantidad_prestamo = array("i")
+        self._factor = array("d")
+        self._textos: List[Optional[str]] = []
+        self._usos_textos = array("i")
+        self._textos_libres: List[int] = []
+        self._indice_textos: Dict[str, int] = {}
+        self._posicion: Dict[int, int] = {}
+        self._posiciones_libres: List[int] = []
+        self._por_id = array("i")
+        self._por_tipo = {tipo: array("i") for tipo in TIPOS}
+        self._por_autor_titulo = array("i")
+        self._por_factor = array("i")
+
+    # --- Columnas ---------------------------------------------------------
+
+    def _internar(self, texto: Optional[str]) -> int:
+        if texto is None:
+            return -1
+        indice = self._indice_textos.get(texto)
+        if indice is None:
+            if self._textos_libres:
+                indice = self._textos_libres.pop()
+                self._textos[indice] = texto
+            else:
+                indice = len(self._textos)
+                self._textos.append(texto)
+                self._usos_textos.append(0)
+            self._indice_textos[texto] = indice
+        self._usos_textos[indice] += 1
+        return indice
+
+    def _soltar(self, indice: int):
+        """Descuenta un uso del texto; sin usos, su lugar queda para el próximo texto nuevo."""
+        if indice < 0:
+            return
+        self._usos_textos[indice] -= 1
+        if not self._usos_textos[indice]:
+            del self._indice_textos[self._textos[indice]]
+            self._textos[indice] = None
+            self._textos_libres.append(indice)
+
+    def _texto(self, indice: int) -> Optional[str]:
+        return self._textos[indice] if indice >= 0 else None
+
+    def _columnas(self) -> list:
+        return [
+            self._id, self._tipo, self._variante, self._identificador, self._titulo, self._autor,
+            self._editorial, self._congreso, self._anio_publicacion, self._anio_llegada,
+            self._cantidad_total, self._cantidad_prestamo, self._factor,
+        ]
+
+    def _columnas_texto(self) -> list:
+        return [self._identificador, self._titulo, self._autor, self._editorial, self._congreso]
+
+    def _escribir_fila(self, posicion: int, tipo: str, fila):
+        """Guarda los valores de `fila` en una posición ya existente de las columnas."""
+        variante = getattr(fila, CAMPO_VARIANTE.get(tipo, ""), None)
+        self._id[posicion] = fila.id
+        self._tipo[posicion] = TIPOS.index(tipo) if tipo in TIPOS else 0
+        self._variante[posicion] = VARIANTES.index(variante) if variante in VARIANTES else 0
+        textos = [
+            fila.identificador, fila.titulo, fila.autor, fila.editorial,
+            getattr(fila, "nombre_congreso", None),
+        ]
+        for columna, texto in zip(self._columnas_texto(), textos):
+            # Primero el texto nuevo: si es el mismo, no llega a quedarse sin usos
+            anterior = columna[posicion]
+            columna[posicion] = self._internar(texto)
+            self._soltar(anterior)
+        self._anio_publicacion[posicion] = fila.anio_publicacion or 0
+        self._anio_llegada[posicion] = fila.anio_llegada or 0
+        self._cantidad_total[posicion] = fila.cantidad_total or 0
+        self._cantidad_prestamo[posicion] = fila.cantidad_prestamo or 0
+        self._factor[posicion] = _factor(tipo, fila)
+        self._posicion[fila.id] = posicion
+
+    def _agregar_fila(self, tipo: str, fila) -> int:
+        """Escribe la fila en una posición libre (de un material eliminado) o en una nueva al final."""
+        if self._posiciones_libres:
+            posicion = self._posiciones_libres.pop()
+        else:
+            posicion = len(self._id)
+            for columna in self._columnas():
+                columna.append(0)
+            for columna in self._columnas_texto():
+                columna[posicion] = -1
+        self._escribir_fila(posicion, tipo, fila)
+        return posicion
+
+    # --- Órdenes ----------------------------------------------------------
+
+    def _clave_id(self, posicion: int):
+        return self._id[posicion]
+
+    def _clave_autor_titulo(self, posicion: int):
+        # Como ORDER BY autor, titulo en SQLite: NULL primero, luego por punto de código
+        autor = self._texto(self._autor[posicion])
+        titulo = self._texto(self._titulo[posicion])
+        return (autor is not None, autor or "", titulo is not None, titulo or "", self._id[posicion])
+
+    def _clave_factor(self, posicion: int):
+        factor = self._factor[posicion]
+        if math.isnan(factor):
+            return (1, 0.0, self._id[posicion])
+        return (0, -factor, self._id[posicion])
+
+    def _ordenes(self, posicion: int):
+        tipo = TIPOS[self._tipo[posicion]]
+        return [
+            (self._por_id, self._clave_id),
+            (self._por_tipo[tipo], self._clave_id),
+            (self._por_autor_titulo, self._clave_autor_titulo),
+            (self._por_factor, self._clave_factor),
+        ]
+
+    def _insertar(self, posicion: int):
+        for orden, clave in self._ordenes(posicion):
+            bisect.insort(orden, posicion, key=clave)
+
+    def _retirar(self, posicion: int):
+        for orden, clave in self._ordenes(posicion):
+            i = bisect.bisect_left(orden, clave(posicion), key=clave)
+            if i < len(orden) and orden[i] == posicion:
+                del orden[i]
+
+    # --- Construcción y actualización -------------------------------------
+
+    def construir(self, db: Session):
+        materiales = models.Material.__table__
+        libros = models.Libro.__table__
+        revistas = models.Revista.__table__
+        actas = models.ActaCongreso.__table__
+        filas = db.execute(
+            select(
+                materiales,
+                libros.c.genero,
+                revistas.c.frecuencia_publicacion,
+                actas.c.nombre_congreso,
+            )
+            .select_from(materiales)
+            .outerjoin(libros, libros.c.id == materiales.c.id)
+            .outerjoin(revistas, revistas.c.id == materiales.c.id)
+            .outerjoin(actas, actas.c.id == materiales.c.id)
+            .order_by(materiales.c.id)
+        )
+        with self._lock:
+            self._vaciar()
+            for fila in filas:
+                self._agregar_fila(fila.tipo, fila)
+            todas = range(len(self._id))
+            self._por_id = array("i", todas)
+            for tipo in TIPOS:
+                codigo = TIPOS.index(tipo)
+                self._por_tipo[tipo] = array("i", (p for p in todas if self._tipo[p] == codigo))
+            self._por_autor_titulo = array("i", sorted(todas, key=self._clave_autor_titulo))
+            self._por_factor = array("i", sorted(todas, key=self._clave_factor))
+
+    def agregar(self, material: models.Material):
+        """
+        Agrega un material recién creado, o reemplaza uno existente con sus
+        valores actuales en su misma posición: se saca de los órdenes con las
+        claves viejas y se vuelve a insertar con las nuevas.
+        """
+        with self._lock:
+            posicion = self._posicion.get(material.id)
+            if posicion is None:
+                self._insertar(self._agregar_fila(material.tipo, material))
+                return
+            self._retirar(posicion)
+            self._escribir_fila(posicion, material.tipo, material)
+            self._insertar(posicion)
+
+    def actualizar(self, material: models.Material):
+        self.agregar(material)
+
+    def quitar(self, material_id: int):
+        """Quita un material. Su posición y sus textos quedan para los próximos materiales."""
+        with self._lock:
+            posicion = self._posicion.pop(material_id, None)
+            if posicion is not None:
+                self._retirar(posicion)
+                for columna in self._columnas_texto():
+                    self._soltar(columna[posicion])
+                    columna[posicion] = -1
+                self._posiciones_libres.append(posicion)
+
+    def actualizar_disponibilidad(self, material_id: int, cantidad_disponible: int):
+        """Oyente de difusor_disponibilidad: la cantidad prestada no cambia ningún orden."""
+        with self._lock:
+            posicion = self._posicion.get(material_id)
+            if posicion is not None:
+                self._cantidad_prestamo[posicion] = self._cantidad_total[posicion] - cantidad_disponible
+
+    # --- Lectura ----------------------------------------------------------
+
+    def _valor(self, posicion: int, campo: str):
+        if campo == "id":
+            return self._id[posicion]
+        if campo == "tipo":
+            return TIPOS[self._tipo[posicion]]
+        if campo == "factor_estancia":
+            factor = self._factor[posicion]
+            return None if math.isnan(factor) else factor
+        if campo in ("genero", "frecuencia_publicacion"):
+            variante = VARIANTES[self._variante[posicion]]
+            return variante.value if variante is not None else None
+        if campo == "nombre_congreso":
+            return self._texto(self._congreso[posicion])
+        columna = getattr(self, "_" + campo)
+        if campo in CAMPOS_TEXTO:
+            return self._texto(columna[posicion])
+        return columna[posicion]
+
+    def _filas(self, orden: array, skip: int, limit: int, campos: List[str]) -> List[dict]:
+        return [
+            {campo: self._valor(posicion, campo) for campo in campos}
+            for posicion in orden[max(0, skip):max(0, skip) + max(0, limit)]
+        ]
+
+    def contar(self, tipo: Optional[str] = None) -> int:
+        with self._lock:
+            return len(self._por_tipo[tipo] if tipo else self._por_id)
+
+    def pagina(self, skip: int, limit: int, tipo: Optional[str] = None, campos: Optional[List[str]] = None) -> List[dict]:
+        """Materiales en orden de id (todos o de un tipo), con los mismos campos que la base de datos."""
+        if campos is None:
+            campos = CAMPOS_MATERIAL + ([CAMPO_VARIANTE.get(tipo) or "nombre_congreso"] if tipo else [])
+        with self._lock:
+            return self._filas(self._por_tipo[tipo] if tipo else self._por_id, skip, limit, campos)
+
+    def ordenados(self, skip: int, limit: int, criterio: str = "autor") -> List[dict]:
+        """Por autor y título, o por factor de estancia de mayor a menor."""
+        with self._lock:
+            orden = self._por_factor if criterio == "factor" else self._por_autor_titulo
+            return self._filas(orden, skip, limit, CAMPOS_MATERIAL)
+
+    def disponibles(self) -> List[dict]:
+        """Igual que la consulta agrupada por id de /disponibles: una fila por material, total 1."""
+        resultado = []
+        with self._lock:
+            for tipo, nombre in NOMBRES_DISPONIBLES.items():
+                for posicion in self._por_tipo[tipo]:
+                    resultado.append({
+                        "tipo": nombre,
+                        "titulo": self._texto(self._titulo[posicion]),
+                        "cantidad_disponible": max(0, 1 - self._cantidad_prestamo[posicion]),
+                        "cantidad_total": 1,
+                    })
+        return resultado
+
+    def memoria(self) -> dict:
+        """Bytes de columnas, permutaciones y textos, y la extrapolación a un millón de materiales."""
+        with self._lock:
+            columnas = self._columnas()
+            permutaciones = [self._por_id, self._por_autor_titulo, self._por_factor, *self._por_tipo.values()]
+            bytes_columnas = sum(c.buffer_info()[1] * c.itemsize for c in columnas)
+            bytes_permutaciones = sum(p.buffer_info()[1] * p.itemsize for p in permutaciones)
+            bytes_textos = (
+                sys.getsizeof(self._textos) + sys.getsizeof(self._indice_textos)
+                + self._usos_textos.buffer_info()[1] * self._usos_textos.itemsize
+                + sum(sys.getsizeof(t) for t in self._textos if t is not None)
+            )
+            bytes_posiciones = sys.getsizeof(self._posicion)
+            materiales = len(self._por_id)
+            textos = len(self._textos) - len(self._textos_libres)
+            posiciones_sin_uso = len(self._posiciones_libres)
+        total = bytes_columnas + bytes_permutaciones + bytes_textos + bytes_posiciones
+        return {
+            "activo": self.activo,
+            "materiales": materiales,
+            "textos_internados": textos,
+            "posiciones_sin_uso": posiciones_sin_uso,
+            "bytes_columnas": bytes_columnas,
+            "bytes_permutaciones": bytes_permutaciones,
+            "bytes_textos": bytes_textos,
+            "bytes_indice_ids": bytes_posiciones,
+            "bytes_total": total,
+            "bytes_por_millon": round(total / materiales * 1_000_000) if materiales else 0,
+        }
+
+
+catalogo_columnar = CatalogoColumnar()
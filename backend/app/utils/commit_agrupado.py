@@ -0,0 +1,161 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, engine
+from . import auditoria
+from .consultas_lentas import registrar_consultas_lentas
+
+# Con COMMIT_AGRUPADO=1 las escrituras de varias peticiones simultáneas se
+# confirman juntas en una sola transacción (un solo fsync de SQLite)
+COMMIT_AGRUPADO = os.getenv("COMMIT_AGRUPADO", "0") == "1"
+# Cuánto se espera a que lleguen más escrituras antes de confirmar el grupo (milisegundos)
+VENTANA_COMMIT_AGRUPADO_MS = float(os.getenv("VENTANA_COMMIT_AGRUPADO_MS", "2"))
+MAX_UNIDADES_POR_COMMIT = int(os.getenv("MAX_UNIDADES_POR_COMMIT", "64"))
+# Tiempo máximo que una petición espera el resultado de su unidad (segundos)
+TIMEOUT_UNIDAD = 30
+
+T = TypeVar("T")
+
+
+def _crear_motor():
+    """
+    Engine propio del escritor. pysqlite abre y cierra las transacciones por su
+    cuenta y eso rompe los SAVEPOINT; se desactiva ese manejo y el BEGIN lo emite
+    SQLAlchemy (receta de la documentación de SQLAlchemy para pysqlite). Se usa
+    BEGIN IMMEDIATE para tomar el bloqueo de escritura al empezar el grupo.
+    """
+    motor = create_engine(engine.url, connect_args={"check_same_thread": False})
+
+    @event.listens_for(motor, "connect")
+    def _conectar(conexion_dbapi, _registro):
+        conexion_dbapi.isolation_level = None
+
+    @event.listens_for(motor, "begin")
+    def _empezar(conexion):
+        conexion.exec_driver_sql("BEGIN IMMEDIATE")
+
+    registrar_consultas_lentas(motor)
+    return motor
+
+
+class EscritorAgrupado:
+    """
+    Hilo con una sesión propia que recibe unidades de trabajo, espera unos
+    milisegundos a que lleguen más y las ejecuta todas en una transacción, cada
+    una dentro de su SAVEPOINT. Si una unidad falla solo se deshace su SAVEPOINT
+    y su llamador recibe la excepción; las demás se confirman con un único COMMIT.
+    Los resultados se entregan después del COMMIT, así nadie ve como confirmado
+    algo que todavía podría perderse.
+    """
+
+    def __init__(self, ventana_ms: float = VENTANA_COMMIT_AGRUPADO_MS, max_unidades: int = MAX_UNIDADES_POR_COMMIT):
+        self.ventana = ventana_ms / 1000
+        self.max_unidades = max_unidades
+        self.commits = 0
+        self.unidades = 0
+        self.fallidas = 0
+        self._cola: queue.Queue = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="commit-agrupado", daemon=True)
+                self._hilo.start()
+
+    def enviar(self, unidad: Callable[[Session], T], timeout: float = TIMEOUT_UNIDAD) -> T:
+        """Encola `unidad(sesion)` y espera a que su grupo se confirme. Relanza su excepción si falló."""
+        self._iniciar()
+        futuro: Future = Future()
+        # La unidad corre con el contexto de la petición (ruta para consultas lentas, actor de auditoría)
+        self._cola.put((unidad, contextvars.copy_context(), futuro))
+        return futuro.result(timeout)
+
+    def _bucle(self):
+        sesion = SessionLocal(bind=_crear_motor(), expire_on_commit=False)
+        while True:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + self.ventana
+            while len(lote) < self.max_unidades:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._procesar(sesion, lote)
+
+    @staticmethod
+    def _ejecutar_unidad(sesion: Session, unidad):
+        with sesion.begin_nested():
+            return unidad(sesion)
+
+    def _procesar(self, sesion: Session, lote: list):
+        resultados = []
+        try:
+            for unidad, contexto, futuro in lote:
+                marca = auditoria.marcar(sesion)
+                try:
+                    resultados.append((futuro, contexto.run(self._ejecutar_unidad, sesion, unidad), None))
+                except Exception as error:
+                    auditoria.descartar_desde(sesion, marca)
+                    resultados.append((futuro, None, error))
+            sesion.commit()
+            self.commits += 1
+        except Exception as error:
+            # Falló el COMMIT (o algo fuera de los SAVEPOINT): no se confirmó nada del grupo
+            sesion.rollback()
+            resultados = [(futuro, None, error) for futuro, _, _ in resultados]
+            resultados += [(futuro, None, error) for _, _, futuro in lote[len(resultados):]]
+        finally:
+            # Los objetos devueltos quedan cargados y desligados de la sesión del hilo
+            sesion.expunge_all()
+
+        for futuro, resultado, error in resultados:
+            self.unidades += 1
+            if error is not None:
+                self.fallidas += 1
+                futuro.set_exception(error)
+            else:
+                futuro.set_result(resultado)
+
+    def estado(self) -> dict:
+        return {
+            "activo": COMMIT_AGRUPADO,
+            "ventana_ms": self.ventana * 1000,
+            "commits": self.commits,
+            "unidades": self.unidades,
+            "fallidas": self.fallidas,
+            "unidades_por_commit": round(self.unidades / self.commits, 2) if self.commits else None,
+        }
+
+
+escritor_agrupado = EscritorAgrupado()
+
+
+def ejecutar(db: Session, unidad: Callable[[Session], T]) -> T:
+    """
+    Ejecuta `unidad(sesion)` y confirma lo que hizo. Sin commit agrupado corre
+    sobre `db` y hace commit; con commit agrupado corre en el hilo escritor, en
+    la transacción compartida del grupo, y devuelve objetos ya desligados.
+    La unidad no debe hacer commit ni rollback: para fallar, lanza una excepción.
+    """
+    if not COMMIT_AGRUPADO:
+        resultado = unidad(db)
+        db.commit()
+        return resultado
+    # Lo pendiente en la sesión del llamador (p. ej. el borrado de una clave de
+    # idempotencia vencida) se confirma antes, para no retener el bloqueo de
+    # escritura mientras se espera al escritor
+    db.commit()
+    return escritor_agrupado.enviar(unidad)
@@ -0,0 +1,76 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+from .contexto import ruta_actual
+
+# Se avisa en el log cuando una petición retiene una conexión más que este umbral (ms)
+UMBRAL_RETENCION_CONEXION_MS = float(os.getenv("UMBRAL_RETENCION_CONEXION_MS", "500"))
+
+logger = logging.getLogger("biblioteca.conexiones")
+
+
+class EstadisticasRetencion:
+    """Tiempo que cada ruta retiene una conexión del pool, desde que la pide hasta que la devuelve."""
+
+    def __init__(self):
+        self._rutas = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, ruta: str, duracion_ms: float):
+        with self._lock:
+            datos = self._rutas.setdefault(ruta, {"usos": 0, "total_ms": 0.0, "max_ms": 0.0})
+            datos["usos"] += 1
+            datos["total_ms"] += duracion_ms
+            datos["max_ms"] = max(datos["max_ms"], duracion_ms)
+
+    def resumen(self) -> list:
+        with self._lock:
+            filas = [
+                {
+                    "ruta": ruta,
+                    "usos": datos["usos"],
+                    "promedio_ms": round(datos["total_ms"] / datos["usos"], 3),
+                    "max_ms": round(datos["max_ms"], 3),
+                    "total_ms": round(datos["total_ms"], 3),
+                }
+                for ruta, datos in self._rutas.items()
+            ]
+        filas.sort(key=lambda f: f["total_ms"], reverse=True)
+        return filas
+
+    def reiniciar(self):
+        with self._lock:
+            self._rutas.clear()
+
+
+estadisticas_retencion = EstadisticasRetencion()
+
+
+def _checkout(conexion_dbapi, registro, proxy):
+    registro.info["retencion"] = (time.perf_counter(), ruta_actual())
+
+
+def _checkin(conexion_dbapi, registro):
+    datos = registro.info.pop("retencion", None) if registro is not None else None
+    if datos is None:
+        return
+    inicio, ruta = datos
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    ruta = ruta or "(fuera de una petición)"
+    estadisticas_retencion.registrar(ruta, duracion_ms)
+    if duracion_ms >= UMBRAL_RETENCION_CONEXION_MS:
+        logger.warning(json.dumps(
+            {"evento": "conexion_retenida", "ruta": ruta, "duracion_ms": round(duracion_ms, 2)},
+            ensure_ascii=False
+        ))
+
+
+def registrar_retencion_conexiones(engine):
+    """Instala en el pool del engine los eventos que miden la retención de conexiones."""
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
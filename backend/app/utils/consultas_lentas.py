@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import event
+
+from .contexto import ruta_actual
+
+# Se registra toda sentencia que tarde más que este umbral (milisegundos)
+UMBRAL_CONSULTA_LENTA_MS = float(os.getenv("UMBRAL_CONSULTA_LENTA_MS", "200"))
+# Máximo de registros por minuto; el resto se cuenta como suprimido
+MAX_REGISTROS_POR_MINUTO = int(os.getenv("MAX_CONSULTAS_LENTAS_POR_MINUTO", "60"))
+ARCHIVO_CONSULTAS_LENTAS = os.getenv("ARCHIVO_CONSULTAS_LENTAS", "consultas_lentas.log")
+# Cada cuánto se vuelve a pedir el plan de una misma huella (segundos)
+VIGENCIA_PLAN = 600
+# Huellas cuyo plan se recuerda; al pasarse se olvidan las menos usadas
+MAX_PLANES = 1000
+
+logger = logging.getLogger("biblioteca.consultas_lentas")
+
+_NUMEROS = re.compile(r"\b\d+(\.\d+)?\b")
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def huella(sentencia: str) -> str:
+    """Normaliza una sentencia para agrupar las que solo difieren en valores."""
+    texto = _CADENAS.sub("?", sentencia)
+    texto = _NUMEROS.sub("?", texto)
+    texto = _LISTAS.sub("(?, ...)", texto)
+    return _ESPACIOS.sub(" ", texto).strip()
+
+
+def forma_parametros(parametros, executemany: bool = False):
+    """Tipos de los parámetros, sin sus valores."""
+    if executemany:
+        filas = list(parametros or [])
+        return {"filas": len(filas), "forma": forma_parametros(filas[0]) if filas else []}
+    if isinstance(parametros, dict):
+        return {clave: type(valor).__name__ for clave, valor in parametros.items()}
+    return [type(valor).__name__ for valor in (parametros or ())]
+
+
+class _Limitador:
+    """Cubo de fichas: como mucho `por_minuto` registros, con ráfagas del mismo tamaño."""
+
+    def __init__(self, por_minuto: int):
+        self.capacidad = max(1, por_minuto)
+        self.fichas = float(self.capacidad)
+        self.ultimo = time.monotonic()
+        self.suprimidos = 0
+        self._lock = threading.Lock()
+
+    def permitir(self) -> Optional[int]:
+        """Devuelve los suprimidos desde el último registro permitido, o None si no se permite."""
+        with self._lock:
+            ahora = time.monotonic()
+            self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultimo) * self.capacidad / 60)
+            self.ultimo = ahora
+            if self.fichas < 1:
+                self.suprimidos += 1
+                return None
+            self.fichas -= 1
+            suprimidos, self.suprimidos = self.suprimidos, 0
+            return suprimidos
+
+
+_limitador = _Limitador(MAX_REGISTROS_POR_MINUTO)
+_planes: "OrderedDict[str, tuple]" = OrderedDict()
+_lock_planes = threading.Lock()
+
+
+def _configurar_logger():
+    if not logger.handlers:
+        manejador = logging.FileHandler(ARCHIVO_CONSULTAS_LENTAS, encoding="utf-8")
+        manejador.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(manejador)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def _plan(cursor, sentencia: str, parametros, clave: str) -> Optional[List[str]]:
+    if not sentencia.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+        return None
+    with _lock_planes:
+        guardado = _planes.get(clave)
+        if guardado:
+            _planes.move_to_end(clave)
+    if guardado and time.monotonic() - guardado[0] < VIGENCIA_PLAN:
+        return guardado[1]
+    try:
+        filas = cursor.connection.execute(f"EXPLAIN QUERY PLAN {sentencia}", parametros or ()).fetchall()
+        plan = [fila[-1] for fila in filas]
+    except Exception as error:
+        plan = [f"no disponible: {error}"]
+    with _lock_planes:
+        _planes[clave] = (time.monotonic(), plan)
+        _planes.move_to_end(clave)
+        while len(_planes) > MAX_PLANES:
+            _planes.popitem(last=False)
+    return plan
+
+
+def _antes(conn, cursor, sentencia, parametros, context, executemany):
+    # En el contexto de la ejecución y no en la conexión: si la sentencia falla
+    # after_cursor_execute no llega, y el inicio se va con el contexto
+    if context is not None:
+        context._inicio_consulta = time.perf_counter()
+
+
+def _despues(conn, cursor, sentencia, parametros, context, executemany):
+    inicio = getattr(context, "_inicio_consulta", None)
+    if inicio is None:
+        return
+    duracion_ms = (time.perf_counter() - inicio) * 1000
+    if duracion_ms < UMBRAL_CONSULTA_LENTA_MS:
+        return
+    suprimidos = _limitador.permitir()
+    if suprimidos is None:
+        return
+
+    clave = huella(sentencia)
+    registro = {
+        "fecha": datetime.now().isoformat(timespec="milliseconds"),
+        "duracion_ms": round(duracion_ms, 2),
+        "ruta": ruta_actual(),
+        "huella": clave,
+        "sentencia": sentencia,
+        "parametros": forma_parametros(parametros, executemany),
+        "plan": None if executemany else _plan(cursor, sentencia, parametros, clave),
+        "suprimidos_previos": suprimidos,
+    }
+    _configurar_logger()
+    logger.info(json.dumps(registro, ensure_ascii=False))
+
+
+def registrar_consultas_lentas(engine):
+    """Instala en el engine los eventos que miden cada sentencia."""
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _despues)
+
+
+def resumir(ruta_archivo: str = ARCHIVO_CONSULTAS_LENTAS, limite: int = 20) -> List[dict]:
+    """Agrupa el registro por huella y ordena por tiempo total, de mayor a menor."""
+    grupos = defaultdict(lambda: {"veces": 0, "total_ms": 0.0, "max_ms": 0.0, "rutas": set(), "plan": None})
+    with open(ruta_archivo, encoding="utf-8") as archivo:
+        for linea in archivo:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            grupo = grupos[registro["huella"]]
+            grupo["veces"] += 1
+            grupo["total_ms"] += registro["duracion_ms"]
+            grupo["max_ms"] = max(grupo["max_ms"], registro["duracion_ms"])
+            if registro.get("ruta"):
+                grupo["rutas"].add(registro["ruta"])
+            if registro.get("plan"):
+                grupo["plan"] = registro["plan"]
+
+    resumen = [
+        {
+            "huella": clave,
+            "veces": grupo["veces"],
+            "total_ms": round(grupo["total_ms"], 2),
+            "promedio_ms": round(grupo["total_ms"] / grupo["veces"], 2),
+            "max_ms": round(grupo["max_ms"], 2),
+            "rutas": sorted(grupo["rutas"]),
+            "plan": grupo["plan"],
+        }
+        for clave, grupo in grupos.items()
+    ]
+    resumen.sort(key=lambda g: g["total_ms"], reverse=True)
+    return resumen[:limite]
@@ -0,0 +1,52 @@
+import re
+from contextvars import ContextVar
+from typing import Optional
+
+PARAMETRO_RUTA = re.compile(r"{(\w+)(?::[^}]*)?}")
+
+# Scope ASGI de la petición que se está atendiendo. FastAPI guarda la ruta
+# resuelta en el mismo diccionario, así se puede saber qué endpoint originó
+# una consulta aunque se ejecute en un hilo del threadpool.
+peticion_actual: ContextVar[Optional[dict]] = ContextVar("peticion_actual", default=None)
+
+
+def plantilla_ruta(scope: dict) -> str:
+    """
+    Plantilla de la ruta resuelta, p. ej. '/api/prestamos/{prestamo_id}'.
+    Según la versión de FastAPI la ruta guardada puede ser relativa al router
+    incluido, así que se le antepone el prefijo tomado de la ruta concreta.
+    """
+    camino = scope.get("path", "")
+    plantilla = getattr(scope.get("route"), "path", None)
+    if not plantilla:
+        return camino
+    parametros = scope.get("path_params") or {}
+    concreta = PARAMETRO_RUTA.sub(lambda m: str(parametros.get(m.group(1), m.group(0))), plantilla)
+    if camino.endswith(concreta):
+        return camino[:len(camino) - len(concreta)] + plantilla
+    return plantilla
+
+
+def ruta_actual() -> Optional[str]:
+    """Método y plantilla de la ruta en curso, p. ej. 'GET /api/prestamos/{prestamo_id}'."""
+    scope = peticion_actual.get()
+    if scope is None:
+        return None
+    return f"{scope.get('method')} {plantilla_ruta(scope)}"
+
+
+class ContextoPeticionMiddleware:
+    """Middleware ASGI que publica el scope de cada petición HTTP en `peticion_actual`."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = peticion_actual.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            peticion_actual.reset(token)
@@ -0,0 +1,108 @@
+from typing import List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+TAMANO_LOTE_RECONCILIACION = 500
+# Diferencias que se devuelven como muestra en el resultado de la reconciliación
+MAX_DIFERENCIAS_MOSTRADAS = 20
+
+
+def reservar(db: Session, usuario_id: int) -> bool:
+    """
+    Suma un préstamo activo al usuario si no alcanzó su límite.
+    La comprobación y el incremento son un único UPDATE condicional, así dos
+    préstamos simultáneos no pueden superar el límite. Devuelve False si no hay cupo.
+    """
+    usuarios = models.Usuario.__table__
+    resultado = db.execute(
+        update(usuarios)
+        .where(usuarios.c.id == usuario_id, usuarios.c.prestamos_activos < usuarios.c.limite_prestamos)
+        .values(prestamos_activos=usuarios.c.prestamos_activos + 1)
+    )
+    return resultado.rowcount == 1
+
+
+def liberar(db: Session, usuario_id: int):
+    """Resta un préstamo activo al usuario (devolución o eliminación)."""
+    usuarios = models.Usuario.__table__
+    db.execute(
+        update(usuarios)
+        .where(usuarios.c.id == usuario_id, usuarios.c.prestamos_activos > 0)
+        .values(prestamos_activos=usuarios.c.prestamos_activos - 1)
+    )
+
+
+def _activos_reales():
+    prestamos = models.Prestamo.__table__
+    usuarios = models.Usuario.__table__
+    return (
+        select(func.count())
+        .select_from(prestamos)
+        .where(prestamos.c.usuario_id == usuarios.c.id, prestamos.c.estado == "activo")
+        .scalar_subquery()
+    )
+
+
+def reconciliar(db: Session, tamano_lote: int = TAMANO_LOTE_RECONCILIACION, corregir: bool = False) -> dict:
+    """
+    Compara prestamos_activos de cada usuario con los préstamos activos de la tabla
+    de préstamos, por lotes de usuarios paginados por id. Con `corregir`, los
+    contadores distintos se recalculan en la misma pasada (un commit por lote).
+    """
+    usuarios = models.Usuario.__table__
+    prestamos = models.Prestamo.__table__
+    revisados = 0
+    diferencias: List[dict] = []
+    total_diferencias = 0
+    ultimo_id = 0
+
+    while True:
+        filas = db.execute(
+            select(usuarios.c.id, usuarios.c.prestamos_activos)
+            .where(usuarios.c.id > ultimo_id)
+            .order_by(usuarios.c.id)
+            .limit(tamano_lote)
+        ).all()
+        if not filas:
+            break
+        ids = [fila.id for fila in filas]
+        reales = dict(db.execute(
+            select(prestamos.c.usuario_id, func.count())
+            .where(prestamos.c.usuario_id.in_(ids), prestamos.c.estado == "activo")
+            .group_by(prestamos.c.usuario_id)
+        ).all())
+
+        distintos = []
+        for fila in filas:
+            real = reales.get(fila.id, 0)
+            if fila.prestamos_activos != real:
+                distintos.append(fila.id)
+                if len(diferencias) < MAX_DIFERENCIAS_MOSTRADAS:
+                    diferencias.append({
+                        "usuario_id": fila.id,
+                        "contador": fila.prestamos_activos,
+                        "real": real,
+                    })
+
+        if distintos and corregir:
+            # Se recalcula con una subconsulta para no pisar cambios hechos entre la lectura y el UPDATE
+            db.execute(
+                update(usuarios)
+                .where(usuarios.c.id.in_(distintos))
+                .values(prestamos_activos=_activos_reales())
+            )
+        db.commit()
+
+        revisados += len(filas)
+        total_diferencias += len(distintos)
+        ultimo_id = ids[-1]
+
+    return {
+        "revisados": revisados,
+        "diferencias": total_diferencias,
+        "corregidos": total_diferencias if corregir else 0,
+        "muestra": diferencias,
+    }
@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, desc, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Cuántos materiales se devuelven en el ranking de los más prestados
+LIMITE_MAS_PRESTADOS = 10
+
+Clave = Tuple[str, str]
+
+
+def _mes(fecha: datetime) -> str:
+    return fecha.strftime("%Y-%m")
+
+
+def _claves_material(material_id: int, tipo: str, genero) -> List[Clave]:
+    claves = [("tipo", tipo), ("material", str(material_id))]
+    if genero is not None:
+        claves.append(("genero", genero.value if hasattr(genero, "value") else str(genero)))
+    return claves
+
+
+def _claves(material: models.Material) -> List[Clave]:
+    return _claves_material(material.id, material.tipo, getattr(material, "genero", None))
+
+
+def _aplicar(db: Session, deltas: Dict[Clave, List[int]]):
+    """
+    Suma los deltas (préstamos, devoluciones) a los contadores con un único
+    INSERT ... ON CONFLICT, dentro de la transacción abierta de la sesión.
+    """
+    filas = [
+        {"dimension": dimension, "clave": clave, "prestamos": p, "devoluciones": d}
+        for (dimension, clave), (p, d) in deltas.items()
+        if p or d
+    ]
+    if not filas:
+        return
+    tabla = models.EstadisticaPrestamo.__table__
+    stmt = insert(tabla).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[tabla.c.dimension, tabla.c.clave],
+        set_={
+            "prestamos": tabla.c.prestamos + stmt.excluded.prestamos,
+            "devoluciones": tabla.c.devoluciones + stmt.excluded.devoluciones,
+        },
+    )
+    db.execute(stmt)
+
+
+def registrar_prestamo(db: Session, material: models.Material, fecha_prestamo: datetime):
+    deltas = defaultdict(lambda: [0, 0])
+    for clave in _claves(material) + [("mes", _mes(fecha_prestamo))]:
+        deltas[clave][0] += 1
+    _aplicar(db, deltas)
+
+
+def registrar_devolucion(db: Session, material: Optional[models.Material], fecha_devolucion: datetime):
+    deltas = defaultdict(lambda: [0, 0])
+    claves = _claves(material) if material is not None else []
+    for clave in claves + [("mes", _mes(fecha_devolucion))]:
+        deltas[clave][1] += 1
+    _aplicar(db, deltas)
+
+
+def anular_prestamo(db: Session, material: Optional[models.Material], prestamo: models.Prestamo):
+    """Descuenta un préstamo eliminado (y su devolución, si la tenía)."""
+    deltas = defaultdict(lambda: [0, 0])
+    claves = _claves(material) if material is not None else []
+    for clave in claves + [("mes", _mes(prestamo.fecha_prestamo))]:
+        deltas[clave][0] -= 1
+    if prestamo.estado == "devuelto" and prestamo.fecha_devolucion is not None:
+        for clave in claves + [("mes", _mes(prestamo.fecha_devolucion))]:
+            deltas[clave][1] -= 1
+    _aplicar(db, deltas)
+
+
+def _acumular(db: Session, prestamos, deltas: Dict[Clave, List[int]], tamano_lote: int) -> int:
+    """Suma a `deltas` los préstamos de la tabla dada, leídos por lotes paginados por id."""
+    materiales = models.Material.__table__
+    libros = models.Libro.__table__
+    procesados = 0
+    ultimo_id = 0
+
+    while True:
+        filas = db.execute(
+            select(
+                prestamos.c.id,
+                prestamos.c.fecha_prestamo,
+                prestamos.c.fecha_devolucion,
+                prestamos.c.estado,
+                materiales.c.id.label("material_id"),
+                materiales.c.tipo,
+                libros.c.genero,
+            )
+            .select_from(prestamos)
+            .outerjoin(materiales, materiales.c.id == prestamos.c.material_id)
+            .outerjoin(libros, libros.c.id == materiales.c.id)
+            .where(prestamos.c.id > ultimo_id)
+            .order_by(prestamos.c.id)
+            .limit(tamano_lote)
+        ).all()
+        if not filas:
+            break
+
+        for fila in filas:
+            claves = (
+                _claves_material(fila.material_id, fila.tipo, fila.genero)
+                if fila.material_id is not None else []
+            )
+            for clave in claves + [("mes", _mes(fila.fecha_prestamo))]:
+                deltas[clave][0] += 1
+            if fila.estado == "devuelto" and fila.fecha_devolucion is not None:
+                for clave in claves + [("mes", _mes(fila.fecha_devolucion))]:
+                    deltas[clave][1] += 1
+
+        procesados += len(filas)
+        ultimo_id = filas[-1].id
+    return procesados
+
+
+def reconstruir(db: Session, tamano_lote: int = 1000) -> int:
+    """
+    Recalcula todos los contadores desde las tablas de préstamos vivos y archivados.
+    Lee los préstamos por lotes paginados por id y reemplaza los contadores
+    en una sola transacción, de modo que los lectores nunca ven tablas vacías.
+    Devuelve la cantidad de préstamos procesados.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    procesados = _acumular(db, models.Prestamo.__table__, deltas, tamano_lote)
+    procesados += _acumular(db, models.PrestamoArchivado.__table__, deltas, tamano_lote)
+
+    db.query(models.EstadisticaPrestamo).delete(synchronize_session=False)
+    claves = list(deltas.items())
+    for inicio in range(0, len(claves), tamano_lote):
+        _aplicar(db, dict(claves[inicio:inicio + tamano_lote]))
+    db.commit()
+    return procesados
+
+
+def obtener_resumen(db: Session) -> dict:
+    tabla = models.EstadisticaPrestamo
+    resumen = {"por_mes": [], "por_tipo": [], "por_genero": [], "mas_prestados": []}
+
+    filas = (
+        db.query(tabla)
+        .filter(tabla.dimension.in_(["mes", "tipo", "genero"]))
+        .order_by(tabla.dimension, tabla.clave)
+        .all()
+    )
+    for fila in filas:
+        if fila.dimension == "mes":
+            resumen["por_mes"].append({
+                "mes": fila.clave,
+                "prestamos": fila.prestamos,
+                "devoluciones": fila.devoluciones,
+            })
+        else:
+            resumen["por_" + fila.dimension].append({
+                "clave": fila.clave,
+                "prestamos": fila.prestamos,
+                "devoluciones": fila.devoluciones,
+                "activos": fila.prestamos - fila.devoluciones,
+            })
+
+    mas_prestados = (
+        db.query(tabla.prestamos, models.Material.id, models.Material.tipo,
+                 models.Material.titulo, models.Material.autor)
+        .join(models.Material, models.Material.id == cast(tabla.clave, Integer))
+        .filter(tabla.dimension == "material", tabla.prestamos > 0)
+        .order_by(desc(tabla.prestamos), models.Material.id)
+        .limit(LIMITE_MAS_PRESTADOS)
+        .all()
+    )
+    resumen["mas_prestados"] = [
+        {
+            "material_id": m.id,
+            "tipo": m.tipo,
+            "titulo": m.titulo,
+            "autor": m.autor,
+            "prestamos": m.prestamos,
+        }
+        for m in mas_prestados
+    ]
+    return resumen
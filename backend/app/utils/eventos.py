@@ -0,0 +1,114 @@
+import asyncio
+import json
+import threading
+from typing import Callable, Iterable, List, Optional, Set
+
+# Eventos pendientes que se guardan por cliente antes de descartar los más antiguos
+TAMANO_COLA_CLIENTE = 100
+# Descartes consecutivos tolerados antes de desconectar a un cliente lento
+MAX_DESCARTES_CONSECUTIVOS = 500
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+INTERVALO_LATIDO = 15
+
+
+class Suscripcion:
+    def __init__(self, material_ids: Optional[Iterable[int]], tamano_cola: int):
+        self.material_ids: Optional[Set[int]] = set(material_ids) if material_ids else None
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=tamano_cola)
+        self.descartados = 0
+        self.descartes_consecutivos = 0
+        self.cerrada = False
+
+    def interesa(self, material_id: int) -> bool:
+        return self.material_ids is None or material_id in self.material_ids
+
+
+class DifusorDisponibilidad:
+    """
+    Reparte los cambios de disponibilidad de materiales a los clientes conectados
+    por SSE. Cada cliente tiene su propia cola acotada: si no consume a tiempo se
+    descartan sus eventos más antiguos (el último valor de cada material siempre
+    llega) y, si sigue sin consumir, se le desconecta para que reintente.
+    """
+
+    def __init__(self, tamano_cola: int = TAMANO_COLA_CLIENTE):
+        self._tamano_cola = tamano_cola
+        self._suscripciones: Set[Suscripcion] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._oyentes: List[Callable[[int, int], None]] = []
+
+    def agregar_oyente(self, oyente: Callable[[int, int], None]):
+        """
+        Registra una función que recibe cada cambio (material_id, cantidad_disponible)
+        en el mismo hilo que lo publica, haya o no clientes conectados.
+        """
+        self._oyentes.append(oyente)
+
+    def suscribir(self, material_ids: Optional[Iterable[int]] = None) -> Suscripcion:
+        """Debe llamarse desde el event loop que atiende la conexión."""
+        self._loop = asyncio.get_running_loop()
+        suscripcion = Suscripcion(material_ids, self._tamano_cola)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion: Suscripcion):
+        suscripcion.cerrada = True
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def clientes(self) -> int:
+        return len(self._suscripciones)
+
+    def publicar(self, material_id: int, cantidad_disponible: int):
+        """
+        Publica un cambio de disponibilidad. Se puede llamar desde los handlers
+        síncronos (hilos del threadpool) una vez confirmada la transacción.
+        """
+        for oyente in self._oyentes:
+            oyente(material_id, cantidad_disponible)
+        loop = self._loop
+        if loop is None or not self._suscripciones:
+            return
+        evento = {"material_id": material_id, "cantidad_disponible": max(0, cantidad_disponible)}
+        try:
+            loop.call_soon_threadsafe(self._repartir, evento)
+        except RuntimeError:
+            # El event loop ya se cerró (apagado del servidor)
+            pass
+
+    def _repartir(self, evento: dict):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            if suscripcion.cerrada or not suscripcion.interesa(evento["material_id"]):
+                continue
+            if suscripcion.cola.full():
+                suscripcion.cola.get_nowait()
+                suscripcion.descartados += 1
+                suscripcion.descartes_consecutivos += 1
+                if suscripcion.descartes_consecutivos > MAX_DESCARTES_CONSECUTIVOS:
+                    self.desuscribir(suscripcion)
+                    continue
+            else:
+                suscripcion.descartes_consecutivos = 0
+            suscripcion.cola.put_nowait(evento)
+
+    async def flujo(self, suscripcion: Suscripcion):
+        """Generador de mensajes SSE para una suscripción."""
+        try:
+            yield "retry: 5000\n\n"
+            while not suscripcion.cerrada:
+                try:
+                    evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=INTERVALO_LATIDO)
+                except asyncio.TimeoutError:
+                    yield ": latido\n\n"
+                    continue
+                yield f"event: disponibilidad\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            self.desuscribir(suscripcion)
+
+
+difusor_disponibilidad = DifusorDisponibilidad()
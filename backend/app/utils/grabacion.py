@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from .contexto import plantilla_ruta
+
+# Archivo JSONL donde se graban las peticiones; si no se define, no se graba nada
+ARCHIVO_GRABACION = os.getenv("GRABAR_PETICIONES")
+# Fracción de peticiones que se graban (0 a 1)
+MUESTREO_GRABACION = float(os.getenv("MUESTREO_GRABACION", "1.0"))
+# Bytes del cuerpo que se leen para obtener su forma
+MAX_CUERPO_GRABADO = 64 * 1024
+
+CAMPOS_SENSIBLES = {
+    "password", "token", "access_token", "refresh_token", "email", "username",
+    "carne_identidad", "nombre", "nombre_usuario", "direccion", "direccion_usuario", "q",
+}
+
+
+def forma(valor):
+    """Estructura de un valor sin sus datos: tipos en lugar de valores."""
+    if isinstance(valor, dict):
+        return {clave: forma(v) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [forma(valor[0])] if valor else []
+    if valor is None:
+        return "null"
+    return type(valor).__name__
+
+
+def _sanear_query(query_string: bytes) -> dict:
+    parametros = {}
+    for clave, valor in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        parametros[clave] = "***" if clave in CAMPOS_SENSIBLES else valor
+    return parametros
+
+
+def _sanear_parametros_ruta(parametros: dict) -> dict:
+    return {
+        clave: "***" if clave in CAMPOS_SENSIBLES else valor
+        for clave, valor in (parametros or {}).items()
+    }
+
+
+def _forma_cuerpo(cuerpo: bytes, tipo_contenido: str):
+    if not cuerpo:
+        return None
+    if "application/json" in tipo_contenido:
+        try:
+            return {"json": forma(json.loads(cuerpo))}
+        except ValueError:
+            pass
+    if "application/x-www-form-urlencoded" in tipo_contenido:
+        return {"form": {clave: "str" for clave, _ in parse_qsl(cuerpo.decode("latin-1"))}}
+    return {"bytes": len(cuerpo)}
+
+
+class GrabacionMiddleware:
+    """
+    Middleware ASGI que graba una muestra de las peticiones en un archivo JSONL:
+    método, plantilla de la ruta, parámetros saneados, forma del cuerpo, estado
+    y duración. Los valores de campos personales nunca se escriben.
+    """
+
+    def __init__(self, app, archivo: str, muestreo: float = 1.0):
+        self.app = app
+        self.muestreo = muestreo
+        self._archivo = open(archivo, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _escribir(self, registro: dict):
+        linea = json.dumps(registro, ensure_ascii=False)
+        with self._lock:
+            self._archivo.write(linea + "\n")
+            self._archivo.flush()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.muestreo:
+            await self.app(scope, receive, send)
+            return
+
+        cuerpo = bytearray()
+        respuesta = {"estado": None, "flujo": False}
+
+        async def receive_grabando():
+            mensaje = await receive()
+            if mensaje["type"] == "http.request" and len(cuerpo) < MAX_CUERPO_GRABADO:
+                cuerpo.extend(mensaje.get("body", b""))
+            return mensaje
+
+        async def send_grabando(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["estado"] = mensaje["status"]
+                cabeceras = dict(mensaje.get("headers") or [])
+                respuesta["flujo"] = b"text/event-stream" in cabeceras.get(b"content-type", b"")
+            await send(mensaje)
+
+        instante = time.time()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive_grabando, send_grabando)
+        finally:
+            if not respuesta["flujo"]:
+                cabeceras = dict(scope.get("headers") or [])
+                self._escribir({
+                    "t": round(instante, 6),
+                    "metodo": scope["method"],
+                    "ruta": plantilla_ruta(scope),
+                    "parametros_ruta": _sanear_parametros_ruta(scope.get("path_params")),
+                    "query": _sanear_query(scope.get("query_string", b"")),
+                    "cuerpo": _forma_cuerpo(bytes(cuerpo), cabeceras.get(b"content-type", b"").decode("latin-1")),
+                    "autenticada": b"authorization" in cabeceras,
+                    "estado": respuesta["estado"],
+                    "duracion_ms": round((time.perf_counter() - inicio) * 1000, 3),
+                })
+
+
+def configurar(app, archivo: Optional[str] = ARCHIVO_GRABACION, muestreo: float = MUESTREO_GRABACION):
+    """Activa la grabación si hay un archivo configurado."""
+    if archivo:
+        app.add_middleware(GrabacionMiddleware, archivo=archivo, muestreo=muestreo)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import Header, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from sqlalchemy import delete, literal_column, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from .contexto import plantilla_ruta
+from .security import ALGORITHM, SECRET_KEY
+
+# Horas durante las que un reintento con la misma clave recibe la respuesta guardada
+TTL_IDEMPOTENCIA_HORAS = float(os.getenv("TTL_IDEMPOTENCIA_HORAS", "24"))
+TAMANO_LOTE_PURGA = 500
+LONGITUD_MAXIMA_CLAVE = 255
+
+
+def _usuario(request: Request) -> str:
+    """Email del token bearer si es válido; las peticiones anónimas comparten el usuario ""."""
+    autorizacion = request.headers.get("authorization", "")
+    if not autorizacion.lower().startswith("bearer "):
+        return ""
+    try:
+        return jwt.decode(autorizacion[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub") or ""
+    except JWTError:
+        return ""
+
+
+def _limite() -> datetime:
+    return datetime.now() - timedelta(hours=TTL_IDEMPOTENCIA_HORAS)
+
+
+class Idempotencia:
+    """
+    Estado de la cabecera Idempotency-Key de una petición. Sin cabecera, todos
+    los métodos se comportan como si la petición no fuera idempotente.
+    """
+
+    def __init__(self, clave: Optional[str] = None, ruta: str = "", usuario: str = "", huella: str = ""):
+        self.clave = clave
+        self.ruta = ruta
+        self.usuario = usuario
+        self.huella = huella
+
+    def _filtro(self, tabla):
+        return (tabla.c.clave == self.clave) & (tabla.c.ruta == self.ruta) & (tabla.c.usuario == self.usuario)
+
+    def respuesta_previa(self, db: Session) -> Optional[JSONResponse]:
+        """
+        Respuesta guardada de una petición anterior con la misma clave, ruta y usuario.
+        Una clave vencida se borra para que la petición actual pueda volver a usarla.
+        """
+        if self.clave is None:
+            return None
+        tabla = models.ClaveIdempotencia.__table__
+        fila = db.execute(select(tabla).where(self._filtro(tabla))).first()
+        if fila is None:
+            return None
+        if fila.creado_en < _limite():
+            db.execute(delete(tabla).where(self._filtro(tabla)))
+            return None
+        if fila.huella_cuerpo != self.huella:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="La clave de idempotencia ya se usó con un cuerpo distinto"
+            )
+        return JSONResponse(
+            status_code=fila.estado_http,
+            content=json.loads(fila.respuesta),
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    def guardar(self, db: Session, esquema, objeto, estado_http: int = status.HTTP_200_OK):
+        """
+        Agrega a la transacción abierta la respuesta (los campos de `esquema` leídos
+        de `objeto`); se confirma junto con el resto.
+        """
+        if self.clave is None:
+            return
+        campos = getattr(esquema, "model_fields", None) or esquema.__fields__
+        respuesta = {campo: getattr(objeto, campo) for campo in campos}
+        db.add(models.ClaveIdempotencia(
+            clave=self.clave,
+            ruta=self.ruta,
+            usuario=self.usuario,
+            huella_cuerpo=self.huella,
+            estado_http=estado_http,
+            respuesta=json.dumps(jsonable_encoder(respuesta), ensure_ascii=False),
+        ))
+
+    def tras_conflicto(self, db: Session, error: IntegrityError) -> JSONResponse:
+        """
+        Ante un IntegrityError al confirmar, devuelve la respuesta de la petición
+        simultánea que usó la misma clave; si no la hay, relanza `error`.
+        """
+        db.rollback()
+        previa = self.respuesta_previa(db)
+        if previa is None:
+            raise error
+        return previa
+
+
+async def idempotencia(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+) -> Idempotencia:
+    """Dependencia para los endpoints de creación que aceptan Idempotency-Key."""
+    if idempotency_key is None:
+        return Idempotencia()
+    if not idempotency_key or len(idempotency_key) > LONGITUD_MAXIMA_CLAVE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key debe tener entre 1 y {LONGITUD_MAXIMA_CLAVE} caracteres"
+        )
+    return Idempotencia(
+        clave=idempotency_key,
+        ruta=f"{request.method} {plantilla_ruta(request.scope)}",
+        usuario=_usuario(request),
+        huella=hashlib.sha256(await request.body()).hexdigest(),
+    )
+
+
+def purgar(db: Session, tamano_lote: int = TAMANO_LOTE_PURGA) -> int:
+    """Borra las claves vencidas, un lote por transacción. Devuelve cuántas se borraron."""
+    tabla = models.ClaveIdempotencia.__table__
+    rowid = literal_column("rowid")
+    limite = _limite()
+    borradas = 0
+    while True:
+        lote = select(rowid).select_from(tabla).where(tabla.c.creado_en < limite).limit(tamano_lote)
+        resultado = db.execute(delete(tabla).where(rowid.in_(lote)))
+        db.commit()
+        if not resultado.rowcount:
+            break
+        borradas += resultado.rowcount
+    return borradas
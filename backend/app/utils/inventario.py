@@ -0,0 +1,119 @@
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+PROCESO_RECONCILIACION = "reconciliacion_cantidad_prestamo"
+TAMANO_LOTE_RECONCILIACION = 500
+# Diferencias que se devuelven como muestra en el resultado de la reconciliación
+MAX_DIFERENCIAS_MOSTRADAS = 20
+
+
+def _prestados_reales():
+    prestamos = models.Prestamo.__table__
+    materiales = models.Material.__table__
+    return (
+        select(func.count())
+        .select_from(prestamos)
+        .where(prestamos.c.material_id == materiales.c.id, prestamos.c.estado == "activo")
+        .scalar_subquery()
+    )
+
+
+def obtener_marca(db: Session) -> Optional[datetime]:
+    marca = db.get(models.MarcaAgua, PROCESO_RECONCILIACION)
+    return marca.valor if marca else None
+
+
+def _guardar_marca(db: Session, valor: datetime):
+    tabla = models.MarcaAgua.__table__
+    stmt = insert(tabla).values(proceso=PROCESO_RECONCILIACION, valor=valor)
+    db.execute(stmt.on_conflict_do_update(index_elements=[tabla.c.proceso], set_={"valor": valor}))
+    db.commit()
+
+
+def reconciliar(
+    db: Session,
+    tamano_lote: int = TAMANO_LOTE_RECONCILIACION,
+    corregir: bool = False,
+    incremental: bool = False
+) -> dict:
+    """
+    Compara cantidad_prestamo de cada material con sus préstamos activos
+    (un GROUP BY material_id por lote de materiales paginados por id).
+    Con `corregir`, los distintos se recalculan en el mismo lote y cada lote
+    es una transacción corta.
+
+    Con `incremental` solo se revisan los materiales modificados desde la última
+    ejecución con `corregir`: todo préstamo, devolución o aprobación actualiza
+    el material, y con él su modificado_en. La marca se toma al empezar, así lo
+    que cambie durante la ejecución se revisa en la siguiente.
+    """
+    materiales = models.Material.__table__
+    prestamos = models.Prestamo.__table__
+    inicio = datetime.now()
+    desde = obtener_marca(db) if incremental else None
+
+    revisados = 0
+    diferencias: List[dict] = []
+    total_diferencias = 0
+    ultimo_id = 0
+
+    while True:
+        consulta = (
+            select(materiales.c.id, materiales.c.cantidad_prestamo)
+            .where(materiales.c.id > ultimo_id)
+            .order_by(materiales.c.id)
+            .limit(tamano_lote)
+        )
+        if desde is not None:
+            consulta = consulta.where(materiales.c.modificado_en > desde)
+        filas = db.execute(consulta).all()
+        if not filas:
+            break
+        ids = [fila.id for fila in filas]
+        reales = dict(db.execute(
+            select(prestamos.c.material_id, func.count())
+            .where(prestamos.c.material_id.in_(ids), prestamos.c.estado == "activo")
+            .group_by(prestamos.c.material_id)
+        ).all())
+
+        distintos = []
+        for fila in filas:
+            real = reales.get(fila.id, 0)
+            if (fila.cantidad_prestamo or 0) != real:
+                distintos.append(fila.id)
+                if len(diferencias) < MAX_DIFERENCIAS_MOSTRADAS:
+                    diferencias.append({
+                        "material_id": fila.id,
+                        "cantidad_prestamo": fila.cantidad_prestamo,
+                        "real": real,
+                    })
+
+        if distintos and corregir:
+            # Se recalcula con una subconsulta para no pisar préstamos hechos entre la lectura y el UPDATE
+            db.execute(
+                update(materiales)
+                .where(materiales.c.id.in_(distintos))
+                .values(cantidad_prestamo=_prestados_reales())
+            )
+        db.commit()
+
+        revisados += len(filas)
+        total_diferencias += len(distintos)
+        ultimo_id = ids[-1]
+
+    if corregir:
+        _guardar_marca(db, inicio)
+
+    return {
+        "desde": desde,
+        "revisados": revisados,
+        "diferencias": total_diferencias,
+        "corregidos": total_diferencias if corregir else 0,
+        "muestra": diferencias,
+    }
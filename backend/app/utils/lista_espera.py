@@ -0,0 +1,143 @@
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import cupos, estadisticas
+
+ESTADO_EN_ESPERA = "en_espera"
+
+
+def encolar(db: Session, solicitud: models.SolicitudPrestamo) -> models.EntradaListaEspera:
+    """
+    Agrega la solicitud al final de la lista de espera de su material.
+    La posición se reserva incrementando la cabecera de la cola antes de leerla:
+    el UPDATE toma el bloqueo de escritura, así dos solicitudes simultáneas nunca
+    reciben la misma posición.
+    """
+    colas = models.ColaEspera.__table__
+    db.execute(
+        insert(colas)
+        .values(material_id=solicitud.material_id, siguiente_posicion=1, longitud=0)
+        .on_conflict_do_nothing(index_elements=[colas.c.material_id])
+    )
+    db.execute(
+        update(colas)
+        .where(colas.c.material_id == solicitud.material_id)
+        .values(siguiente_posicion=colas.c.siguiente_posicion + 1, longitud=colas.c.longitud + 1)
+    )
+    posicion = db.execute(
+        select(colas.c.siguiente_posicion - 1).where(colas.c.material_id == solicitud.material_id)
+    ).scalar()
+
+    solicitud.estado = ESTADO_EN_ESPERA
+    db.flush()
+    entrada = models.EntradaListaEspera(
+        material_id=solicitud.material_id,
+        posicion=posicion,
+        solicitud_id=solicitud.id
+    )
+    db.add(entrada)
+    return entrada
+
+
+def _quitar(db: Session, entrada: models.EntradaListaEspera):
+    colas = models.ColaEspera.__table__
+    db.execute(
+        update(colas)
+        .where(colas.c.material_id == entrada.material_id)
+        .values(longitud=colas.c.longitud - 1)
+    )
+    db.delete(entrada)
+    db.flush()
+
+
+def retirar(db: Session, solicitud_id: int) -> bool:
+    """Quita una solicitud de la lista de espera. Devuelve False si no estaba."""
+    entrada = db.query(models.EntradaListaEspera).filter(
+        models.EntradaListaEspera.solicitud_id == solicitud_id
+    ).first()
+    if entrada is None:
+        return False
+    _quitar(db, entrada)
+    return True
+
+
+def promover_siguiente(
+    db: Session, material: models.Material
+) -> Optional[Tuple[models.SolicitudPrestamo, models.Prestamo]]:
+    """
+    Si hay un ejemplar libre, aprueba la primera solicitud de la lista de espera
+    y crea su préstamo, en la transacción abierta de la sesión. Las solicitudes
+    de usuarios que ya no existen o que alcanzaron su límite de préstamos se
+    rechazan y se pasa a la siguiente.
+    """
+    while material.cantidad_prestamo < material.cantidad_total:
+        entrada = (
+            db.query(models.EntradaListaEspera)
+            .filter(models.EntradaListaEspera.material_id == material.id)
+            .order_by(models.EntradaListaEspera.posicion)
+            .first()
+        )
+        if entrada is None:
+            return None
+
+        solicitud = entrada.solicitud
+        _quitar(db, entrada)
+
+        usuario = db.query(models.Usuario).filter(
+            models.Usuario.carne_identidad == solicitud.carne_identidad
+        ).first()
+        if not usuario:
+            solicitud.estado = "rechazada"
+            solicitud.observaciones = "Usuario no encontrado al liberarse un ejemplar"
+            continue
+        if not cupos.reservar(db, usuario.id):
+            solicitud.estado = "rechazada"
+            solicitud.observaciones = "El usuario alcanzó su límite de préstamos activos"
+            continue
+
+        db_prestamo = models.Prestamo(
+            usuario_id=usuario.id,
+            material_id=material.id,
+            fecha_prestamo=datetime.now(),
+            estado="activo"
+        )
+        material.cantidad_prestamo += 1
+        estadisticas.registrar_prestamo(db, material, db_prestamo.fecha_prestamo)
+        solicitud.estado = "aprobada"
+        db.add(db_prestamo)
+        return solicitud, db_prestamo
+    return None
+
+
+def longitud(db: Session, material_id: int) -> int:
+    cola = db.query(models.ColaEspera.longitud).filter(
+        models.ColaEspera.material_id == material_id
+    ).first()
+    return cola.longitud if cola else 0
+
+
+def posicion(db: Session, solicitud_id: int) -> Optional[dict]:
+    """
+    Posición (1 = siguiente en recibir el ejemplar) de una solicitud en espera.
+    Se cuenta sobre el índice (material_id, posicion), sin recorrer la tabla.
+    """
+    entrada = db.query(models.EntradaListaEspera).filter(
+        models.EntradaListaEspera.solicitud_id == solicitud_id
+    ).first()
+    if entrada is None:
+        return None
+    por_delante = db.query(func.count()).select_from(models.EntradaListaEspera).filter(
+        models.EntradaListaEspera.material_id == entrada.material_id,
+        models.EntradaListaEspera.posicion < entrada.posicion
+    ).scalar()
+    return {
+        "solicitud_id": solicitud_id,
+        "material_id": entrada.material_id,
+        "posicion": por_delante + 1,
+        "longitud": longitud(db, entrada.material_id),
+    }
@@ -0,0 +1,47 @@
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException, status
+
+# Máximo de ids por consulta en los endpoints /lote
+MAX_IDS_LOTE = 500
+
+
+def parsear_ids(texto: Optional[str], maximo: Optional[int] = None) -> List[int]:
+    """
+    Convierte una lista de ids separados por comas ("3,1,7") en enteros,
+    conservando el orden y descartando repetidos.
+    """
+    if not texto:
+        return []
+    try:
+        ids = [int(parte) for parte in texto.split(",") if parte.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="La lista de ids debe contener solo números separados por comas"
+        )
+    ids = list(dict.fromkeys(ids))
+    if maximo is not None and len(ids) > maximo:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se admiten como máximo {maximo} ids por consulta"
+        )
+    return ids
+
+
+def parsear_campos(texto: Optional[str], permitidos: Iterable[str]) -> Optional[List[str]]:
+    """
+    Convierte `fields=titulo,autor` en la lista de campos pedidos, siempre con "id"
+    al principio. Devuelve None si no se pidió ningún campo (respuesta completa).
+    """
+    if not texto:
+        return None
+    permitidos = list(permitidos)
+    campos = [parte.strip() for parte in texto.split(",") if parte.strip()]
+    desconocidos = [campo for campo in campos if campo not in permitidos]
+    if desconocidos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(permitidos)}"
+        )
+    return list(dict.fromkeys(["id"] + campos))
@@ -0,0 +1,216 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from .. import database
+from ..database import SesionPerezosa
+from . import respaldo
+from .contexto import peticion_actual
+
+# Segundos entre copias de la réplica local (REPLICA_LOCAL=1)
+INTERVALO_REPLICA = float(os.getenv("INTERVALO_REPLICA_S", "5"))
+# Con una réplica externa no se sabe cuánto atrasa: un cliente que escribió lee
+# de la primaria durante esta cantidad de segundos
+VENTANA_LECTURA_PROPIA = float(os.getenv("VENTANA_LECTURA_PROPIA_S", "10"))
+# Si la última copia local tiene más de estos intervalos, se lee de la primaria
+MAX_INTERVALOS_ATRASO = 10
+MAX_CLIENTES_RECORDADOS = 10000
+METODOS_LECTURA = {"GET", "HEAD", "OPTIONS"}
+
+logger = logging.getLogger("biblioteca.replica")
+
+
+def cliente(scope: dict) -> str:
+    """
+    Usuario del token bearer o, sin token, la IP. No hace falta verificar la
+    firma: un token falso solo consigue que sus lecturas vayan a la primaria.
+    """
+    for nombre, valor in scope.get("headers") or []:
+        if nombre == b"authorization":
+            autorizacion = valor.decode("latin-1")
+            if autorizacion.lower().startswith("bearer "):
+                try:
+                    sub = jwt.get_unverified_claims(autorizacion[7:]).get("sub")
+                except JWTError:
+                    sub = None
+                if sub:
+                    return f"usuario:{sub}"
+            break
+    return f"ip:{(scope.get('client') or ('',))[0]}"
+
+
+class EnrutadorLecturas:
+    """
+    Decide por petición si un GET lee de la réplica o de la primaria.
+    Lectura de lo propio: se recuerda cuándo escribió cada cliente por última
+    vez, y mientras la réplica no tenga esa escritura sus lecturas van a la
+    primaria. Con la réplica local se sabe exactamente: tiene todo lo confirmado
+    antes de que empezara su última copia. Con una réplica externa se usa una
+    ventana fija (VENTANA_LECTURA_PROPIA).
+    """
+
+    def __init__(self, intervalo: float = INTERVALO_REPLICA, ventana: float = VENTANA_LECTURA_PROPIA,
+                 max_clientes: int = MAX_CLIENTES_RECORDADOS):
+        self.intervalo = intervalo
+        self.ventana = ventana
+        self.max_clientes = max_clientes
+        self.local = database.engine_lectura is not None and not os.getenv("BIBLIOTECA_DB_LECTURA_URL")
+        self._escrituras: "OrderedDict[str, float]" = OrderedDict()
+        self._al_dia_desde: Optional[float] = None
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self.sincronizaciones = 0
+        self.errores = 0
+        self.ultimo_error: Optional[str] = None
+        self.ultima_duracion: Optional[float] = None
+        self.lecturas_replica = 0
+        self.lecturas_primaria = 0
+
+    @property
+    def activa(self) -> bool:
+        return database.SessionLectura is not None
+
+    def _marca(self) -> Optional[float]:
+        """Instante (monotónico) hasta el que la réplica tiene todas las escrituras; None si no se puede usar."""
+        ahora = time.monotonic()
+        if not self.local:
+            return ahora - self.ventana
+        marca = self._al_dia_desde
+        if marca is None or ahora - marca > self.intervalo * MAX_INTERVALOS_ATRASO:
+            return None
+        return marca
+
+    def registrar_escritura(self, clave: str):
+        with self._lock:
+            self._escrituras.pop(clave, None)
+            self._escrituras[clave] = time.monotonic()
+            while len(self._escrituras) > self.max_clientes:
+                self._escrituras.popitem(last=False)
+
+    def usar_replica(self, clave: str) -> bool:
+        if not self.activa:
+            return False
+        marca = self._marca()
+        if marca is None:
+            usar = False
+        else:
+            with self._lock:
+                escritura = self._escrituras.get(clave)
+                usar = escritura is None or escritura < marca
+                if usar and escritura is not None:
+                    # La réplica ya tiene su última escritura: no hace falta recordarla
+                    del self._escrituras[clave]
+        if usar:
+            self.lecturas_replica += 1
+        else:
+            self.lecturas_primaria += 1
+        return usar
+
+    # --- Réplica local ----------------------------------------------------
+
+    def sincronizar(self):
+        """Copia la primaria sobre la réplica local con la API de respaldo (reemplazo atómico)."""
+        inicio = time.monotonic()
+        # Sin pausas entre pasos: cuanto más dura la copia, más fácil es que una
+        # escritura la haga empezar de nuevo
+        respaldo.respaldar(database.RUTA_REPLICA_LOCAL, pausa=0, verificar_copia=False)
+        # La copia incluye todo lo confirmado antes de empezar (si la primaria
+        # cambia durante la copia, SQLite la reinicia)
+        self._al_dia_desde = inicio
+        self.ultima_duracion = round(time.monotonic() - inicio, 3)
+        self.sincronizaciones += 1
+
+    def _ciclo(self):
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.sincronizar()
+            except Exception as error:
+                self.errores += 1
+                self.ultimo_error = str(error)
+                logger.warning("No se pudo actualizar la réplica local: %s", error)
+
+    def iniciar(self):
+        """Primera copia (antes de atender peticiones) y el hilo que la renueva."""
+        if not self.local or self._hilo is not None:
+            return
+        self.sincronizar()
+        self._hilo = threading.Thread(target=self._ciclo, name="replica-local", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=self.intervalo + 5)
+            self._hilo = None
+
+    def estado(self) -> dict:
+        marca = self._al_dia_desde
+        return {
+            "activa": self.activa,
+            "modo": ("local" if self.local else "externa") if self.activa else None,
+            "atraso_s": round(time.monotonic() - marca, 3) if self.local and marca is not None else None,
+            "intervalo_s": self.intervalo if self.local else None,
+            "ventana_lectura_propia_s": None if self.local else self.ventana,
+            "sincronizaciones": self.sincronizaciones,
+            "ultima_duracion_s": self.ultima_duracion,
+            "errores": self.errores,
+            "ultimo_error": self.ultimo_error,
+            "clientes_recordados": len(self._escrituras),
+            "lecturas_replica": self.lecturas_replica,
+            "lecturas_primaria": self.lecturas_primaria,
+        }
+
+
+enrutador_lecturas = EnrutadorLecturas()
+
+
+class LecturaPropiaMiddleware:
+    """
+    Middleware ASGI que anota a cada cliente que hace una petición de escritura
+    (POST, PUT, PATCH, DELETE). Se anota al empezar la respuesta, cuando el
+    handler ya confirmó su transacción.
+    """
+
+    def __init__(self, app, enrutador: EnrutadorLecturas = enrutador_lecturas):
+        self.app = app
+        self.enrutador = enrutador
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") in METODOS_LECTURA:
+            await self.app(scope, receive, send)
+            return
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                self.enrutador.registrar_escritura(cliente(scope))
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+
+def get_read_db():
+    """
+    Como get_db, para endpoints que solo leen: la sesión es de la réplica salvo
+    que no haya réplica o que el cliente tenga escrituras que aún no llegaron a ella.
+    """
+    scope = peticion_actual.get()
+    replica = scope is not None and enrutador_lecturas.usar_replica(cliente(scope))
+    db = SesionPerezosa(database.SessionLectura if replica else None)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def configurar(app):
+    """Instala el middleware de lectura de lo propio y arranca la réplica local si corresponde."""
+    if not enrutador_lecturas.activa:
+        return
+    app.add_middleware(LecturaPropiaMiddleware)
+    enrutador_lecturas.iniciar()
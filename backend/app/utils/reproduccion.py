@@ -0,0 +1,217 @@
+"""
+Reproduce una grabación de peticiones (ver utils/grabacion.py) contra una
+instancia local y compara las latencias con las grabadas.
+
+La instancia debe arrancar con una base de datos propia, por ejemplo:
+    BIBLIOTECA_DB_URL=sqlite:///./reproduccion.db uvicorn app.main:app
+para que initial_data genere el conjunto de datos sobre el que se reproduce.
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .contexto import PARAMETRO_RUTA
+
+# Administrador que crea initial_data en una base de datos nueva
+CREDENCIALES_REPRODUCCION = ("admin@biblioteca.com", "admin123")
+TIMEOUT_PETICION = 30
+
+
+def cargar(ruta_archivo: str) -> List[dict]:
+    with open(ruta_archivo, encoding="utf-8") as archivo:
+        registros = [json.loads(linea) for linea in archivo if linea.strip()]
+    registros.sort(key=lambda r: r["t"])
+    return registros
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return round(ordenados[indice], 3)
+
+
+class ConjuntoDatos:
+    """Ids y credenciales reales de la instancia destino para completar las peticiones."""
+
+    def __init__(self, url_base: str):
+        self.url_base = url_base.rstrip("/")
+        self.token = self._login()
+        self.usuarios = self._obtener("/api/usuarios/?limit=1000")
+        self.materiales = self._obtener("/api/materiales/?limit=1000", {}).get("materials", [])
+        self.prestamos = self._obtener("/api/prestamos/?limit=1000")
+        self.solicitudes = self._obtener("/api/solicitudes/?limit=1000")
+
+    def _login(self) -> Optional[str]:
+        email, password = CREDENCIALES_REPRODUCCION
+        datos = urllib.parse.urlencode({"username": email, "password": password}).encode()
+        try:
+            with urllib.request.urlopen(f"{self.url_base}/api/auth/login", data=datos, timeout=TIMEOUT_PETICION) as r:
+                return json.loads(r.read())["access_token"]
+        except (urllib.error.URLError, KeyError, ValueError):
+            return None
+
+    def _obtener(self, camino: str, defecto=None):
+        """JSON de `camino`, o `defecto` (una lista vacía si no se indica) si falla o no tiene esa forma."""
+        defecto = [] if defecto is None else defecto
+        try:
+            with urllib.request.urlopen(f"{self.url_base}{camino}", timeout=TIMEOUT_PETICION) as r:
+                datos = json.loads(r.read())
+        except (urllib.error.URLError, ValueError):
+            return defecto
+        return datos if isinstance(datos, type(defecto)) else defecto
+
+    def _elegir(self, filas, campo, defecto):
+        return random.choice(filas)[campo] if filas else defecto
+
+    def valor(self, nombre: str, tipo="str"):
+        if nombre in ("usuario_id",):
+            return self._elegir(self.usuarios, "id", 1)
+        if nombre in ("material_id",):
+            return self._elegir(self.materiales, "id", 1)
+        if nombre in ("prestamo_id",):
+            return self._elegir(self.prestamos, "id", 1)
+        if nombre in ("solicitud_id",):
+            return self._elegir(self.solicitudes, "id", 1)
+        if nombre == "carne_identidad":
+            return self._elegir(self.usuarios, "carne_identidad", "CI000000")
+        if nombre in ("email", "username"):
+            return CREDENCIALES_REPRODUCCION[0]
+        if nombre == "password":
+            return CREDENCIALES_REPRODUCCION[1]
+        if tipo == "int":
+            return 1
+        if tipo == "float":
+            return 1.0
+        if tipo == "bool":
+            return True
+        if tipo == "null":
+            return None
+        return "Dato de reproducción"
+
+    def sintetizar(self, forma, nombre: str = ""):
+        if isinstance(forma, dict):
+            return {clave: self.sintetizar(v, clave) for clave, v in forma.items()}
+        if isinstance(forma, list):
+            return [self.sintetizar(forma[0], nombre)] if forma else []
+        return self.valor(nombre, forma)
+
+
+def _construir(registro: dict, datos: ConjuntoDatos) -> urllib.request.Request:
+    grabados = registro.get("parametros_ruta") or {}
+
+    def _parametro(m):
+        nombre = m.group(1)
+        valor = grabados.get(nombre, "***")
+        if valor == "***" or nombre.endswith("_id") or nombre == "carne_identidad":
+            valor = datos.valor(nombre)
+        return urllib.parse.quote(str(valor))
+
+    camino = PARAMETRO_RUTA.sub(_parametro, registro["ruta"])
+    query = {
+        clave: datos.valor(clave) if valor == "***" else valor
+        for clave, valor in (registro.get("query") or {}).items()
+    }
+    url = f"{datos.url_base}{camino}"
+    if query:
+        url += "?" + urllib.parse.urlencode(query)
+
+    cabeceras = {}
+    cuerpo = None
+    forma_cuerpo = registro.get("cuerpo") or {}
+    if "json" in forma_cuerpo:
+        cuerpo = json.dumps(datos.sintetizar(forma_cuerpo["json"])).encode()
+        cabeceras["Content-Type"] = "application/json"
+    elif "form" in forma_cuerpo:
+        cuerpo = urllib.parse.urlencode(datos.sintetizar(forma_cuerpo["form"])).encode()
+        cabeceras["Content-Type"] = "application/x-www-form-urlencoded"
+    elif "bytes" in forma_cuerpo:
+        cuerpo = b"x" * forma_cuerpo["bytes"]
+    if registro.get("autenticada") and datos.token:
+        cabeceras["Authorization"] = f"Bearer {datos.token}"
+
+    return urllib.request.Request(url, data=cuerpo, headers=cabeceras, method=registro["metodo"])
+
+
+def _ejecutar(peticion: urllib.request.Request):
+    inicio = time.perf_counter()
+    try:
+        with urllib.request.urlopen(peticion, timeout=TIMEOUT_PETICION) as respuesta:
+            respuesta.read()
+            estado = respuesta.status
+    except urllib.error.HTTPError as error:
+        error.read()
+        estado = error.code
+    except urllib.error.URLError:
+        estado = None
+    return estado, (time.perf_counter() - inicio) * 1000
+
+
+def reproducir(registros: List[dict], url_base: str, velocidad: float = 1.0, hilos: int = 16) -> List[dict]:
+    """
+    Lanza las peticiones respetando los intervalos grabados divididos por `velocidad`
+    (velocidad 0 = lo más rápido posible). Devuelve un resultado por petición.
+    """
+    datos = ConjuntoDatos(url_base)
+    resultados = []
+    lock = threading.Lock()
+
+    def tarea(registro):
+        estado, latencia = _ejecutar(_construir(registro, datos))
+        with lock:
+            resultados.append({
+                "clave": f"{registro['metodo']} {registro['ruta']}",
+                "latencia_ms": latencia,
+                "estado": estado,
+                "grabado_ms": registro.get("duracion_ms"),
+                "estado_grabado": registro.get("estado"),
+            })
+
+    if not registros:
+        return resultados
+    t0 = registros[0]["t"]
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        for registro in registros:
+            if velocidad > 0:
+                espera = (registro["t"] - t0) / velocidad - (time.perf_counter() - inicio)
+                if espera > 0:
+                    time.sleep(espera)
+            ejecutor.submit(tarea, registro)
+    return resultados
+
+
+def informe(resultados: List[dict]) -> List[dict]:
+    """Distribución de latencias por ruta y diferencia con lo grabado."""
+    grupos = defaultdict(list)
+    for resultado in resultados:
+        grupos[resultado["clave"]].append(resultado)
+    grupos["TOTAL"] = list(resultados)
+
+    filas = []
+    for clave, grupo in grupos.items():
+        reproducidas = [r["latencia_ms"] for r in grupo]
+        grabadas = [r["grabado_ms"] for r in grupo if r["grabado_ms"] is not None]
+        p50_grabado = percentil(grabadas, 50)
+        p50 = percentil(reproducidas, 50)
+        filas.append({
+            "ruta": clave,
+            "peticiones": len(grupo),
+            "p50_ms": p50,
+            "p90_ms": percentil(reproducidas, 90),
+            "p99_ms": percentil(reproducidas, 99),
+            "p50_grabado_ms": p50_grabado,
+            "p99_grabado_ms": percentil(grabadas, 99),
+            "razon_p50": round(p50 / p50_grabado, 2) if p50 and p50_grabado else None,
+            "estados_distintos": sum(1 for r in grupo if r["estado"] != r["estado_grabado"]),
+        })
+    filas.sort(key=lambda f: (f["ruta"] != "TOTAL", -f["peticiones"]))
+    return filas
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from ..database import engine
+
+# Páginas copiadas por paso: entre un paso y otro se liberan los bloqueos de lectura
+PAGINAS_POR_PASO = 256
+# Pausa entre pasos (segundos), sin bloqueos tomados, para que los escritores
+# avancen durante el respaldo
+PAUSA_ENTRE_PASOS = 0.01
+CARPETA_RESPALDOS = "respaldos"
+
+
+def ruta_base_datos() -> str:
+    return engine.url.database
+
+
+def ruta_por_defecto() -> str:
+    nombre = f"biblioteca-{datetime.now():%Y%m%d-%H%M%S}.db"
+    return os.path.join(CARPETA_RESPALDOS, nombre)
+
+
+def verificar(ruta: str) -> list:
+    """Ejecuta PRAGMA integrity_check sobre una copia. Devuelve ["ok"] si está sana."""
+    conexion = sqlite3.connect(ruta)
+    try:
+        return [fila[0] for fila in conexion.execute("PRAGMA integrity_check").fetchall()]
+    finally:
+        conexion.close()
+
+
+def respaldar(
+    destino: str,
+    paginas: int = PAGINAS_POR_PASO,
+    pausa: float = PAUSA_ENTRE_PASOS,
+    progreso: Optional[Callable[[int, int], None]] = None,
+    verificar_copia: bool = True,
+    origen: Optional[str] = None
+) -> dict:
+    """
+    Copia consistente de la base de datos con la API de respaldo en línea de SQLite.
+    La copia se hace en pasos de `paginas` páginas, así los escritores solo esperan
+    lo que dura un paso. Se escribe en un archivo temporal que se renombra al
+    terminar, de modo que `destino` nunca queda a medio escribir.
+    Entre un paso y el siguiente se esperan `pausa` segundos. Alarga la copia,
+    y una escritura de otra conexión durante la copia la hace empezar de nuevo.
+    `progreso(copiadas, totales)` se llama después de cada paso.
+    """
+    carpeta = os.path.dirname(destino)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    temporal = f"{destino}.parcial"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    def _progreso(_estado, restantes, totales):
+        if progreso:
+            progreso(totales - restantes, totales)
+        # backup() llama aquí entre un paso y el siguiente, ya sin bloqueo sobre
+        # la fuente; su parámetro sleep solo espera cuando la fuente está ocupada
+        if pausa > 0 and restantes:
+            time.sleep(pausa)
+
+    inicio = time.perf_counter()
+    fuente = sqlite3.connect(origen or ruta_base_datos())
+    copia = sqlite3.connect(temporal)
+    try:
+        fuente.backup(copia, pages=paginas, progress=_progreso)
+    finally:
+        copia.close()
+        fuente.close()
+
+    integridad = verificar(temporal) if verificar_copia else None
+    if integridad is not None and integridad != ["ok"]:
+        raise RuntimeError(f"La copia no superó la verificación de integridad: {integridad[:5]}")
+    os.replace(temporal, destino)
+
+    return {
+        "destino": destino,
+        "bytes": os.path.getsize(destino),
+        "segundos": round(time.perf_counter() - inicio, 3),
+        "integridad": integridad,
+    }
+
+
+class TrabajoRespaldo:
+    def __init__(self, destino: str):
+        self.id = uuid.uuid4().hex
+        self.destino = destino
+        self.estado = "en_curso"
+        self.paginas_copiadas = 0
+        self.paginas_totales = 0
+        self.integridad = None
+        self.error = None
+        self.iniciado = datetime.now()
+        self.finalizado = None
+
+    def actualizar(self, copiadas: int, totales: int):
+        self.paginas_copiadas = copiadas
+        self.paginas_totales = totales
+
+    def como_dict(self) -> dict:
+        porcentaje = (
+            round(100 * self.paginas_copiadas / self.paginas_totales, 1)
+            if self.paginas_totales else 0.0
+        )
+        return {
+            "id": self.id,
+            "destino": self.destino,
+            "estado": self.estado,
+            "paginas_copiadas": self.paginas_copiadas,
+            "paginas_totales": self.paginas_totales,
+            "porcentaje": porcentaje,
+            "integridad": self.integridad,
+            "error": self.error,
+            "iniciado": self.iniciado,
+            "finalizado": self.finalizado,
+        }
+
+
+_trabajos: Dict[str, TrabajoRespaldo] = {}
+_lock = threading.Lock()
+
+
+def crear_trabajo(destino: Optional[str] = None) -> TrabajoRespaldo:
+    trabajo = TrabajoRespaldo(destino or ruta_por_defecto())
+    with _lock:
+        _trabajos[trabajo.id] = trabajo
+    return trabajo
+
+
+def obtener_trabajo(trabajo_id: str) -> Optional[TrabajoRespaldo]:
+    return _trabajos.get(trabajo_id)
+
+
+def ejecutar_trabajo(trabajo: TrabajoRespaldo, paginas: int = PAGINAS_POR_PASO):
+    try:
+        resultado = respaldar(trabajo.destino, paginas=paginas, progreso=trabajo.actualizar)
+        trabajo.integridad = resultado["integridad"]
+        trabajo.estado = "completado"
+    except Exception as error:
+        trabajo.error = str(error)
+        trabajo.estado = "fallido"
+    finally:
+        trabajo.finalizado = datetime.now()
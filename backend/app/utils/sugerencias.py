@@ -0,0 +1,163 @@
+import bisect
+import os
+import sys
+import threading
+import unicodedata
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# Entradas como máximo en el índice (una por palabra de cada título y autor)
+MAX_ENTRADAS_SUGERENCIAS = int(os.getenv("MAX_ENTRADAS_SUGERENCIAS", "200000"))
+# Entradas del rango del prefijo que se revisan como mucho por consulta
+MAX_ESCANEO = 256
+LIMITE_SUGERENCIAS = 10
+
+# (clave normalizada, material_id, campo, texto original, posición de la palabra)
+Entrada = Tuple[str, int, str, str, int]
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    sin_tildes = "".join(c for c in descompuesto if not unicodedata.combining(c))
+    return " ".join(sin_tildes.lower().split())
+
+
+def _entradas(material_id: int, titulo: Optional[str], autor: Optional[str]) -> List[Entrada]:
+    """
+    Una entrada por cada palabra del título y del autor, con el resto del texto
+    desde esa palabra, así 'garc' encuentra 'Gabriel García Márquez'.
+    """
+    entradas = []
+    for campo, texto in (("titulo", titulo), ("autor", autor)):
+        palabras = normalizar(texto).split(" ")
+        for posicion in range(len(palabras)):
+            clave = " ".join(palabras[posicion:])
+            if clave:
+                entradas.append((clave, material_id, campo, texto, posicion))
+    return entradas
+
+
+class IndiceSugerencias:
+    """
+    Arreglos ordenados de entradas en memoria para autocompletar títulos y autores:
+    uno con la primera palabra de cada texto y otro con las siguientes. Una
+    búsqueda por prefijo es una bisección más un recorrido corto del rango en
+    cada uno, empezando por las primeras palabras, que son las que se sugieren
+    antes; así las palabras de mitad de título no las dejan fuera del recorrido.
+    Se construye al arrancar y se actualiza desde los endpoints que escriben materiales.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS_SUGERENCIAS):
+        self.max_entradas = max_entradas
+        self._iniciales: List[Entrada] = []
+        self._entradas: List[Entrada] = []
+        self._por_material = {}
+        self._omitidas = 0
+        self._lock = threading.Lock()
+
+    def construir(self, db: Session):
+        materiales = models.Material.__table__
+        filas = db.execute(
+            select(materiales.c.id, materiales.c.titulo, materiales.c.autor).order_by(materiales.c.id)
+        ).all()
+        entradas = []
+        por_material = {}
+        omitidas = 0
+        for fila in filas:
+            nuevas = _entradas(fila.id, fila.titulo, fila.autor)
+            if len(entradas) + len(nuevas) > self.max_entradas:
+                omitidas += 1
+                continue
+            entradas.extend(nuevas)
+            por_material[fila.id] = nuevas
+        iniciales = sorted(e for e in entradas if e[4] == 0)
+        resto = sorted(e for e in entradas if e[4] > 0)
+        with self._lock:
+            self._iniciales = iniciales
+            self._entradas = resto
+            self._por_material = por_material
+            self._omitidas = omitidas
+
+    def _lista(self, entrada: Entrada) -> List[Entrada]:
+        return self._iniciales if entrada[4] == 0 else self._entradas
+
+    def _total(self) -> int:
+        return len(self._iniciales) + len(self._entradas)
+
+    def _quitar(self, material_id: int):
+        for entrada in self._por_material.pop(material_id, []):
+            lista = self._lista(entrada)
+            indice = bisect.bisect_left(lista, entrada)
+            if indice < len(lista) and lista[indice] == entrada:
+                del lista[indice]
+
+    def agregar(self, material_id: int, titulo: Optional[str], autor: Optional[str]):
+        """Agrega o reemplaza las entradas de un material."""
+        nuevas = _entradas(material_id, titulo, autor)
+        with self._lock:
+            self._quitar(material_id)
+            if self._total() + len(nuevas) > self.max_entradas:
+                self._omitidas += 1
+                return
+            for entrada in nuevas:
+                bisect.insort(self._lista(entrada), entrada)
+            self._por_material[material_id] = nuevas
+
+    def quitar(self, material_id: int):
+        with self._lock:
+            self._quitar(material_id)
+
+    def sugerir(self, prefijo: str, limite: int = LIMITE_SUGERENCIAS) -> List[dict]:
+        """
+        Hasta `limite` títulos o autores que tienen una palabra que empieza con
+        `prefijo`. Primero los que empiezan con el prefijo, luego los más cortos.
+        """
+        clave = normalizar(prefijo)
+        if not clave:
+            return []
+        candidatas = []
+        with self._lock:
+            # Cada arreglo aporta a lo sumo MAX_ESCANEO entradas
+            for lista in (self._iniciales, self._entradas):
+                inicio = bisect.bisect_left(lista, (clave,))
+                for entrada in lista[inicio:inicio + MAX_ESCANEO]:
+                    if not entrada[0].startswith(clave):
+                        break
+                    candidatas.append(entrada)
+
+        candidatas.sort(key=lambda e: (e[4] > 0, len(e[3]), e[3], e[1]))
+        vistas = set()
+        sugerencias = []
+        for _clave, material_id, campo, texto, _posicion in candidatas:
+            if (material_id, campo) in vistas:
+                continue
+            vistas.add((material_id, campo))
+            sugerencias.append({"material_id": material_id, "campo": campo, "texto": texto})
+            if len(sugerencias) >= limite:
+                break
+        return sugerencias
+
+    def memoria(self) -> dict:
+        """Tamaño del índice. Los bytes son una aproximación (lista, tuplas y claves)."""
+        with self._lock:
+            entradas = self._iniciales + self._entradas
+            materiales = len(self._por_material)
+            omitidas = self._omitidas
+        bytes_aprox = sys.getsizeof(entradas) + sum(
+            sys.getsizeof(entrada) + sys.getsizeof(entrada[0]) for entrada in entradas
+        )
+        return {
+            "entradas": len(entradas),
+            "max_entradas": self.max_entradas,
+            "materiales": materiales,
+            "materiales_omitidos": omitidas,
+            "bytes_aprox": bytes_aprox,
+        }
+
+
+indice_sugerencias = IndiceSugerencias()
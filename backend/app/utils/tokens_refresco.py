@@ -0,0 +1,145 @@
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy import delete, literal_column, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .security import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, REFRESH_TOKEN_EXPIRE_DAYS, SECRET_KEY, create_access_token
+)
+
+TAMANO_LOTE_PURGA = 500
+TIPO_REFRESCO = "refresh"
+
+
+def _no_autorizado(detalle: str = "Token de refresco inválido") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detalle,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _rol(rol) -> str:
+    return rol.value if hasattr(rol, "value") else rol
+
+
+def _nuevo(db: Session, usuario_id: int, email: str, rol: str, jti: str) -> str:
+    """Registra el token `jti` y devuelve el JWT firmado que lo representa."""
+    expira_en = datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(models.TokenRefresco(jti=jti, usuario_id=usuario_id, expira_en=expira_en))
+    return jwt.encode(
+        {
+            "sub": email,
+            "uid": usuario_id,
+            "rol": rol,
+            "jti": jti,
+            "typ": TIPO_REFRESCO,
+            "exp": datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+
+def _acceso(email: str, rol: str) -> str:
+    return create_access_token(
+        data={"sub": email, "rol": rol}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+
+def emitir(db: Session, usuario: models.Usuario) -> dict:
+    """Par de tokens para un login correcto. Quien llama hace el commit."""
+    rol = _rol(usuario.rol)
+    return {
+        "access_token": _acceso(usuario.email, rol),
+        "refresh_token": _nuevo(db, usuario.id, usuario.email, rol, uuid.uuid4().hex),
+        "token_type": "bearer",
+    }
+
+
+def _leer(token: str) -> dict:
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _no_autorizado()
+    if claims.get("typ") != TIPO_REFRESCO or not claims.get("jti") or claims.get("uid") is None:
+        raise _no_autorizado()
+    return claims
+
+
+def revocar_usuario(db: Session, usuario_id: int) -> int:
+    """Revoca todos los tokens vigentes del usuario. Quien llama hace el commit."""
+    tabla = models.TokenRefresco.__table__
+    resultado = db.execute(
+        update(tabla)
+        .where(tabla.c.usuario_id == usuario_id, tabla.c.revocado == False)  # noqa: E712
+        .values(revocado=True)
+    )
+    return resultado.rowcount
+
+
+def rotar(db: Session, token: str) -> dict:
+    """
+    Cambia un token de refresco por un par nuevo sin consultar al usuario ni
+    verificar la contraseña: los datos salen de los claims del token firmado.
+    El token usado se revoca con un UPDATE condicional por su jti, así dos usos
+    simultáneos del mismo token no pueden rotarlo dos veces. Si el token ya
+    estaba revocado se trata como robado y se revocan todos los del usuario.
+    """
+    claims = _leer(token)
+    tabla = models.TokenRefresco.__table__
+    nuevo_jti = uuid.uuid4().hex
+    resultado = db.execute(
+        update(tabla)
+        .where(tabla.c.jti == claims["jti"], tabla.c.revocado == False, tabla.c.expira_en > datetime.now())  # noqa: E712
+        .values(revocado=True, reemplazado_por=nuevo_jti)
+    )
+    if resultado.rowcount != 1:
+        revocado = db.execute(
+            select(tabla.c.revocado).where(tabla.c.jti == claims["jti"])
+        ).scalar()
+        if revocado:
+            revocar_usuario(db, claims["uid"])
+            db.commit()
+            raise _no_autorizado("Token de refresco reutilizado; inicie sesión de nuevo")
+        db.rollback()
+        raise _no_autorizado()
+
+    refresco = _nuevo(db, claims["uid"], claims["sub"], claims["rol"], nuevo_jti)
+    db.commit()
+    return {
+        "access_token": _acceso(claims["sub"], claims["rol"]),
+        "refresh_token": refresco,
+        "token_type": "bearer",
+    }
+
+
+def revocar(db: Session, token: str):
+    """Revoca un token de refresco (cierre de sesión)."""
+    claims = _leer(token)
+    tabla = models.TokenRefresco.__table__
+    db.execute(update(tabla).where(tabla.c.jti == claims["jti"]).values(revocado=True))
+    db.commit()
+
+
+def purgar(db: Session, tamano_lote: int = TAMANO_LOTE_PURGA) -> int:
+    """
+    Borra los tokens vencidos, un lote por transacción. Los revocados que aún no
+    vencieron se conservan para detectar su reutilización.
+    """
+    tabla = models.TokenRefresco.__table__
+    rowid = literal_column("rowid")
+    ahora = datetime.now()
+    borrados = 0
+    while True:
+        lote = select(rowid).select_from(tabla).where(tabla.c.expira_en < ahora).limit(tamano_lote)
+        resultado = db.execute(delete(tabla).where(rowid.in_(lote)))
+        db.commit()
+        if not resultado.rowcount:
+            break
+        borrados += resultado.rowcount
+    return borrados
@@ -0,0 +1,111 @@
+"""
+Compara tamaño y latencia de los listados completos contra los mismos listados
+con `fields=`, sobre una base de datos temporal con muchas filas.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.campos [--materiales N] [--prestamos N] [--pagina N] [--repeticiones N]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def preparar_entorno() -> str:
+    carpeta = tempfile.mkdtemp(prefix="bench-campos-")
+    ruta = os.path.join(carpeta, "biblioteca.db")
+    os.environ["BIBLIOTECA_DB_URL"] = f"sqlite:///{ruta}"
+    os.environ.setdefault("ARCHIVO_CONSULTAS_LENTAS", os.path.join(carpeta, "consultas_lentas.log"))
+    return ruta
+
+
+def poblar(materiales: int, prestamos: int):
+    from sqlalchemy import insert
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        generos = list(models.GeneroLibro)
+        db.add_all([
+            models.Libro(
+                identificador=f"BENCH-{i:07d}",
+                titulo=f"Libro de prueba {i}",
+                autor=f"Autor {i % 997}",
+                anio_publicacion=random.randint(1950, 2024),
+                anio_llegada=random.randint(1990, 2025),
+                editorial=f"Editorial {i % 53}",
+                cantidad_total=3,
+                cantidad_prestamo=0,
+                genero=random.choice(generos),
+            )
+            for i in range(materiales)
+        ])
+        db.commit()
+        ids = [fila.id for fila in db.query(models.Material.id).all()]
+        usuarios = [fila.id for fila in db.query(models.Usuario.id).all()]
+        ahora = datetime.now()
+        db.execute(insert(models.Prestamo.__table__), [
+            {
+                "usuario_id": random.choice(usuarios),
+                "material_id": random.choice(ids),
+                "fecha_prestamo": ahora - timedelta(days=random.randint(0, 365)),
+                "estado": "devuelto",
+                "fecha_devolucion": ahora,
+            }
+            for _ in range(prestamos)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def medir(cliente, url: str, repeticiones: int) -> dict:
+    cliente.get(url)  # calentamiento
+    tiempos = []
+    tamano = 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        tamano = len(respuesta.content)
+        assert respuesta.status_code == 200, respuesta.text
+    return {"ms": statistics.median(tiempos), "bytes": tamano}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.campos")
+    parser.add_argument("--materiales", type=int, default=20000)
+    parser.add_argument("--prestamos", type=int, default=50000)
+    parser.add_argument("--pagina", type=int, default=5000, help="Filas por página pedida")
+    parser.add_argument("--repeticiones", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    ruta = preparar_entorno()
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    print(f"Poblando {ruta} con {args.materiales} libros y {args.prestamos} préstamos...")
+    poblar(args.materiales, args.prestamos)
+    cliente = TestClient(app)
+
+    casos = [
+        ("/api/materiales/", "titulo,autor"),
+        ("/api/materiales/libros/", "titulo,autor,genero"),
+        ("/api/materiales/libros/", "titulo,factor_estancia"),
+        ("/api/prestamos/", "material_id,estado"),
+    ]
+    print(f"{'endpoint':<28} {'fields':<24} {'bytes':>10} {'ms':>8} {'bytes fields':>13} {'ms fields':>10} {'ahorro':>7}")
+    for camino, campos in casos:
+        completo = medir(cliente, f"{camino}?limit={args.pagina}", args.repeticiones)
+        parcial = medir(cliente, f"{camino}?limit={args.pagina}&fields={campos}", args.repeticiones)
+        ahorro = 100 * (1 - parcial["ms"] / completo["ms"]) if completo["ms"] else 0
+        print(f"{camino:<28} {campos:<24} {completo['bytes']:>10} {completo['ms']:>8.1f} "
+              f"{parcial['bytes']:>13} {parcial['ms']:>10.1f} {ahorro:>6.0f}%")
+
+
+if __name__ == "__main__":
+    main()
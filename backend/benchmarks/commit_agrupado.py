@@ -0,0 +1,173 @@
+"""
+Préstamos por segundo y latencias de POST /api/prestamos/ con y sin commit
+agrupado, con varias peticiones simultáneas sobre una base de datos temporal.
+
+Uso (desde la carpeta backend):
+    python -m benchmarks.commit_agrupado [--hilos N] [--peticiones N] [--ventana-ms N] [--auditoria-sincrona]
+
+Después de cada modo se verifica que cada préstamo creado tenga exactamente un
+registro de auditoría de creación; si no, termina con código de salida 1.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func
+
+
+def preparar_entorno() -> str:
+    carpeta = tempfile.mkdtemp(prefix="bench-commit-")
+    ruta = os.path.join(carpeta, "biblioteca.db")
+    os.environ["BIBLIOTECA_DB_URL"] = f"sqlite:///{ruta}"
+    os.environ.setdefault("ARCHIVO_CONSULTAS_LENTAS", os.path.join(carpeta, "consultas_lentas.log"))
+    return ruta
+
+
+def poblar(usuarios: int, materiales: int):
+    """Usuarios sin límite práctico de préstamos y materiales con muchos ejemplares."""
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        db.add_all([
+            models.Usuario(
+                nombre=f"Usuario {i}", carne_identidad=f"BENCH{i:06d}", direccion="-",
+                email=f"bench{i}@biblioteca.com", password_hash="-", limite_prestamos=1_000_000,
+            )
+            for i in range(usuarios)
+        ])
+        db.add_all([
+            models.Libro(
+                identificador=f"BENCH-{i:06d}", titulo=f"Libro {i}", autor="Autor", anio_publicacion=2000,
+                anio_llegada=2010, editorial="Editorial", cantidad_total=1_000_000, cantidad_prestamo=0,
+                genero=models.GeneroLibro.INFANTIL,
+            )
+            for i in range(materiales)
+        ])
+        db.commit()
+        ids_usuarios = [u.id for u in db.query(models.Usuario.id).filter(models.Usuario.carne_identidad.like("BENCH%"))]
+        ids_materiales = [m.id for m in db.query(models.Material.id).filter(models.Material.identificador.like("BENCH-%"))]
+        return ids_usuarios, ids_materiales
+    finally:
+        db.close()
+
+
+def medir(cliente, hilos: int, peticiones: int, usuarios, materiales) -> dict:
+    from app.utils.reproduccion import percentil
+
+    latencias, errores = [], []
+    lock = threading.Lock()
+
+    def trabajador(n: int):
+        propias = []
+        for i in range(peticiones):
+            cuerpo = {
+                "usuario_id": usuarios[(n * peticiones + i) % len(usuarios)],
+                "material_id": materiales[(n * 7 + i) % len(materiales)],
+                "estado": "activo",
+            }
+            inicio = time.perf_counter()
+            respuesta = cliente.post("/api/prestamos/", json=cuerpo)
+            propias.append((time.perf_counter() - inicio) * 1000)
+            if respuesta.status_code != 200:
+                errores.append(respuesta.status_code)
+        with lock:
+            latencias.extend(propias)
+
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajador, args=(n,)) for n in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    return {
+        "peticiones": len(latencias),
+        "por_segundo": len(latencias) / segundos,
+        "p50_ms": percentil(latencias, 50),
+        "p99_ms": percentil(latencias, 99),
+        "errores": len(errores),
+    }
+
+
+def ultimo_prestamo() -> int:
+    from app import models
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return db.query(func.max(models.Prestamo.id)).scalar() or 0
+    finally:
+        db.close()
+
+
+def verificar_auditoria(desde: int) -> dict:
+    """
+    Préstamos con id mayor que `desde` sin registro de creación en la auditoría,
+    y registros de préstamos que no existen (los datos iniciales no se auditan).
+    """
+    from app import models
+    from app.database import SessionLocal
+    from app.utils.auditoria import escritor_auditoria
+
+    escritor_auditoria.vaciar()
+    db = SessionLocal()
+    try:
+        prestamos = {fila.id for fila in db.query(models.Prestamo.id).filter(models.Prestamo.id > desde)}
+        auditados = [
+            fila.entidad_id for fila in db.query(models.RegistroAuditoria.entidad_id).filter(
+                models.RegistroAuditoria.entidad == "prestamo", models.RegistroAuditoria.accion == "crear",
+                models.RegistroAuditoria.entidad_id > desde,
+            )
+        ]
+    finally:
+        db.close()
+    return {
+        "sin_auditar": len(prestamos - set(auditados)),
+        "sin_prestamo": len(set(auditados) - prestamos),
+        "repetidos": len(auditados) - len(set(auditados)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.commit_agrupado")
+    parser.add_argument("--hilos", type=int, default=16, help="Peticiones simultáneas")
+    parser.add_argument("--peticiones", type=int, default=50, help="Peticiones por hilo")
+    parser.add_argument("--ventana-ms", type=float, default=2.0)
+    parser.add_argument("--auditoria-sincrona", action="store_true",
+                        help="Escribe la auditoría en el hilo de la petición (AUDITORIA_SINCRONA=1)")
+    args = parser.parse_args(argv)
+
+    ruta = preparar_entorno()
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.utils import auditoria, commit_agrupado
+
+    auditoria.escritor_auditoria.sincrono = args.auditoria_sincrona
+    usuarios, materiales = poblar(200, 50)
+    commit_agrupado.escritor_agrupado.ventana = args.ventana_ms / 1000
+    print(f"Base de datos: {ruta}, {args.hilos} hilos x {args.peticiones} préstamos")
+    print(f"{'modo':<20} {'préstamos/s':>12} {'p50 ms':>9} {'p99 ms':>9} {'errores':>8}")
+    fallo = False
+    with TestClient(app) as cliente:
+        for activo in (False, True):
+            commit_agrupado.COMMIT_AGRUPADO = activo
+            desde = ultimo_prestamo()
+            medir(cliente, 2, 5, usuarios, materiales)  # calentamiento
+            r = medir(cliente, args.hilos, args.peticiones, usuarios, materiales)
+            modo = "commit agrupado" if activo else "commit por petición"
+            print(f"{modo:<20} {r['por_segundo']:>12.1f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['errores']:>8}")
+            verificacion = verificar_auditoria(desde)
+            if any(verificacion.values()) or r["errores"]:
+                fallo = True
+                print(f"    auditoría inconsistente: {verificacion}")
+    print("Escritor:", commit_agrupado.escritor_agrupado.estado())
+    if fallo:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import React, { createContext, useState, useEffect, useContext } from 'react';
 import axios from 'axios';
 import { BACKEND } from '../utils/conexion';
+import { instalarRefresco } from '../services/refresco';
+
+instalarRefresco(axios);
 
 interface AuthContextType {
   user: { email: string; rol: string; nombre?: string } | null;
@@ -47,13 +50,14 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         }
       });
 
-      const { access_token } = response.data;
+      const { access_token, refresh_token } = response.data;
       
       if (!access_token) {
         throw new Error('Token no recibido del servidor');
       }
       
       localStorage.setItem('token', access_token);
+      localStorage.setItem('refresh_token', refresh_token);
       setToken(access_token);
       
       const payload = JSON.parse(atob(access_token.split('.')[1]));
@@ -75,7 +79,12 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   };
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axios.post(`${BACKEND}/api/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     setToken(null);
     setUser(null);
     setRole(null);
@@ -94,7 +103,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       const payload = JSON.parse(atob(storedToken.split('.')[1]));
       const expirationTime = payload.exp * 1000;
       
-      if (Date.now() >= expirationTime) {
+      // Con un token de refresco la sesión sigue: la próxima petición renueva el de acceso
+      if (Date.now() >= expirationTime && !localStorage.getItem('refresh_token')) {
         logout();
         return false;
       }
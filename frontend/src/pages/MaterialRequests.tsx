@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { getMaterialsByIds } from '../services/Getters';
 
 interface Solicitud {
   id: number;
@@ -46,17 +47,16 @@ const MaterialRequests = () => {
       
       if (materialesIds.length > 0) {
         try {
-          const materialesPromises = materialesIds.map((id: number) => 
-            axios.get(`/api/materiales/${id}`).catch(() => ({ data: null }))
+          const { materials } = await getMaterialsByIds(materialesIds);
+          const titulos = new Map<number, string>(
+            materials.map((m: { id: number; titulo: string }) => [m.id, m.titulo])
           );
           
-          const materialesResponses = await Promise.all(materialesPromises);
-          
-          const solicitudesConTitulos = solicitudesData.map((solicitud: Solicitud, index: number) => {
-            const materialData = materialesResponses[index].data;
+          const solicitudesConTitulos = solicitudesData.map((solicitud: Solicitud) => {
+            const titulo = titulos.get(solicitud.material_id);
             return {
               ...solicitud,
-              titulo_material: materialData ? materialData.titulo : `Material #${solicitud.material_id}`
+              titulo_material: titulo ?? `Material #${solicitud.material_id}`
             };
           });
           
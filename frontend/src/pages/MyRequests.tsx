@@ -2,6 +2,7 @@ import { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
+import { getMaterialsByIds } from '../services/Getters';
 
 interface MaterialSolicitud {
   id: number;
@@ -117,23 +118,12 @@ const MyRequests = () => {
       const newTitles = {...materialTitles};
       console.log("Fetching titles for materials:", materialIds);
       
-      for (const id of materialIds) {
-        try {
-          const response = await axios.get(`/api/materiales/${id}`);
-          console.log(`Material ${id} response:`, response.data);
-          
-          if (response.data && response.data.titulo) {
-            if (response.data.id === id) {
-              newTitles[id] = `${response.data.titulo} (${response.data.tipo})`;
-            } else {
-              console.warn(`ID mismatch: requested ${id}, received ${response.data.id}`);
-              newTitles[id] = `${response.data.titulo} (${response.data.tipo})`;
-            }
-          }
-        } catch (error) {
-          console.error(`Error fetching material ${id}:`, error);
-          newTitles[id] = `Material #${id}`;
-        }
+      const { materials, faltantes } = await getMaterialsByIds(materialIds);
+      for (const material of materials) {
+        newTitles[material.id] = `${material.titulo} (${material.tipo})`;
+      }
+      for (const id of faltantes) {
+        newTitles[id] = `Material #${id}`;
       }
       
       console.log("Updated titles:", newTitles);
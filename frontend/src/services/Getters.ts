@@ -36,6 +36,33 @@ export const getUserById = async (id: string) => {
   return response.data;
 };
 
+// Máximo de ids que acepta el backend en una consulta /lote
+const MAX_IDS_LOTE = 500;
+
+const getByIds = async (url: string, ids: number[], clave: 'materials' | 'usuarios') => {
+  const unicos = Array.from(new Set(ids));
+  const encontrados: any[] = [];
+  const faltantes: number[] = [];
+  for (let inicio = 0; inicio < unicos.length; inicio += MAX_IDS_LOTE) {
+    const tramo = unicos.slice(inicio, inicio + MAX_IDS_LOTE);
+    const response = await axios.get(url, { params: { ids: tramo.join(',') } });
+    encontrados.push(...response.data[clave]);
+    faltantes.push(...response.data.faltantes);
+  }
+  return { encontrados, faltantes };
+};
+
+// Resuelve varios materiales con una consulta por cada MAX_IDS_LOTE ids
+export const getMaterialsByIds = async (ids: number[]) => {
+  const { encontrados, faltantes } = await getByIds('/api/materiales/lote', ids, 'materials');
+  return { materials: encontrados, faltantes };
+};
+
+export const getUsersByIds = async (ids: number[]) => {
+  const { encontrados, faltantes } = await getByIds('/api/usuarios/lote', ids, 'usuarios');
+  return { usuarios: encontrados, faltantes };
+};
+
 export const getMaterialRequests = async (estado?: string) => {
   const url = estado ? `/api/solicitudes?estado=${estado}` : '/api/solicitudes';
   const response = await fetch(url);
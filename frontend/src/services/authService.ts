@@ -13,8 +13,9 @@ export const authService = {
       },
     });
     
-    const { access_token } = response.data;
+    const { access_token, refresh_token } = response.data;
     localStorage.setItem('token', access_token);
+    localStorage.setItem('refresh_token', refresh_token);
     
     return access_token;
   },
@@ -30,7 +31,12 @@ export const authService = {
   },
   
   logout() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (refreshToken) {
+      axiosInstance.post('/api/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+    }
     localStorage.removeItem('token');
+    localStorage.removeItem('refresh_token');
     localStorage.removeItem('user');
   }
 };
\ No newline at end of file
@@ -1,5 +1,6 @@
 import axios from 'axios';
 import { BACKEND } from '../utils/conexion';
+import { reintentarConRefresco } from './refresco';
 
 const axiosInstance = axios.create({
   baseURL: BACKEND,
@@ -21,9 +22,14 @@ axiosInstance.interceptors.request.use(
 
 axiosInstance.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
     if (error.response?.status === 401) {
+      const reintento = await reintentarConRefresco(axiosInstance, error);
+      if (reintento) {
+        return reintento;
+      }
       localStorage.removeItem('token');
+      localStorage.removeItem('refresh_token');
       localStorage.removeItem('usuario');
       localStorage.removeItem('admin');
       window.location.href = '/login';
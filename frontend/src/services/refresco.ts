@@ -0,0 +1,64 @@
+import axios, { AxiosError, AxiosInstance, AxiosResponse } from 'axios';
+import { BACKEND } from '../utils/conexion';
+
+let refrescoEnCurso: Promise<string | null> | null = null;
+
+// Un solo refresco a la vez: el backend revoca el token usado y trata un segundo
+// uso del mismo token como robo, cerrando todas las sesiones del usuario.
+export const refrescarToken = (): Promise<string | null> => {
+  if (!refrescoEnCurso) {
+    refrescoEnCurso = (async () => {
+      const refreshToken = localStorage.getItem('refresh_token');
+      if (!refreshToken) {
+        return null;
+      }
+      try {
+        const response = await axios.post(`${BACKEND}/api/auth/refresh`, { refresh_token: refreshToken });
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refresh_token', response.data.refresh_token);
+        return response.data.access_token as string;
+      } catch {
+        localStorage.removeItem('refresh_token');
+        return null;
+      }
+    })().finally(() => {
+      refrescoEnCurso = null;
+    });
+  }
+  return refrescoEnCurso;
+};
+
+// Rutas cuyo 401 no se arregla renovando el token de acceso (/api/auth/me sí se reintenta)
+const RUTAS_SIN_REFRESCO = ['/api/auth/login', '/api/auth/refresh', '/api/auth/logout'];
+
+const esRutaSinRefresco = (url?: string): boolean => {
+  const camino = (url ?? '').split('?')[0].replace(/\/$/, '');
+  return RUTAS_SIN_REFRESCO.some((ruta) => camino.endsWith(ruta));
+};
+
+// Ante un 401 renueva el token de acceso y repite la petición una sola vez.
+// Devuelve null si no se pudo renovar.
+export const reintentarConRefresco = async (
+  instancia: AxiosInstance,
+  error: AxiosError
+): Promise<AxiosResponse | null> => {
+  const config = error.config as (typeof error.config & { _reintentado?: boolean }) | undefined;
+  if (error.response?.status !== 401 || !config || config._reintentado || esRutaSinRefresco(config.url)) {
+    return null;
+  }
+  config._reintentado = true;
+  const token = await refrescarToken();
+  if (!token) {
+    return null;
+  }
+  config.headers.Authorization = `Bearer ${token}`;
+  return instancia(config);
+};
+
+// Para las páginas que usan axios directamente con la cabecera Authorization
+export const instalarRefresco = (instancia: AxiosInstance = axios) => {
+  instancia.interceptors.response.use(
+    (response) => response,
+    async (error: AxiosError) => (await reintentarConRefresco(instancia, error)) ?? Promise.reject(error)
+  );
+};